@@ -1,8 +1,14 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for, send_file, flash
+from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for, send_file, flash, Response, stream_with_context, make_response
 from flask_cors import CORS
 from services.face_service import FaceService
+from services.repository import Repository
 from services.attendance import AttendanceService
+from services.exports import AttendanceExporter, EXPORT_FORMATS, DAILY_FIELDS, TRACKING_FIELDS, ABSENCE_FIELDS
+from services.recognition_engine import RecognitionEngine, EngineBusy, DeadlineExceeded
 import os
+import time
+import hashlib
+from functools import wraps
 from datetime import datetime, timedelta
 import pandas as pd
 import io
@@ -17,22 +23,38 @@ app.secret_key = 'DB_Carba_Secret_Key_2025'
 # Initialisation des services
 print("\n=== Initialisation du système LIGGUEY-SINAA ===")
 print("Chargement des services...")
-face_service = FaceService()
-attendance_service = AttendanceService()
-print("\nServices chargés avec succès!")
+repository = Repository()
+face_service = FaceService(repository=repository)
+attendance_service = AttendanceService(repository)
+exporter = AttendanceExporter(attendance_service)
+recognition_engine = RecognitionEngine(face_service).start()
+print("\nServices chargés avec succès! (visages connus chargés en arrière-plan, progression : /api/ready)")
 
 # Configuration
 app.config['UPLOAD_FOLDER'] = 'data/images'
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg'}
 # la taille limite des images
 app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024  # 2MB max
+# Types acceptés pour l'envoi binaire des images de la borne
+BINARY_FRAME_TYPES = {'image/jpeg', 'image/png', 'image/webp', 'application/octet-stream'}
 
 # un middleware pour vérifier le Content-Type
 
+@app.before_request
+def pin_calendar():
+    # Versions des congés, missions et fériés lues une fois par requête, pas à chaque recherche
+    attendance_service.calendar.pin()
+
+
+@app.teardown_request
+def release_calendar(error=None):
+    attendance_service.calendar.release()
+
+
 @app.before_request
 def check_json():
-    # Exclure les routes qui nécessitent multipart/form-data
-    excluded_routes = ['/api/employee/add', '/api/employee/update/']
+    # Exclure les routes qui nécessitent multipart/form-data (ou un corps binaire pour /api/detect)
+    excluded_routes = ['/api/employee/add', '/api/employee/update/', '/api/detect']
     
     if (request.method in ['POST', 'PUT'] 
         and request.path.startswith('/api')
@@ -52,6 +74,74 @@ def is_admin_user(matricule):
     """Vérifie si l'utilisateur est un administrateur"""
     return matricule == 'DB'
 
+
+# Listes paginées : taille de page par défaut et maximale
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def page_args():
+    """Pagination demandée (?limit=&offset=&sort=-date,matricule&q=) ; None sans limit ni offset (liste complète)"""
+    if 'limit' not in request.args and 'offset' not in request.args:
+        return None
+    return {
+        'limit': min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE),
+        'offset': max(request.args.get('offset', 0, type=int), 0),
+        'sort': [key.strip() for key in request.args.get('sort', '').split(',') if key.strip()],
+        'search': request.args.get('q') or None
+    }
+
+
+def page_response(df, total, paging):
+    return jsonify({'items': df.fillna('').to_dict('records'), 'total': total, 'limit': paging['limit'],
+                    'offset': paging['offset']})
+
+
+def column_filters(*columns):
+    """Filtres exacts passés en paramètres (?matricule=&departement=...)"""
+    return {column: request.args[column] for column in columns if request.args.get(column)}
+
+
+def period_range(default_year=None):
+    """Plage d'une liste paginée : ?month=YYYY-MM, sinon ?start=&end=, sinon l'année ?year= (ou par défaut)"""
+    month = request.args.get('month')
+    if month:
+        datetime.strptime(month, '%Y-%m')
+        return f'{month}-01', f'{month}-31'
+    start_date, end_date = request.args.get('start'), request.args.get('end')
+    year = request.args.get('year', default_year)
+    if not (start_date or end_date) and year:
+        return f'{year}-01-01', f'{year}-12-31'
+    return start_date, end_date
+
+
+def versioned(*datasets, rules=False):
+    """ETag fort tiré des versions des tables lues (et des règles horaires), des paramètres et du jour courant :
+    si le client a déjà cette version (If-None-Match), réponse 304 sans appeler la vue"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if 'admin_logged_in' not in session:
+                return view(*args, **kwargs)
+            parts = [request.path, sorted(request.args.items(multi=True)), datetime.now().strftime('%Y-%m-%d'),
+                     repository.versions(datasets)]
+            if rules:
+                attendance_service.rules.refresh()
+                parts.append(attendance_service.rules.version)
+            etag = hashlib.md5(repr(parts).encode()).hexdigest()
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Toujours revalider : la réponse n'est réutilisée qu'après confirmation par le serveur
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -81,37 +171,104 @@ def admin_logout():
     session.pop('admin_logged_in', None)
     return redirect(url_for('index'))
 
+def get_frame_from_request():
+    """Extrait l'image envoyée par la borne : corps binaire, multipart ou JSON (data URL)"""
+    if request.mimetype in BINARY_FRAME_TYPES:
+        return request.get_data(cache=False) or None
+    if request.mimetype == 'multipart/form-data':
+        frame = request.files.get('image')
+        return frame.read() if frame else None
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        return data.get('image')
+    return None
+
+def build_recognition_response(result):
+    """Transforme un visage reconnu en réponse de borne (accès administrateur ou pointage)"""
+    if is_admin_user(result['employee_id']):
+        return {
+            'status': 'success',
+            'message': f'Bonjour Administrateur {result["full_name"]}. Accès autorisé.',
+            'data': {
+                'employee_id': result['employee_id'],
+                'full_name': result['full_name'],
+                'department': result['department'],
+                'is_admin': True
+            }
+        }
+    
+    attendance_result = attendance_service.record_attendance(
+        result['employee_id'],
+        result['full_name'],
+        result['department']
+    )
+    # Écart de confiance entre le meilleur candidat et le suivant
+    attendance_result['match'] = {
+        'distance': result.get('distance'),
+        'margin': result.get('margin')
+    }
+    return attendance_result
+
+def is_multi_face_request():
+    """Mode file d'attente : tous les visages de l'image sont traités (?multi=1 ou \"multi\": true)"""
+    if request.args.get('multi', '0') in ('1', 'true'):
+        return True
+    return request.is_json and bool((request.get_json(silent=True) or {}).get('multi'))
+
 @app.route('/api/detect', methods=['POST'])
 def detect_face():
     try:
-        if not request.json or 'image' not in request.json:
+        image_data = get_frame_from_request()
+        if not image_data:
             return jsonify({'status': 'error', 'message': 'Aucune image fournie'}), 400
         
-        image_data = request.json['image']
-        result = face_service.recognize_face(image_data)
+        # Décodage JPEG réduit optionnel (1, 2, 4 ou 8)
+        reduce = request.args.get('reduce', 1, type=int)
         
-        if result['status'] == 'success':
-            if is_admin_user(result['employee_id']):
-                return jsonify({
-                    'status': 'success',
-                    'message': f'Bonjour Administrateur {result["full_name"]}. Accès autorisé.',
-                    'data': {
-                        'employee_id': result['employee_id'],
-                        'full_name': result['full_name'],
-                        'department': result['department'],
-                        'is_admin': True
-                    }
-                })
-            
-            attendance_result = attendance_service.record_attendance(
-                result['employee_id'],
-                result['full_name'],
-                result['department']
-            )
+        multi = is_multi_face_request()
+        if not face_service.ready.is_set():
+            # Galerie pas encore chargée : un visage connu serait déclaré inconnu
+            response = jsonify({
+                'status': 'busy',
+                'message': 'Chargement des visages connus en cours, réessayez dans quelques secondes',
+                'retry_after_ms': 2000
+            })
+            response.headers['Retry-After'] = '2'
+            return response, 503
+        try:
+            recognition = recognition_engine.recognize(image_data, reduce=reduce, multi=multi)
+        except EngineBusy as e:
+            response = jsonify({
+                'status': 'busy',
+                'message': str(e),
+                'retry_after_ms': e.retry_after_ms
+            })
+            response.headers['Retry-After'] = str(max(1, round(e.retry_after_ms / 1000)))
+            return response, 503
+        except DeadlineExceeded as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 504
+        
+        if multi:
+            results = []
+            for face in recognition['faces']:
+                if face['status'] == 'success':
+                    response = build_recognition_response(face)
+                    response['employee_id'] = face['employee_id']
+                    response['location'] = face['location']
+                    results.append(response)
+                else:
+                    results.append(face)
             
-            return jsonify(attendance_result)
+            return jsonify({
+                'status': recognition['status'],
+                'message': recognition['message'],
+                'results': results
+            }), 200 if recognition['status'] == 'success' else 400
+        
+        if recognition['status'] == 'success':
+            return jsonify(build_recognition_response(recognition))
         else:
-            return jsonify(result), 400
+            return jsonify(recognition), 400
             
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -124,18 +281,22 @@ def detect_face():
     
     
 @app.route('/api/holidays', methods=['GET'])
+@versioned('holidays')
 def get_holidays():
     if 'admin_logged_in' not in session:
         return jsonify({'error': 'Non autorisé'}), 401
     
     try:
+        paging = page_args()
+        if paging:
+            start_date, end_date = period_range(datetime.now().year)
+            df, total = repository.list_page('holidays', start_date=start_date, end_date=end_date, **paging)
+            return page_response(df, total, paging)
         year = datetime.now().year  # Ajout de cette ligne
-        holidays_file = os.path.join('data', 'FERIERS', f'feriers{year}.csv')
-        if not os.path.exists(holidays_file):
-            return jsonify([])
-            
-        df = pd.read_csv(holidays_file)
+        df = repository.get_year_periods('holidays', year)
         return jsonify(df.to_dict('records'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -153,22 +314,7 @@ def add_holiday():
         if not all([description, date_debut, date_fin]):
             return jsonify({'error': 'Tous les champs sont requis'}), 400
             
-        holidays_file = os.path.join('data', 'FERIERS', 'feriers2025.csv')
-        os.makedirs(os.path.dirname(holidays_file), exist_ok=True)
-        
-        new_data = {
-            'description': [description],
-            'date_debut': [date_debut],
-            'date_fin': [date_fin]
-        }
-        
-        if os.path.exists(holidays_file):
-            df = pd.read_csv(holidays_file)
-            new_df = pd.concat([df, pd.DataFrame(new_data)], ignore_index=True)
-        else:
-            new_df = pd.DataFrame(new_data)
-            
-        new_df.to_csv(holidays_file, index=False)
+        repository.add_holiday(description, date_debut, date_fin)
         return jsonify({'status': 'success'})
         
     except Exception as e:
@@ -179,25 +325,25 @@ def add_holiday():
 
 # Dans app.py, modifiez la route /api/missions comme suit :
 @app.route('/api/missions', methods=['GET'])
+@versioned('missions')
 def get_missions():
     if 'admin_logged_in' not in session:
         return jsonify({'error': 'Non autorisé'}), 401
     
     try:
-        missions_file = os.path.join('data', 'MISSIONS', 'missions2025.csv')
-        
-        if not os.path.exists(missions_file):
-            return jsonify([])
-            
-        df = pd.read_csv(missions_file)
+        paging = page_args()
+        if paging:
+            start_date, end_date = period_range()
+            df, total = repository.list_page('missions', column_filters('matricule', 'departement'), start_date=start_date,
+                                             end_date=end_date, **paging)
+            return page_response(df, total, paging)
+
+        # Filtrage par matricule si spécifié
+        matricule = request.args.get('matricule')
+        df = repository.get_periods('missions', matricule=matricule)
         
         # Remplacer les NaN par des chaînes vides
         df = df.fillna('')
-        
-        # Filtrage par matricule si spécifié
-        matricule = request.args.get('matricule')
-        if matricule:
-            df = df[df['matricule'].astype(str) == str(matricule)]
             
         # Filtrage par mois si spécifié
         month = request.args.get('month')
@@ -217,6 +363,8 @@ def get_missions():
             df['date fin'] = pd.to_datetime(df['date fin']).dt.strftime('%Y-%m-%d')
                 
         return jsonify(df.to_dict('records'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         app.logger.error(f"Erreur récupération missions: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -263,49 +411,18 @@ def add_mission():
             return jsonify({'error': f'Format de date invalide: {str(e)}'}), 400
             
         # Vérifier que l'employé existe
-        db_path = os.path.join('data', 'database.csv')
-        if not os.path.exists(db_path):
-            return jsonify({'error': 'Base de données des employés introuvable'}), 404
-            
-        df_employees = pd.read_csv(db_path)
-        if matricule not in df_employees['matricule'].values:
+        if not repository.employee_exists(matricule):
             return jsonify({'error': f'Matricule {matricule} non trouvé'}), 404
             
-        # Vérifier les chevauchements de missions
-        missions_file = os.path.join('data', 'MISSIONS', 'missions2025.csv')
-        if os.path.exists(missions_file):
-            df_missions = pd.read_csv(missions_file)
-            
-            # Convertir les dates existantes en objets date pour comparaison
-            for _, row in df_missions.iterrows():
-                if str(row['matricule']) == matricule:
-                    existing_start = datetime.strptime(row['date debut'], '%Y-%m-%d').date()
-                    existing_end = datetime.strptime(row['date fin'], '%Y-%m-%d').date()
-                    
-                    # Vérifier le chevauchement
-                    if not (fin_dt.date() < existing_start or debut_dt.date() > existing_end):
-                        return jsonify({
-                            'error': f'Mission existante du {existing_start} au {existing_end}'
-                        }), 400
-        
-        # Créer le répertoire si nécessaire
-        os.makedirs(os.path.dirname(missions_file), exist_ok=True)
+        # Vérifier les chevauchements de missions (index sur matricule et dates)
+        existing = repository.find_overlap('missions', matricule, date_debut, date_fin)
+        if existing is not None:
+            return jsonify({
+                'error': f'Mission existante du {existing["date_debut"]} au {existing["date_fin"]}'
+            }), 400
         
         # Ajouter la nouvelle mission
-        new_mission = {
-            'matricule': [matricule],
-            'nom complet': [full_name],
-            'nom mission': [mission_name],
-            'date debut': [date_debut],
-            'date fin': [date_fin]
-        }
-        
-        new_df = pd.DataFrame(new_mission)
-        if os.path.exists(missions_file):
-            df_missions = pd.read_csv(missions_file)
-            new_df = pd.concat([df_missions, new_df], ignore_index=True)
-        
-        new_df.to_csv(missions_file, index=False)
+        repository.add_mission(matricule, full_name, mission_name, date_debut, date_fin)
         
         return jsonify({'status': 'success'})
         
@@ -319,22 +436,9 @@ def delete_mission(matricule, date_debut):
         return jsonify({'error': 'Non autorisé'}), 401
     
     try:
-        missions_file = os.path.join('data', 'MISSIONS', 'missions2025.csv')
-        
-        if not os.path.exists(missions_file):
-            return jsonify({'error': 'Aucune mission enregistrée'}), 404
-            
-        df = pd.read_csv(missions_file)
-        initial_count = len(df)
-        
-        # Suppression avec vérification du format de date
-        df = df[~((df['matricule'] == matricule) & 
-                (df['date debut'] == date_debut))]
-        
-        if len(df) == initial_count:
+        if repository.delete_period('missions', matricule, date_debut) == 0:
             return jsonify({'error': 'Mission non trouvée'}), 404
             
-        df.to_csv(missions_file, index=False)
         return jsonify({'status': 'success'})
         
     except Exception as e:
@@ -344,18 +448,26 @@ def delete_mission(matricule, date_debut):
     
     
 @app.route('/api/employees', methods=['GET'])
+@versioned('employees')
 def get_employees():
     if 'admin_logged_in' not in session:
         return jsonify({'error': 'Non autorisé'}), 401
     
     try:
+        paging = page_args()
+        if paging:
+            df, total = repository.list_page('employees', column_filters('matricule', 'departement'), **paging)
+            return page_response(df, total, paging)
         employees = face_service.get_all_employees()
         return jsonify(employees)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"[ERREUR] Récupération employés: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/present-employees', methods=['GET'])
+@versioned('employees', 'attendance', 'holidays')
 def get_present_employees():
     if 'admin_logged_in' not in session:
         return jsonify({'error': 'Non autorisé'}), 401
@@ -368,6 +480,7 @@ def get_present_employees():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/absent-employees', methods=['GET'])
+@versioned('employees', 'attendance', 'leaves', 'missions', 'holidays')
 def get_absent_employees():
     if 'admin_logged_in' not in session:
         return jsonify({'error': 'Non autorisé'}), 401
@@ -382,6 +495,7 @@ def get_absent_employees():
         return jsonify({'error': str(e)}), 500   
 
 @app.route('/api/attendance', methods=['GET'])
+@versioned('attendance', rules=True)
 def get_attendance():
     if 'admin_logged_in' not in session:
         return jsonify({'error': 'Non autorisé'}), 401
@@ -395,6 +509,7 @@ def get_attendance():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/employee-tracking', methods=['GET'])
+@versioned('attendance', 'leaves', 'holidays', rules=True)
 def get_employee_tracking():
     if 'admin_logged_in' not in session:
         return jsonify({'error': 'Non autorisé'}), 401
@@ -402,14 +517,23 @@ def get_employee_tracking():
     try:
         matricule = request.args.get('matricule', None)
         departement = request.args.get('departement', None)
+        paging = page_args()
+        if paging:
+            # Un mois (?month=YYYY-MM) ou une plage quelconque (?start=&end=)
+            start_date, end_date = period_range()
+            return jsonify(attendance_service.get_tracking_page(matricule or None, departement or None, start_date,
+                                                                end_date, **paging))
         month = request.args.get('month', datetime.now().strftime('%Y-%m'))
         tracking_data = attendance_service.get_employee_tracking(matricule, departement, month)
         return jsonify(tracking_data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"[ERREUR] Suivi employé: {str(e)}")
         return jsonify({'error': str(e)}), 500
     
 @app.route('/api/advanced-reports', methods=['GET'])
+@versioned('employees', 'attendance', 'leaves', 'missions', 'holidays', rules=True)
 def get_advanced_reports():
     if 'admin_logged_in' not in session:
         return jsonify({'error': 'Non autorisé'}), 401
@@ -417,6 +541,9 @@ def get_advanced_reports():
     try:
         date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
         departement = request.args.get('departement', None)
+        month = request.args.get('month', None)
+        if month:
+            return jsonify(attendance_service.rollups.monthly_report(month, departement))
         report_data = attendance_service.get_advanced_reports(date, departement)
         return jsonify(report_data)
     except Exception as e:
@@ -424,6 +551,117 @@ def get_advanced_reports():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/absence-summary', methods=['GET'])
+@versioned('employees', 'attendance', 'leaves', 'missions', 'holidays')
+def get_absence_summary():
+    if 'admin_logged_in' not in session:
+        return jsonify({'error': 'Non autorisé'}), 401
+
+    try:
+        summary = attendance_service.get_absence_summary(
+            request.args.get('start'),
+            request.args.get('end'),
+            request.args.get('departement'),
+            request.args.get('min_days', 0, type=int),
+            request.args.get('min_streak', 0, type=int)
+        )
+        return jsonify(summary)
+    except Exception as e:
+        print(f"[ERREUR] Synthèse des absences: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/attendance-rates', methods=['GET'])
+@versioned('employees', 'attendance', 'leaves', 'missions', 'holidays')
+def get_attendance_rates():
+    if 'admin_logged_in' not in session:
+        return jsonify({'error': 'Non autorisé'}), 401
+
+    try:
+        return jsonify(attendance_service.get_attendance_rates(request.args.get('start'), request.args.get('end')))
+    except Exception as e:
+        print(f"[ERREUR] Taux de présence: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/attendance/stream', methods=['GET'])
+def attendance_stream():
+    """Flux SSE des pointages (arrivee, depart, rejet) ; reprise après l'en-tête Last-Event-ID ou ?last_id="""
+    if 'admin_logged_in' not in session:
+        return jsonify({'error': 'Non autorisé'}), 401
+
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({'error': f'Identifiant d\'événement invalide: {last_id}'}), 400
+    return Response(
+        stream_with_context(attendance_service.feed.stream(last_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def export_response(frames, fields, filename, title):
+    """Réponse en flux : le fichier est produit lot par lot pendant l'envoi (?format=csv par défaut, ou xlsx)"""
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Format inconnu: {export_format} (csv ou xlsx)'}), 400
+    return Response(
+        stream_with_context(exporter.stream(frames, fields, export_format, title)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{export_format}"'}
+    )
+
+
+@app.route('/api/attendance/download', methods=['GET'])
+def download_attendance():
+    if 'admin_logged_in' not in session:
+        return jsonify({'error': 'Non autorisé'}), 401
+
+    try:
+        date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
+        return export_response(exporter.daily(date), DAILY_FIELDS, f'presences_{date}', 'Présences')
+    except Exception as e:
+        print(f"[ERREUR] Export présences: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/employee-tracking/download', methods=['GET'])
+def download_employee_tracking():
+    if 'admin_logged_in' not in session:
+        return jsonify({'error': 'Non autorisé'}), 401
+
+    try:
+        # Un mois (?month=YYYY-MM) ou une plage quelconque (?start=&end=)
+        month = request.args.get('month')
+        start_date = f'{month}-01' if month else request.args.get('start')
+        end_date = f'{month}-31' if month else request.args.get('end')
+        frames = exporter.tracking(start_date, end_date, request.args.get('matricule') or None,
+                                   request.args.get('departement') or None)
+        return export_response(frames, TRACKING_FIELDS, f"suivi_{start_date or 'debut'}_{end_date or 'fin'}", 'Suivi')
+    except Exception as e:
+        print(f"[ERREUR] Export suivi: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/absent-employees/download', methods=['GET'])
+def download_absent_employees():
+    if 'admin_logged_in' not in session:
+        return jsonify({'error': 'Non autorisé'}), 401
+
+    try:
+        # Une date (?date=) ou chaque jour ouvré d'une plage (?start=&end=)
+        start_date = request.args.get('start') or request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
+        end_date = request.args.get('end') or start_date
+        frames = exporter.absences(start_date, end_date, request.args.get('department', ''))
+        filename = f'absences_{start_date}' if end_date == start_date else f'absences_{start_date}_{end_date}'
+        return export_response(frames, ABSENCE_FIELDS, filename, 'Absences')
+    except Exception as e:
+        print(f"[ERREUR] Export absences: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/data/images/<filename>')
 def serve_employee_image(filename):
     return send_from_directory('data/images', filename)
@@ -464,11 +702,8 @@ def add_employee():
             return jsonify({'status': 'error', 'message': 'Tous les champs obligatoires doivent être remplis'}), 400
 
         # Vérification matricule existant
-        db_path = os.path.join('data', 'database.csv')
-        if os.path.exists(db_path):
-            df = pd.read_csv(db_path)
-            if not df[df['matricule'].str.strip() == matricule].empty:
-                return jsonify({'status': 'error', 'message': 'Matricule déjà utilisé'}), 400
+        if repository.employee_exists(matricule):
+            return jsonify({'status': 'error', 'message': 'Matricule déjà utilisé'}), 400
 
         # Ajout à la base de données
         new_employee = {
@@ -481,13 +716,8 @@ def add_employee():
             'image_path': filename
         }
 
-        new_df = pd.DataFrame([new_employee])
-        if os.path.exists(db_path):
-            df = pd.read_csv(db_path)
-            new_df = pd.concat([df, new_df], ignore_index=True)
-        
-        new_df.to_csv(db_path, index=False)
-        face_service.load_known_faces()
+        repository.add_employee(new_employee)
+        face_service.enroll_employee(new_employee)
 
         return jsonify({
             'status': 'success',
@@ -514,17 +744,9 @@ def update_employee(matricule):
             }), 400
 
         # Vérifier que l'employé existe
-        db_path = os.path.join('data', 'database.csv')
-        if not os.path.exists(db_path):
-            return jsonify({
-                'status': 'error',
-                'message': 'Base de données des employés introuvable'
-            }), 404
-            
-        df = pd.read_csv(db_path)
-        employee_index = df.index[df['matricule'] == matricule].tolist()
+        employee = repository.get_employee(matricule)
         
-        if not employee_index:
+        if employee is None:
             return jsonify({
                 'status': 'error',
                 'message': 'Employé non trouvé'
@@ -560,11 +782,11 @@ def update_employee(matricule):
             }), 400
 
         # Mise à jour des informations de base
-        df.at[employee_index[0], 'nom'] = nom
-        df.at[employee_index[0], 'prenom'] = prenom.capitalize()
-        df.at[employee_index[0], 'telephone'] = telephone
-        df.at[employee_index[0], 'lieu_habitation'] = lieu_habitation
-        df.at[employee_index[0], 'departement'] = departement
+        employee['nom'] = nom
+        employee['prenom'] = prenom.capitalize()
+        employee['telephone'] = telephone
+        employee['lieu_habitation'] = lieu_habitation
+        employee['departement'] = departement
 
         # Gestion de la photo si fournie
         if photo and photo.filename != '':
@@ -576,7 +798,7 @@ def update_employee(matricule):
                 }), 400
 
             # Supprimer l'ancienne photo si elle existe
-            old_photo = df.at[employee_index[0], 'image_path']
+            old_photo = employee['image_path']
             if old_photo and os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], old_photo)):
                 try:
                     os.remove(os.path.join(app.config['UPLOAD_FOLDER'], old_photo))
@@ -592,29 +814,26 @@ def update_employee(matricule):
             photo.save(photo_path)
             
             # Mise à jour du chemin de l'image
-            df.at[employee_index[0], 'image_path'] = filename
+            employee['image_path'] = filename
 
         # Sauvegarde des modifications
-        df.to_csv(db_path, index=False)
+        repository.update_employee(matricule, employee)
 
-        # Mise à jour dans les autres fichiers CSV
-        update_employee_in_all_files(matricule, {
-            'nom_complet': f"{prenom} {nom}",
-            'departement': departement
-        })
+        # Mise à jour dans les pointages, congés et missions
+        attendance_service.update_employee_identity(matricule, f"{prenom} {nom}", departement)
 
-        # Rechargement des visages
+        # Mise à jour du seul visage concerné (réencodage si nouvelle photo)
         try:
-            face_service.load_known_faces()
+            face_service.update_employee_face(employee, photo_changed=bool(photo and photo.filename != ''))
         except Exception as e:
-            print(f"Attention: erreur lors du rechargement des visages - {str(e)}")
+            print(f"Attention: erreur lors de la mise à jour du visage - {str(e)}")
 
         return jsonify({
             'status': 'success',
             'message': f'Employé {prenom} {nom} mis à jour avec succès',
             'data': {
                 'matricule': matricule,
-                'image_path': df.at[employee_index[0], 'image_path']
+                'image_path': employee['image_path']
             }
         })
 
@@ -625,47 +844,13 @@ def update_employee(matricule):
             'message': f'Une erreur est survenue: {str(e)}'
         }), 500
 
-def update_employee_in_all_files(matricule, new_data):
-    """Met à jour les informations de l'employé dans tous les fichiers CSV"""
-    # Mise à jour dans missions.csv
-    missions_file = os.path.join('data', 'MISSIONS', 'missions2025.csv')
-    if os.path.exists(missions_file):
-        df_missions = pd.read_csv(missions_file)
-        if 'matricule' in df_missions.columns:
-            df_missions.loc[df_missions['matricule'] == matricule, 'nom complet'] = new_data['nom_complet']
-            df_missions.loc[df_missions['matricule'] == matricule, 'departement'] = new_data['departement']
-            df_missions.to_csv(missions_file, index=False)
-
-    # Mise à jour dans conges.csv
-    leaves_file = os.path.join('data', 'CONGES', f'conges{datetime.now().year}.csv')
-    if os.path.exists(leaves_file):
-        df_leaves = pd.read_csv(leaves_file)
-        if 'matricule' in df_leaves.columns:
-            df_leaves.loc[df_leaves['matricule'] == matricule, 'nom complet'] = new_data['nom_complet']
-            df_leaves.to_csv(leaves_file, index=False)
-
-    # Mise à jour dans presents.csv
-    attendance_files = [f for f in os.listdir('data/PRESENTS') if f.startswith('presents')]
-    for file in attendance_files:
-        file_path = os.path.join('data/PRESENTS', file)
-        df_attendance = pd.read_csv(file_path)
-        if 'matricule' in df_attendance.columns:
-            df_attendance.loc[df_attendance['matricule'] == matricule, 'nom_complet'] = new_data['nom_complet']
-            df_attendance.loc[df_attendance['matricule'] == matricule, 'departement'] = new_data['departement']
-            df_attendance.to_csv(file_path, index=False)
-            
 @app.route('/api/employee/check/<matricule>', methods=['GET'])
 def check_matricule(matricule):
     if 'admin_logged_in' not in session:
         return jsonify({'error': 'Non autorisé'}), 401
     
     try:
-        db_path = os.path.join('data', 'database.csv')
-        exists = False
-        
-        if os.path.exists(db_path):
-            df = pd.read_csv(db_path)
-            exists = not df[df['matricule'].str.strip() == matricule.strip()].empty
+        exists = repository.employee_exists(matricule)
             
         return jsonify({
             'exists': exists,
@@ -679,6 +864,51 @@ def check_matricule(matricule):
     
     
     
+@app.route('/api/health')
+def health():
+    """Sonde de vie (répartiteur, supervision) : processus qui répond et base joignable, sans authentification"""
+    try:
+        repository.connection.execute('SELECT 1')
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': f'Base indisponible: {str(e)}'}), 503
+    return jsonify({
+        'status': 'ok',
+        'pid': os.getpid(),
+        'faces': len(face_service.gallery),
+        'gallery_version': face_service.gallery.version
+    })
+
+
+@app.route('/api/ready')
+def ready():
+    """Sonde de disponibilité : 200 une fois la galerie chargée, 503 avant ; progression du chargement en cours"""
+    loading = face_service.loading_progress()
+    started, finished = loading.pop('started_at'), loading.pop('finished_at')
+    is_ready = face_service.ready.is_set()
+    return jsonify({
+        'ready': is_ready,
+        **loading,
+        'percent': round(100 * loading['processed'] / loading['total'], 1) if loading['total'] else None,
+        'elapsed_s': round((finished or time.time()) - started, 1) if started else None,
+        'faces': len(face_service.gallery),
+        'gallery_version': face_service.gallery.version
+    }), 200 if is_ready else 503
+
+
+@app.route('/api/face-index/report')
+def get_face_index_report():
+    if 'admin_logged_in' not in session:
+        return jsonify({'error': 'Non autorisé'}), 401
+    
+    try:
+        k = request.args.get('k', 1, type=int)
+        sample = request.args.get('sample', 200, type=int)
+        return jsonify(face_service.index_report(k=k, sample=sample))
+    except Exception as e:
+        print(f"[ERREUR] Rapport index visages: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/load-logs')
 def get_load_logs():
     if 'admin_logged_in' not in session:
@@ -730,48 +960,18 @@ def add_leave():
             return jsonify({'error': f'Format de date invalide: {str(e)}'}), 400
             
         # Vérifier que l'employé existe
-        db_path = os.path.join('data', 'database.csv')
-        if not os.path.exists(db_path):
-            return jsonify({'error': 'Base de données des employés introuvable'}), 404
-            
-        df_employees = pd.read_csv(db_path)
-        if matricule not in df_employees['matricule'].values:
+        if not repository.employee_exists(matricule):
             return jsonify({'error': f'Matricule {matricule} non trouvé'}), 404
             
-        # Vérifier les chevauchements de congés
-        leaves_file = os.path.join('data', 'CONGES', f'conges{datetime.now().year}.csv')
-        if os.path.exists(leaves_file):
-            df_leaves = pd.read_csv(leaves_file)
-            
-            # Convertir les dates existantes en objets date pour comparaison
-            for _, row in df_leaves.iterrows():
-                if str(row['matricule']) == matricule:
-                    existing_start = datetime.strptime(row['date debut'], '%Y-%m-%d').date()
-                    existing_end = datetime.strptime(row['date fin'], '%Y-%m-%d').date()
-                    
-                    # Vérifier le chevauchement
-                    if not (fin_dt.date() < existing_start or debut_dt.date() > existing_end):
-                        return jsonify({
-                            'error': f'Congé existant du {existing_start} au {existing_end}'
-                        }), 400
-        
-        # Créer le répertoire si nécessaire
-        os.makedirs(os.path.dirname(leaves_file), exist_ok=True)
+        # Vérifier les chevauchements de congés (index sur matricule et dates)
+        existing = repository.find_overlap('leaves', matricule, date_debut, date_fin)
+        if existing is not None:
+            return jsonify({
+                'error': f'Congé existant du {existing["date_debut"]} au {existing["date_fin"]}'
+            }), 400
         
         # Ajouter le nouveau congé
-        new_leave = {
-            'matricule': [matricule],
-            'nom complet': [full_name],
-            'date debut': [date_debut],
-            'date fin': [date_fin]
-        }
-        
-        new_df = pd.DataFrame(new_leave)
-        if os.path.exists(leaves_file):
-            df_leaves = pd.read_csv(leaves_file)
-            new_df = pd.concat([df_leaves, new_df], ignore_index=True)
-        
-        new_df.to_csv(leaves_file, index=False)
+        repository.add_leave(matricule, full_name, date_debut, date_fin)
         
         return jsonify({'status': 'success'})
         
@@ -785,23 +985,9 @@ def delete_leave(matricule, date_debut):
         return jsonify({'error': 'Non autorisé'}), 401
     
     try:
-        year = datetime.now().year
-        leaves_file = os.path.join('data', 'CONGES', f'conges{year}.csv')
-        
-        if not os.path.exists(leaves_file):
-            return jsonify({'error': 'Aucun congé enregistré'}), 404
-            
-        df = pd.read_csv(leaves_file)
-        initial_count = len(df)
-        
-        # Suppression avec vérification du format de date
-        df = df[~((df['matricule'] == matricule) & 
-                 (df['date debut'] == date_debut))]
-        
-        if len(df) == initial_count:
+        if repository.delete_period('leaves', matricule, date_debut) == 0:
             return jsonify({'error': 'Congé non trouvé'}), 404
             
-        df.to_csv(leaves_file, index=False)
         return jsonify({'status': 'success'})
         
     except Exception as e:
@@ -810,18 +996,22 @@ def delete_leave(matricule, date_debut):
 
 
 @app.route('/api/leaves', methods=['GET'])
+@versioned('leaves')
 def get_leaves():
     
     if 'admin_logged_in' not in session:
         return jsonify({'error': 'Non autorisé'}), 401
     
     try:
+        paging = page_args()
+        if paging:
+            start_date, end_date = period_range(datetime.now().year)
+            df, total = repository.list_page('leaves', column_filters('matricule'), start_date=start_date,
+                                             end_date=end_date, **paging)
+            return page_response(df, total, paging)
+
         year = datetime.now().year
-        leaves_file = os.path.join('data', 'CONGES', f'conges{year}.csv')
-        if not os.path.exists(leaves_file):
-            return jsonify([])
-            
-        df = pd.read_csv(leaves_file)
+        df = repository.get_year_periods('leaves', year)
         
         # Filtrage par matricule si spécifié
         matricule = request.args.get('matricule')
@@ -839,6 +1029,8 @@ def get_leaves():
                 pass
                 
         return jsonify(df.to_dict('records'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         app.logger.error(f"Erreur récupération congés: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -854,21 +1046,15 @@ def delete_employee(matricule):
     
     try:
         # Vérifier d'abord si l'employé existe
-        db_path = os.path.join('data', 'database.csv')
-        if not os.path.exists(db_path):
-            return jsonify({'status': 'error', 'message': 'Base de données non trouvée'}), 404
-            
-        df = pd.read_csv(db_path)
-        if matricule not in df['matricule'].values:
+        employee_data = repository.get_employee(matricule)
+        if employee_data is None:
             return jsonify({'status': 'error', 'message': 'Employé non trouvé'}), 404
         
         # Récupérer le chemin de l'image avant suppression
-        employee_data = df[df['matricule'] == matricule].iloc[0]
         image_path = os.path.join('data', 'images', employee_data['image_path'])
         
         # Supprimer l'entrée de la base de données
-        df = df[df['matricule'] != matricule]
-        df.to_csv(db_path, index=False)
+        repository.delete_employee(matricule)
         
         # Supprimer l'image si elle existe
         if os.path.exists(image_path):
@@ -877,8 +1063,8 @@ def delete_employee(matricule):
             except Exception as e:
                 print(f"Erreur suppression image: {str(e)}")
         
-        # Recharger les visages connus
-        face_service.load_known_faces()
+        # Retirer le visage de l'employé supprimé
+        face_service.remove_employee_face(matricule)
         
         return jsonify({
             'status': 'success', 
@@ -899,12 +1085,7 @@ if __name__ == '__main__':
     os.makedirs('static/js', exist_ok=True)
     os.makedirs('static/images', exist_ok=True)
     
-    if not os.path.exists('data/database.csv'):
-        print("Création de la base de données initiale...")
-        df = pd.DataFrame(columns=['matricule', 'nom', 'prenom', 'telephone', 'lieu_habitation', 'departement', 'image_path'])
-        df.to_csv('data/database.csv', index=False)
-    
     print("\n=== Système prêt à fonctionner ===\n")
 
-
+    # Serveur de développement (rechargement automatique) ; en production : python serve.py --workers N
     app.run(debug=True, host='0.0.0.0', port=8000)
\ No newline at end of file
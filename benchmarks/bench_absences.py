@@ -0,0 +1,117 @@
+"""Compare absences et rapport du jour (instantané ensembliste) à l'ancienne boucle par employé.
+
+Usage : python benchmarks/bench_absences.py [effectifs...]
+Pour chaque effectif, une base SQLite temporaire est remplie avec un mois de
+pointages synthétiques (voir bench_tracking.populate) plus quelques missions.
+Les deux implémentations doivent produire exactement le même résultat ; la
+latence de la version ensembliste doit rester à peu près plate avec l'effectif.
+"""
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.repository import Repository
+from services.attendance import AttendanceService
+from bench_tracking import YEAR, populate, timed
+
+DAY = f'{YEAR}-01-15'
+
+
+def add_missions(repository, n_employees):
+    missions = [(f'E{i:05d}', f'E{i:05d}', 'Mission', f'{YEAR}-01-13', f'{YEAR}-01-17')
+                for i in range(0, n_employees, 7)]
+    with repository.transaction() as connection:
+        connection.executemany(
+            'INSERT INTO missions (matricule, nom_complet, nom_mission, date_debut, date_fin) VALUES (?, ?, ?, ?, ?)',
+            missions)
+
+
+def reference_absent(service, date, department=None):
+    """Ancienne implémentation : congé et mission vérifiés employé par employé"""
+    df_employees = service.repository.get_employees()
+    present_employees = service.repository.get_attendance(date, date)['matricule'].tolist()
+    absent_employees = []
+    for _, emp in df_employees.iterrows():
+        emp_dict = emp.to_dict()
+        if service.is_on_leave(emp_dict['matricule'], date) or service.is_on_mission(emp_dict['matricule'], date):
+            continue
+        if str(emp_dict['matricule']) not in present_employees:
+            emp_dict.update(status='absent', css_class='absent-row', message='Absent', date=date,
+                            heure_arrivee=None, heure_depart=None, duree='0h00min')
+            absent_employees.append(emp_dict)
+    if department and department.lower() != 'tous départements':
+        absent_employees = [emp for emp in absent_employees
+                            if str(emp['departement']).lower() == str(department).lower()]
+    return absent_employees
+
+
+def reference_reports(service, date, departement=None):
+    """Ancienne implémentation : any(...) imbriqués sur les pointages pour chaque employé"""
+    daily_attendance = service.get_daily_attendance(date)
+    df_employees = service.repository.get_employees()
+    if departement:
+        df_employees = df_employees[df_employees['departement'] == departement]
+        daily_attendance = [r for r in daily_attendance if r['departement'] == departement]
+
+    present_employees = absent_employees = 0
+    for emp in df_employees.to_dict('records'):
+        on_leave = service.is_on_leave(emp['matricule'], date)
+        on_mission = service.is_on_mission(emp['matricule'], date)
+        arrived = any(r['matricule'] == emp['matricule'] for r in daily_attendance if r.get('heure_arrivee'))
+        if (not on_leave or not on_mission) and arrived:
+            present_employees += 1
+        if not on_leave and not on_mission and not arrived:
+            absent_employees += 1
+
+    limit = datetime.strptime('08:15:00', '%H:%M:%S').time()
+    early = datetime.strptime('16:45:00', '%H:%M:%S').time()
+    return {
+        'total_employees': len(df_employees),
+        'present_today': present_employees,
+        'absent_today': absent_employees,
+        'late_arrivals': len([r for r in daily_attendance if r.get('heure_arrivee')
+                              and datetime.strptime(r['heure_arrivee'], '%H:%M:%S').time() > limit]),
+        'early_departures': len([r for r in daily_attendance if r.get('heure_depart')
+                                 and datetime.strptime(r['heure_depart'], '%H:%M:%S').time() < early]),
+        # Sortie manquante : non validée dans la base (la liste du jour affiche la sortie par défaut)
+        'missing_departures': sum(bool(r['heure_arrivee']) and not r['heure_depart']
+                                  for r in service.repository.query(
+                                      'SELECT heure_arrivee, heure_depart FROM attendance WHERE date = ?'
+                                      + (' AND departement = ?' if departement else ''),
+                                      (date, departement) if departement else (date,)))
+    }
+
+
+def main():
+    headcounts = [int(arg) for arg in sys.argv[1:]] or [500, 2000, 8000]
+
+    print(f"{'Effectif':>8} | {'Absents':>7} | {'Absents avant':>13} | {'après':>8} | "
+          f"{'Rapport avant':>13} | {'après':>8} | Identique")
+    print("-" * 86)
+    for n_employees in headcounts:
+        with tempfile.TemporaryDirectory() as tmp:
+            repository = Repository(os.path.join(tmp, 'bench.db'), data_dir=tmp)
+            populate(repository, n_employees, 1)
+            add_missions(repository, n_employees)
+            service = AttendanceService(repository)
+
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                expected_absent, absent_before = timed(reference_absent, service, DAY)
+                expected_reports, reports_before = timed(reference_reports, service, DAY)
+                absent, absent_after = timed(service.get_absent_employees, DAY)
+                reports, reports_after = timed(service.get_advanced_reports, DAY)
+
+            # Le rapport issu des agrégats ajoute heures supplémentaires et heures travaillées
+            same = absent == expected_absent and {key: reports[key] for key in expected_reports} == expected_reports
+            print(f"{n_employees:>8} | {len(absent):>7} | {absent_before:>11.2f} s | {absent_after:>6.3f} s | "
+                  f"{reports_before:>11.2f} s | {reports_after:>6.3f} s | {same}")
+            if not same:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
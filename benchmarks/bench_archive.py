@@ -0,0 +1,85 @@
+"""Compare les requêtes d'historique sur les fichiers mensuels CSV et sur l'archive Parquet partitionnée.
+
+Usage : python benchmarks/bench_archive.py [employes] [mois]
+Les pointages synthétiques (voir bench_tracking.populate) sont exportés dans
+l'arborescence PRESENTS historique puis synchronisés dans l'archive. Côté CSV,
+chaque requête liste le dossier et lit les fichiers entiers comme le faisait
+l'application ; côté archive, le manifeste élague les mois et seuls les
+colonnes et groupes de lignes utiles sont lus. Les deux doivent renvoyer les
+mêmes pointages.
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.repository import Repository
+from services.attendance_archive import AttendanceArchive, default_departures
+from bench_tracking import YEAR, populate, timed
+
+COLUMNS = ['matricule', 'date', 'heure_arrivee', 'heure_depart']
+
+
+def csv_history(presents_dir, start_date, end_date, matricule=None, departement=None):
+    """Ancienne lecture : tous les fichiers mensuels, filtrés après chargement"""
+    frames = [pd.read_csv(os.path.join(presents_dir, filename), dtype=str)
+              for filename in os.listdir(presents_dir) if filename.startswith('presents')]
+    df = pd.concat(frames, ignore_index=True)
+    mask = (df['date'] >= start_date) & (df['date'] <= end_date)
+    if matricule:
+        mask &= df['matricule'] == matricule
+    if departement:
+        mask &= df['departement'].str.lower() == departement.lower()
+    return df.loc[mask, COLUMNS]
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def main():
+    n_employees = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_months = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repository = Repository(os.path.join(tmp, 'bench.db'), data_dir=tmp)
+        populate(repository, n_employees, n_months)
+        repository.export_csv(tmp)
+        presents_dir = os.path.join(tmp, 'PRESENTS')
+        archive = AttendanceArchive(os.path.join(tmp, 'ARCHIVE'))
+        _, sync_time = timed(archive.sync, repository)
+
+        print(f"Synchronisation initiale : {sync_time:.2f} s")
+        print(f"Taille sur disque : CSV {directory_size(presents_dir) / 1e6:.1f} Mo, "
+              f"Parquet {directory_size(archive.root) / 1e6:.1f} Mo\n")
+        print(f"{'Requête':<28} | {'Lignes':>7} | {'CSV':>8} | {'Archive':>8} | Identique")
+        print("-" * 70)
+
+        cases = [
+            ('un mois', (f'{YEAR}-03-01', f'{YEAR}-03-31'), {}),
+            ('un trimestre', (f'{YEAR}-04-01', f'{YEAR}-06-31'), {}),
+            ('un département, un an', (f'{YEAR}-01-01', f'{YEAR}-12-31'), {'departement': 'informatique'}),
+            ('un employé, un an', (f'{YEAR}-01-01', f'{YEAR}-12-31'), {'matricule': 'E00007'})
+        ]
+        for label, (start_date, end_date), filters in cases:
+            expected, csv_time = timed(csv_history, presents_dir, start_date, end_date, **filters)
+            result, archive_time = timed(archive.read, start_date, end_date, COLUMNS, **filters)
+            result['date'] = result['date'].dt.strftime('%Y-%m-%d')
+            result = result.astype(object)
+            # L'archive garde la sortie brute ; les fichiers mensuels portent la sortie par défaut
+            departures = result['heure_depart'].to_numpy()
+            result['heure_depart'] = np.where(pd.isna(departures), default_departures(result['heure_arrivee']), departures)
+            key = ['date', 'matricule']
+            same = (expected.sort_values(key).fillna('').astype(str).reset_index(drop=True)
+                    .equals(result.sort_values(key).fillna('').astype(str).reset_index(drop=True)))
+            print(f"{label:<28} | {len(result):>7} | {csv_time:>6.2f} s | {archive_time:>6.3f} s | {same}")
+            if not same:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
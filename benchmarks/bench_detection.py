@@ -0,0 +1,87 @@
+"""Mesure latence et taux de reconnaissance du pipeline de détection selon le facteur de réduction.
+
+Usage : python benchmarks/bench_detection.py [repetitions]
+Référence : l'ancien pipeline (face_locations + face_encodings sur l'image entière).
+Chaque photo de data/images est reconnue si son encodage réduit retrouve sa propre
+référence sous le seuil de reconnaissance.
+"""
+import os
+import sys
+import time
+import numpy as np
+import face_recognition
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.detection import FaceDetector
+from services.recognizer import RECOGNITION_TOLERANCE
+
+IMAGES_DIR = os.path.join('data', 'images')
+SCALES = [1.0, 0.75, 0.5, 0.35, 0.25]
+
+
+def load_images():
+    images = {}
+    for filename in sorted(os.listdir(IMAGES_DIR)):
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+            images[filename] = face_recognition.load_image_file(os.path.join(IMAGES_DIR, filename))
+    return images
+
+
+def baseline(images, repetitions):
+    """Ancien pipeline : détection et encodage sur l'image pleine résolution"""
+    references = {}
+    elapsed = 0.0
+    for filename, image in images.items():
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            locations = face_recognition.face_locations(image)
+            encodings = face_recognition.face_encodings(image, locations[:1])
+            elapsed += time.perf_counter() - start
+        if encodings:
+            references[filename] = encodings[0]
+    return references, 1000 * elapsed / (len(images) * repetitions)
+
+
+def evaluate(detector, images, references, repetitions):
+    names = list(references)
+    matrix = np.array([references[name] for name in names])
+    detected = recognized = 0
+    elapsed = 0.0
+    for filename, image in images.items():
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            locations, encodings = detector.detect_and_encode(image, max_faces=1)
+            elapsed += time.perf_counter() - start
+        if not encodings:
+            continue
+        detected += 1
+        distances = np.linalg.norm(matrix - encodings[0], axis=1)
+        best = int(np.argmin(distances))
+        if names[best] == filename and distances[best] < RECOGNITION_TOLERANCE:
+            recognized += 1
+    return 1000 * elapsed / (len(images) * repetitions), detected, recognized
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    images = load_images()
+    references, baseline_ms = baseline(images, repetitions)
+    print(f"{len(images)} photos, {repetitions} répétitions")
+    print(f"Référence (image entière, upsample=1): {baseline_ms:.1f} ms/photo, {len(references)} visages encodés\n")
+
+    for max_side in (None, 640):
+        label = 'taille originale' if max_side is None else f'plafonné à {max_side}px (borne)'
+        print(f"--- {label} ---")
+        print(f"{'Échelle':>8} | {'Upsample':>8} | {'Latence':>10} | {'Gain':>6} | {'Détectés':>8} | {'Reconnus':>8}")
+        for scale in SCALES:
+            for upsample in (0, 1):
+                detector = FaceDetector(scale=scale, upsample=upsample, max_side=max_side)
+                latency, detected, recognized = evaluate(detector, images, references, repetitions)
+                print(f"{scale:>8.2f} | {upsample:>8} | {latency:>7.1f} ms | {baseline_ms / latency:>5.1f}x | "
+                      f"{detected:>4}/{len(images):<3} | {recognized:>4}/{len(references):<3}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
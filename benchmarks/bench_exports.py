@@ -0,0 +1,90 @@
+"""Mémoire des exports en flux (CSV, XLSX) comparée à la liste JSON complète du suivi.
+
+Usage : python benchmarks/bench_exports.py [effectifs...]
+Pour chaque effectif, une base SQLite temporaire est remplie avec trois mois de
+pointages synthétiques (voir bench_tracking.populate). Le pic d'allocation
+(tracemalloc) de get_employee_tracking croît avec le nombre de lignes ; celui des
+exports doit rester à peu près constant. Le CSV exporté doit contenir exactement
+les lignes de get_employee_tracking, dans le même ordre, et l'export des
+absences celles de get_absent_employees.
+"""
+import io
+import os
+import sys
+import tempfile
+import tracemalloc
+from contextlib import redirect_stdout
+import pandas as pd
+from openpyxl import load_workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.repository import Repository
+from services.attendance import AttendanceService
+from services.exports import AttendanceExporter, TRACKING_FIELDS, ABSENCE_FIELDS
+from bench_tracking import YEAR, populate, timed
+
+START, END = f'{YEAR}-01-01', f'{YEAR}-03-31'
+
+
+def peak(function, *args):
+    """Résultat et pic d'allocation (Mo) d'un appel"""
+    tracemalloc.start()
+    result = function(*args)
+    _, peak_size = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak_size / 2 ** 20
+
+
+def consume(chunks):
+    """Parcourt le flux comme le ferait le serveur ; retourne sa taille en octets"""
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+    return size
+
+
+def read_csv(chunks):
+    return pd.read_csv(io.BytesIO(b''.join(chunks)), dtype=str, keep_default_na=False)
+
+
+def main():
+    headcounts = [int(arg) for arg in sys.argv[1:]] or [200, 800, 3200]
+
+    print(f"{'Effectif':>8} | {'Lignes':>7} | {'JSON':>8} | {'CSV':>8} | {'XLSX':>8} | {'Temps CSV':>9} | Identique")
+    print("-" * 76)
+    for n_employees in headcounts:
+        with tempfile.TemporaryDirectory() as tmp:
+            repository = Repository(os.path.join(tmp, 'bench.db'), data_dir=tmp, group_commit=False)
+            populate(repository, n_employees, 3)
+            service = AttendanceService(repository)
+            exporter = AttendanceExporter(service)
+
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                rows, json_peak = peak(service.get_employee_tracking, None, None, None)
+                _, csv_peak = peak(consume, exporter.stream(exporter.tracking(), TRACKING_FIELDS, 'csv', 'Suivi'))
+                _, xlsx_peak = peak(consume, exporter.stream(exporter.tracking(START, END), TRACKING_FIELDS,
+                                                             'xlsx', 'Suivi'))
+                _, csv_time = timed(consume, exporter.stream(exporter.tracking(), TRACKING_FIELDS, 'csv', 'Suivi'))
+
+                expected = pd.DataFrame(rows, columns=TRACKING_FIELDS).fillna('')
+                exported = read_csv(exporter.stream(exporter.tracking(), TRACKING_FIELDS, 'csv', 'Suivi'))
+                same = exported.equals(expected.astype(str))
+
+                workbook = load_workbook(io.BytesIO(b''.join(
+                    exporter.stream(exporter.tracking(START, END), TRACKING_FIELDS, 'xlsx', 'Suivi'))), read_only=True)
+                same &= sum(1 for _ in workbook.active.iter_rows()) == len(rows) + 1
+
+                day = f'{YEAR}-01-15'
+                absent = pd.DataFrame(service.get_absent_employees(day), columns=ABSENCE_FIELDS).fillna('')
+                same &= read_csv(exporter.stream(exporter.absences(day), ABSENCE_FIELDS, 'csv', 'Absences')).equals(
+                    absent.astype(str))
+
+            print(f"{n_employees:>8} | {len(rows):>7} | {json_peak:>5.1f} Mo | {csv_peak:>5.1f} Mo | "
+                  f"{xlsx_peak:>5.1f} Mo | {csv_time:>7.2f} s | {same}")
+            if not same:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
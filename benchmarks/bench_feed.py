@@ -0,0 +1,103 @@
+"""Flux SSE des pointages comparé au rechargement complet des panneaux du jour.
+
+Usage : python benchmarks/bench_feed.py [effectif] [pointages] [pointages_par_seconde]
+Une base SQLite temporaire contient l'effectif ; des pointages arrivent au rythme
+donné (50/s par défaut, bien au-delà d'une entrée de bâtiment) pendant qu'un
+abonné lit le flux. Pour chaque pointage, le tableau de bord recevait auparavant
+toute la journée (/api/attendance et /api/present-employees) ; il reçoit désormais
+un seul événement. Vérifie que l'abonné reçoit chaque pointage une seule fois et
+dans l'ordre, qu'une reprise après un identifiant redonne exactement la suite, et
+que les lignes appliquées localement égalent get_daily_attendance.
+"""
+import json
+import os
+import sys
+import time
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from datetime import datetime
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.repository import Repository
+from services.attendance import AttendanceService
+from bench_tracking import populate
+
+
+def parse(message):
+    """Champs d'un message SSE (les commentaires et 'retry' n'en ont pas)"""
+    fields = dict(line.split(': ', 1) for line in message.strip().split('\n') if not line.startswith(':'))
+    return fields if 'event' in fields else None
+
+
+def subscribe(service, last_id, received, count):
+    """Lit le flux jusqu'à count événements ; note l'heure de réception de chacun"""
+    for message in service.feed.stream(last_id):
+        fields = parse(message)
+        if fields:
+            received.append((time.perf_counter(), fields))
+            if len(received) == count:
+                return
+
+
+def main():
+    n_employees = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_scans = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 50
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repository = Repository(os.path.join(tmp, 'bench.db'), data_dir=tmp)
+        populate(repository, n_employees, 1)
+        service = AttendanceService(repository)
+
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            # Arrivées de la moitié de l'effectif avant l'ouverture du tableau de bord
+            for i in range(n_employees // 2):
+                service.record_attendance(f'E{i:05d}', f'E{i:05d}', 'Informatique')
+            _, start_id = repository.event_bounds()
+
+            received, sent = [], []
+            subscriber = threading.Thread(target=subscribe, args=(service, None, received, n_scans))
+            subscriber.start()
+            time.sleep(0.2)
+            for i in range(n_scans):
+                matricule = f'E{n_employees // 2 + i:05d}'
+                sent.append(time.perf_counter())
+                service.record_attendance(matricule, matricule, 'Informatique')
+                time.sleep(max(0.0, sent[-1] + 1 / rate - time.perf_counter()))
+            subscriber.join(timeout=30)
+
+            replay = []
+            subscribe(service, start_id, replay, n_scans)
+
+            day = service.get_daily_attendance(today)
+            full_day = len(json.dumps(day)) + len(json.dumps(service.get_current_present_employees()))
+            started = time.perf_counter()
+            service.get_daily_attendance(today)
+            service.get_current_present_employees()
+            reload_time = time.perf_counter() - started
+
+        ids = [int(fields['id']) for _, fields in received]
+        same = len(received) == n_scans and ids == sorted(set(ids)) and ids[0] == start_id + 1
+        same &= [fields for _, fields in replay] == [fields for _, fields in received]
+        records = {row['matricule']: row for row in day}
+        same &= all(json.loads(fields['data'])['record'] == records[json.loads(fields['data'])['matricule']]
+                    for _, fields in received)
+
+        latencies = np.array([at for at, _ in received]) - np.array(sent[:len(received)])
+        event_size = np.mean([len(fields['data']) for _, fields in received])
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(f"{n_employees} employés, {n_scans} pointages suivis en direct ({rate:.0f}/s)")
+        print(f"Rechargement complet : {full_day / 1024:>8.1f} Ko, {reload_time * 1000:>6.1f} ms par rafraîchissement")
+        print(f"Événement SSE        : {event_size / 1024:>8.2f} Ko, pointage -> abonné p50 {p50:.1f} ms, "
+              f"p99 {p99:.1f} ms")
+        print(f"Reprise et contenu identiques : {same}")
+        if not same:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Pages du suivi et des listes (LIMIT/OFFSET en base) comparées aux listes complètes.
+
+Usage : python benchmarks/bench_pagination.py [effectifs...]
+Pour chaque effectif, une base SQLite temporaire est remplie avec trois mois de
+pointages synthétiques (voir bench_tracking.populate). Une page de 50 lignes ne lit
+que ces lignes (plus un COUNT) ; la concaténation de toutes les pages doit redonner
+exactement get_employee_tracking et la liste des employés, dans le même ordre.
+"""
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.repository import Repository
+from services.attendance import AttendanceService
+from bench_tracking import populate, timed
+
+PAGE = 50
+
+
+def all_pages(fetch):
+    """Toutes les lignes, page par page"""
+    items, offset = [], 0
+    while True:
+        page = fetch(offset)
+        items.extend(page['items'])
+        offset += PAGE
+        if offset >= page['total']:
+            return items, page['total']
+
+
+def main():
+    headcounts = [int(arg) for arg in sys.argv[1:]] or [200, 800, 3200]
+
+    print(f"{'Effectif':>8} | {'Lignes':>7} | {'Liste complète':>14} | {'Une page':>8} | {'Page 100':>8} | Identique")
+    print("-" * 72)
+    for n_employees in headcounts:
+        with tempfile.TemporaryDirectory() as tmp:
+            repository = Repository(os.path.join(tmp, 'bench.db'), data_dir=tmp, group_commit=False)
+            populate(repository, n_employees, 3)
+            service = AttendanceService(repository)
+
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                expected, full_time = timed(service.get_employee_tracking, None, None, None)
+                first, page_time = timed(service.get_tracking_page, limit=PAGE)
+                _, deep_time = timed(service.get_tracking_page, limit=PAGE, offset=100 * PAGE)
+
+                pages, total = all_pages(lambda offset: service.get_tracking_page(limit=PAGE, offset=offset))
+                same = pages == expected and total == len(expected)
+
+                department = 'Informatique'
+                pages, _ = all_pages(lambda offset: service.get_tracking_page(
+                    departement=department, start_date='2025-02-01', end_date='2025-02-28', limit=PAGE,
+                    offset=offset))
+                same &= pages == service.get_employee_tracking(None, department, '2025-02')
+
+                def employees(offset):
+                    df, total = repository.list_page('employees', sort=['departement', '-matricule'], limit=PAGE,
+                                                     offset=offset)
+                    return {'items': df.to_dict('records'), 'total': total}
+                pages, _ = all_pages(employees)
+                reference = repository.get_employees().sort_values(['departement', 'matricule'],
+                                                                   ascending=[True, False], kind='stable')
+                same &= pd.DataFrame(pages).equals(reference.reset_index(drop=True))
+
+            print(f"{n_employees:>8} | {len(expected):>7} | {full_time:>12.3f} s | {page_time:>6.3f} s | "
+                  f"{deep_time:>6.3f} s | {same}")
+            if not same:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
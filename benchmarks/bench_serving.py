@@ -0,0 +1,210 @@
+"""Mémoire et débit : serveur de développement (app.run debug) contre serveur préforké (serve.py).
+
+Usage : python benchmarks/bench_serving.py [visages] [processus] [secondes]
+Chaque mode est lancé dans un sous-processus (dossier et base temporaires) avec une
+galerie synthétique de N visages ajoutée après l'import de l'application, comme si
+elle avait été encodée depuis data/images. Mémoire de chaque processus du serveur lue
+dans /proc/<pid>/smaps_rollup : RSS, PSS (pages partagées réparties entre les
+processus qui les utilisent) et pages privées. Le premier processus est le maître
+(préforké) ou le surveillant du rechargement automatique (debug) ; les suivants
+servent les requêtes (le processus de suivi des segments partagés, compté dans le
+total, n'en sert pas). Débit : 8 clients concurrents (session administrateur) sur
+/api/health puis sur /api/face-index/report (recherche exacte dans toute la galerie).
+Propagation : délai entre la suppression d'un agent (traitée par un seul processus)
+et le moment où chaque processus serveur l'a retiré de sa galerie (/api/health).
+"""
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLIENTS = 8
+
+
+def fill_gallery(gallery, n_faces, seed=0):
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0, 0.1, (n_faces, gallery.dim)).astype(np.float32)
+    for i, encoding in enumerate(encodings):
+        gallery.add(encoding, {'matricule': f'E{i:06d}', 'nom': f'Nom{i}', 'prenom': f'Prenom{i}',
+                               'telephone': '', 'lieu_habitation': '', 'departement': 'Informatique',
+                               'image_path': f'e{i:06d}.jpg'})
+
+
+def run_server(mode, port, n_faces, workers):
+    """Sous-processus : application importée, galerie synthétique, puis le mode de service demandé"""
+    sys.path.insert(0, ROOT)
+    import app as application
+    # Chargement depuis la base (vide) terminé avant d'y ajouter la galerie synthétique
+    application.face_service.wait_loaded()
+    fill_gallery(application.face_service.gallery, n_faces)
+    # Le premier visage synthétique existe aussi en base, pour mesurer la propagation de sa suppression
+    # (le rechargement automatique du mode debug relance ce script sur la même base)
+    if not application.repository.employee_exists('E000000'):
+        application.repository.add_employee({'matricule': 'E000000', 'nom': 'Nom0', 'prenom': 'Prenom0',
+                                             'telephone': '', 'lieu_habitation': '', 'departement': 'Informatique',
+                                             'image_path': ''})
+    if mode == 'dev':
+        application.app.run(debug=True, host='127.0.0.1', port=port)
+    else:
+        from serve import serve
+        serve(application, '127.0.0.1', port, workers)
+
+
+def memory(pid):
+    """RSS, PSS et pages privées (Mo) d'un processus"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return values['Rss'], values['Pss'], values['Private_Clean'] + values['Private_Dirty']
+
+
+def process_tree(root_pid):
+    """Le processus lancé et tous ses descendants"""
+    parents = {}
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            try:
+                with open(f'/proc/{name}/stat') as f:
+                    parents[int(name)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except OSError:
+                pass
+    tree, frontier = [root_pid], [root_pid]
+    while frontier:
+        children = [pid for pid, parent in parents.items() if parent in frontier]
+        tree.extend(children)
+        frontier = children
+    return tree
+
+
+def is_helper(pid):
+    """Processus auxiliaire qui ne sert pas de requêtes (suivi des segments partagés de multiprocessing)"""
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            return b'resource_tracker' in f.read()
+    except OSError:
+        return False
+
+
+def request(port, path, cookie=None, method='GET', body=None, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        headers = dict(headers or {})
+        if cookie:
+            headers['Cookie'] = cookie
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response
+    finally:
+        connection.close()
+
+
+def wait_ready(port, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if request(port, '/api/health').status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Serveur non prêt sur le port {port}")
+
+
+def login(port):
+    response = request(port, '/admin/login', method='POST', body='username=DB&password=CarbaDB',
+                       headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    return response.getheader('Set-Cookie').split(';', 1)[0]
+
+
+def throughput(port, path, cookie, seconds):
+    """Requêtes réussies par seconde avec CLIENTS clients en parallèle"""
+    done = [0] * CLIENTS
+    stop_at = time.time() + seconds
+
+    def client(c):
+        while time.time() < stop_at:
+            if request(port, path, cookie).status == 200:
+                done[c] += 1
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(done) / seconds
+
+
+def propagation(port, cookie, n_servers, n_faces, timeout=10):
+    """Secondes entre la suppression d'un agent et son retrait dans tous les processus serveurs (None : jamais)"""
+    started = time.time()
+    request(port, '/api/employee/delete/E000000', cookie, method='DELETE')
+    updated = set()
+    while time.time() - started < timeout:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        connection.request('GET', '/api/health')
+        health = json.loads(connection.getresponse().read())
+        connection.close()
+        if health['faces'] == n_faces - 1:
+            updated.add(health['pid'])
+            if len(updated) == n_servers:
+                return time.time() - started
+    return None
+
+
+def measure(mode, port, n_faces, workers, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, LIGGEEY_DATABASE=os.path.join(tmp, 'bench.db'), RECOGNITION_WORKERS='0')
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, str(port),
+                                   str(n_faces), str(workers)], cwd=tmp, env=env, start_new_session=True,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(port)
+            time.sleep(2)
+            cookie = login(port)
+            health = throughput(port, '/api/health', cookie, seconds)
+            report = throughput(port, '/api/face-index/report?sample=20', cookie, seconds)
+            tree = process_tree(server.pid)
+            helpers = [memory(pid) for pid in tree if is_helper(pid)]
+            processes = [memory(pid) for pid in tree if not is_helper(pid)]
+            delay = propagation(port, cookie, len(processes) - 1, n_faces)
+        finally:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait(timeout=60)
+    return processes, helpers, health, report, delay
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        run_server(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5]))
+        return
+
+    n_faces = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    print(f"{n_faces} visages, {CLIENTS} clients, {os.cpu_count()} processeur(s)")
+    print(f"{'Mode':>16} | {'Processus':>9} | {'RSS maître':>10} | {'RSS / serveur':>13} | {'Privé / serveur':>15} | "
+          f"{'PSS total':>9} | {'health':>7} | {'recherche':>9} | Propagation")
+    print("-" * 121)
+    for label, mode, port in (('app.run(debug)', 'dev', 8701), (f'serve.py ({workers})', 'prefork', 8702)):
+        processes, helpers, health, report, delay = measure(mode, port, n_faces, workers, seconds)
+        servers = processes[1:]
+        print(f"{label:>16} | {len(processes + helpers):>9} | {processes[0][0]:>7.0f} Mo | "
+              f"{np.mean([p[0] for p in servers]):>10.0f} Mo | {np.mean([p[2] for p in servers]):>12.0f} Mo | "
+              f"{sum(p[1] for p in processes + helpers):>6.0f} Mo | {health:>5.0f}/s | {report:>7.1f}/s | "
+              f"{'jamais' if delay is None else f'{delay * 1000:.0f} ms'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Démarrage : chargement bloquant des visages connus contre chargement en arrière-plan.
+
+Usage : python benchmarks/bench_startup.py [employés] [ms_par_photo]
+Base et dossier data/images temporaires ; l'encodage d'une photo est simulé (pause de
+ms_par_photo puis encodage déterministe dérivé du fichier) pour ne mesurer que
+l'organisation du chargement. Mesure le délai avant que FaceService rende la main
+(avant : tout l'effectif encodé ; maintenant : immédiat) et la durée du chargement.
+Pendant le chargement en arrière-plan, un lecteur relit la galerie en continu : elle
+ne doit jamais être à moitié construite, et encodages et métadonnées restent alignés.
+Un agent ajouté et un agent supprimé pendant le chargement doivent l'être aussi dans
+la galerie installée. Une fois la galerie installée, des enrôlements, mises à jour et
+retraits se succèdent pendant que le lecteur continue : aucune lecture ne doit voir des
+encodages et des métadonnées désalignés.
+"""
+import os
+import sys
+import time
+import threading
+import zlib
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.repository import Repository
+from services.encoding_cache import EncodingCache
+from services.face_service import FaceService
+
+
+def simulated_encoding(image_path):
+    rng = np.random.default_rng(zlib.crc32(os.path.basename(image_path).encode()))
+    return rng.normal(0, 0.1, 128)
+
+
+def simulate_encoding(cost):
+    def encode_file(self, image_path):
+        time.sleep(cost)
+        return self.key_for_bytes(image_path.encode()), simulated_encoding(image_path), True
+    EncodingCache.encode_file = encode_file
+
+
+def populate(repository, n_employees):
+    os.makedirs(os.path.join('data', 'images'), exist_ok=True)
+    employees = [(f'E{i:05d}', f'NOM{i}', f'Prenom{i}', '', '', 'Informatique', f'e{i:05d}.jpg')
+                 for i in range(n_employees)]
+    for employee in employees:
+        with open(os.path.join('data', 'images', employee[6]), 'wb') as f:
+            f.write(b'photo')
+    with repository.transaction() as connection:
+        connection.executemany('INSERT INTO employees VALUES (?, ?, ?, ?, ?, ?, ?)', employees)
+    return employees
+
+
+def consistent(gallery, sizes):
+    """Galerie de l'une des tailles attendues, chaque encodage correspondant à la photo de sa ligne"""
+    encodings, metadata = gallery.encodings, gallery.metadata
+    if len(encodings) != len(metadata) or len(encodings) not in sizes:
+        return False
+    rows = range(0, len(encodings), max(len(encodings) // 50, 1))
+    return all(np.allclose(encodings[row], simulated_encoding(metadata[row]['image_path'])) for row in rows)
+
+
+def edit_while_reading(service, n_employees, rounds=100):
+    """Enrôlements, mises à jour et retraits sur la galerie servie pendant qu'un autre thread la relit"""
+    stop, reads, inconsistent = threading.Event(), [0], [0]
+
+    def read():
+        while not stop.is_set():
+            reads[0] += 1
+            # Tailles possibles : effectif complet (après un réenrôlement ou une mise à jour) ou un agent de moins
+            inconsistent[0] += not consistent(service.gallery, (n_employees - 1, n_employees))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for i in range(rounds):
+            employee = service.repository.get_employee(f'E{i + 1:05d}')
+            service.remove_employee_face(employee['matricule'])
+            service.enroll_employee(employee)
+            service.update_employee_face(dict(employee, nom=f'NOUVEAU{i}'))
+    finally:
+        stop.set()
+        reader.join()
+    return 3 * rounds, reads[0], inconsistent[0]
+
+
+def main():
+    n_employees = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    cost = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.002
+    simulate_encoding(cost)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        repository = Repository(os.path.join(tmp, 'bench.db'), data_dir=tmp)
+        populate(repository, n_employees)
+
+        started = time.perf_counter()
+        FaceService(repository=repository, background=False)
+        blocking = time.perf_counter() - started
+
+        started = time.perf_counter()
+        service = FaceService(repository=repository)
+        returned = time.perf_counter() - started
+
+        reads, inconsistent, progress = 0, 0, []
+        late = {'matricule': 'LATE1', 'nom': 'LATE', 'prenom': 'Agent', 'telephone': '', 'lieu_habitation': '',
+                'departement': 'Informatique', 'image_path': 'late.jpg'}
+        with open(os.path.join('data', 'images', 'late.jpg'), 'wb') as f:
+            f.write(b'photo')
+        while not service.ready.is_set():
+            reads += 1
+            # Vide, puis le seul agent ajouté pendant le chargement, puis l'effectif complet
+            inconsistent += not consistent(service.gallery, (0, 1, n_employees))
+            progress.append(service.loading_progress()['processed'])
+            if len(progress) == 20:
+                # Ajout et suppression arrivés pendant la lecture de l'effectif
+                repository.add_employee(late)
+                service.enroll_employee(late)
+                service.remove_employee_face('E00000')
+            time.sleep(0.005)
+        service.wait_loaded()
+        loaded = time.perf_counter() - started
+
+        gallery = service.gallery
+        kept = gallery.find('LATE1') is not None and gallery.find('E00000') is None
+        same = inconsistent == 0 and kept and len(gallery) == n_employees and len(progress) >= 20
+        same &= progress == sorted(progress) and service.loading_progress()['state'] == 'pret'
+
+        edits, edit_reads, edit_inconsistent = edit_while_reading(service, n_employees)
+        same &= edit_inconsistent == 0
+
+    print(f"{n_employees} employés, encodage simulé {cost * 1000:.1f} ms par photo")
+    print(f"Chargement bloquant     : service disponible après {blocking * 1000:>8.1f} ms")
+    print(f"Chargement arrière-plan : service disponible après {returned * 1000:>8.1f} ms, "
+          f"galerie installée après {loaded * 1000:.1f} ms")
+    print(f"Lectures pendant le chargement : {reads}, incohérentes : {inconsistent}")
+    print(f"Ajout et suppression pendant le chargement conservés : {kept}")
+    print(f"Après chargement : {edits} modifications, {edit_reads} lectures, incohérentes : {edit_inconsistent}")
+    print(f"Galerie et progression cohérentes : {same}")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
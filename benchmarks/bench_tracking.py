@@ -0,0 +1,203 @@
+"""Compare le suivi des employés vectorisé à l'ancienne implémentation ligne par ligne.
+
+Usage : python benchmarks/bench_tracking.py [employes] [mois]
+Le jeu de données est synthétique (base SQLite temporaire) : pointages des jours
+ouvrés avec quelques heures mal formées ou sorties vides, congés dont certains
+commencent l'année précédente, et jours fériés (dont une plage de plusieurs jours).
+Les deux implémentations doivent produire exactement la même liste.
+"""
+import os
+import sys
+import time
+import tempfile
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.repository import Repository
+from services.attendance import AttendanceService
+
+YEAR = 2025
+ODD_TIMES = [' 08:00:00', '8:5:3', '25:00:00', '08:00', '07:59:60']
+
+
+def random_time(rng, center, spread):
+    seconds = int(np.clip(rng.normal(center, spread), 0, 86399))
+    return f'{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
+
+
+def populate(repository, n_employees, n_months, seed=0):
+    rng = np.random.default_rng(seed)
+    departments = ['Informatique', 'Bourse nationale', 'Comptabilité', 'Direction']
+    employees = [(f'E{i:05d}', f'NOM{i}', f'Prenom{i}', '', '', departments[i % len(departments)], '')
+                 for i in range(n_employees)]
+
+    attendance = []
+    day = date(YEAR, 1, 1)
+    while day.month <= n_months and day.year == YEAR:
+        if day.weekday() < 5:
+            for matricule, nom, prenom, _, _, departement, _ in employees:
+                if rng.random() < 0.1:
+                    continue
+                arrival = random_time(rng, 8 * 3600, 1800)
+                departure = random_time(rng, 17 * 3600, 2400)
+                draw = rng.random()
+                if draw < 0.01:
+                    arrival = ODD_TIMES[rng.integers(len(ODD_TIMES))]
+                elif draw < 0.02:
+                    departure = ODD_TIMES[rng.integers(len(ODD_TIMES))]
+                elif draw < 0.03:
+                    departure = ''
+                elif draw < 0.05:
+                    departure = None
+                attendance.append((matricule, f'{prenom} {nom}', departement, day.isoformat(),
+                                   arrival, departure, f'{rng.integers(1 << 32):08X}'))
+        day += timedelta(days=1)
+
+    leaves = []
+    for _ in range(n_employees // 4):
+        matricule = employees[rng.integers(n_employees)][0]
+        start = date(YEAR - 1, 12, 1) + timedelta(days=int(rng.integers(0, 30 * (n_months + 1))))
+        end = start + timedelta(days=int(rng.integers(0, 21)))
+        leaves.append((matricule, matricule, start.isoformat(), end.isoformat()))
+
+    holidays = [('Nouvel an', f'{YEAR}-01-01', f'{YEAR}-01-01'), ('Tabaski', f'{YEAR}-06-06', f'{YEAR}-06-09'),
+                ('Fête Nationale', f'{YEAR}-04-04', f'{YEAR}-04-04'), ('Noël', f'{YEAR}-12-25', f'{YEAR}-12-25')]
+
+    with repository.transaction() as connection:
+        connection.executemany('INSERT INTO employees VALUES (?, ?, ?, ?, ?, ?, ?)', employees)
+        connection.executemany(
+            'INSERT INTO attendance (matricule, nom_complet, departement, date, heure_arrivee, heure_depart, signature) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', attendance)
+        connection.executemany('INSERT INTO leaves (matricule, nom_complet, date_debut, date_fin) VALUES (?, ?, ?, ?)',
+                               leaves)
+        connection.executemany('INSERT INTO holidays (description, date_debut, date_fin) VALUES (?, ?, ?)', holidays)
+    return len(attendance)
+
+
+def reference_status(record):
+    """Ancien determine_status : seuils en dur, analysés par strptime à chaque appel"""
+    try:
+        if pd.isna(record['heure_arrivee']):
+            return {'status': 'absent', 'css_class': 'absent-row'}
+        arrival = datetime.strptime(record['heure_arrivee'], '%H:%M:%S').time()
+        if pd.isna(record['heure_depart']) or record['heure_depart'] == '':
+            return {'status': 'missing-departure', 'css_class': 'missing-departure-row'}
+        departure = datetime.strptime(record['heure_depart'], '%H:%M:%S').time()
+        max_arrival = datetime.strptime('08:15:00', '%H:%M:%S').time()
+        min_departure = datetime.strptime('16:45:00', '%H:%M:%S').time()
+        late_threshold = datetime.strptime('17:45:00', '%H:%M:%S').time()
+        if arrival <= max_arrival and departure >= late_threshold:
+            return {'status': 'overtime', 'css_class': 'overtime-row'}
+        late_arrival = arrival > max_arrival
+        early_departure = departure < min_departure
+        if late_arrival and early_departure:
+            return {'status': 'irregular', 'css_class': 'irregular-row'}
+        elif late_arrival:
+            return {'status': 'late', 'css_class': 'late-row'}
+        elif early_departure:
+            return {'status': 'early', 'css_class': 'early-row'}
+        return {'status': 'normal', 'css_class': 'normal-row'}
+    except Exception:
+        return {'status': 'error', 'css_class': 'error-row'}
+
+
+def reference_format_time(time_str):
+    """Ancien format_time : heure 'HH:MM:SS' relue par strptime, None si vide ou illisible"""
+    if pd.isna(time_str) or not str(time_str).strip():
+        return None
+    try:
+        return datetime.strptime(str(time_str).strip(), '%H:%M:%S').strftime('%H:%M:%S')
+    except ValueError:
+        return None
+
+
+def reference_duration(start, end):
+    """Ancien calculate_duration : durée 'XhYYmin' entre deux heures (sortie le lendemain si antérieure)"""
+    if not start or pd.isna(start) or not end or pd.isna(end):
+        return '0h00min'
+    try:
+        start_time = datetime.strptime(str(start), '%H:%M:%S')
+        end_time = datetime.strptime(str(end), '%H:%M:%S')
+        if end_time < start_time:
+            end_time += timedelta(days=1)
+        duration = end_time - start_time
+        hours = int(duration.total_seconds() // 3600)
+        minutes = int((duration.total_seconds() % 3600) // 60)
+        return f"{hours}h{minutes:02d}min"
+    except Exception:
+        return '0h00min'
+
+
+def reference_tracking(service, matricule=None, departement=None, month=None):
+    """Ancienne implémentation : une ligne à la fois, chaque heure analysée par strptime"""
+    start_date = end_date = None
+    if month:
+        start_date, end_date = f'{month}-01', f'{month}-31'
+    if departement and str(departement).lower() == 'tous départements':
+        departement = None
+    df = service.repository.get_attendance(start_date, end_date, matricule, departement)
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df = df.dropna(subset=['date'])
+
+    records = []
+    for _, row in df.iterrows():
+        if not service.is_holiday(row['date']) and not service.is_on_leave(row['matricule'], row['date']):
+            status_info = reference_status(row)
+            heure_arrivee = reference_format_time(row['heure_arrivee'])
+            heure_depart = reference_format_time(row['heure_depart'])
+            records.append({
+                'matricule': str(row['matricule']),
+                'nom_complet': str(row['nom_complet']),
+                'departement': str(row['departement']),
+                'date': row['date'].strftime('%Y-%m-%d'),
+                'heure_arrivee': heure_arrivee,
+                'heure_depart': heure_depart,
+                'duree': reference_duration(heure_arrivee, heure_depart),
+                'signature': str(row.get('signature', '')),
+                'status': status_info['status'],
+                'css_class': status_info['css_class']
+            })
+    records.sort(key=lambda x: x['date'], reverse=True)
+    return records
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    n_employees = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_months = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repository = Repository(os.path.join(tmp, 'bench.db'), data_dir=tmp)
+        n_rows = populate(repository, n_employees, n_months)
+        service = AttendanceService(repository)
+        print(f"Jeu synthétique: {n_employees} employés, {n_months} mois, {n_rows} pointages\n")
+        print(f"{'Requête':<28} | {'Lignes':>7} | {'Ligne à ligne':>13} | {'Vectorisé':>10} | Identique")
+        print("-" * 80)
+
+        cases = [
+            ('toute la période', {}),
+            ('un mois', {'month': f'{YEAR}-03'}),
+            ('un département', {'departement': 'informatique'}),
+            ('un employé', {'matricule': 'E00007'})
+        ]
+        for label, filters in cases:
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                expected, reference_time = timed(reference_tracking, service, **filters)
+            result, vectorized_time = timed(service.get_employee_tracking, **filters)
+            same = result == expected
+            print(f"{label:<28} | {len(result):>7} | {reference_time:>11.2f} s | {vectorized_time:>8.2f} s | {same}")
+            if not same:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
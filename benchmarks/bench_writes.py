@@ -0,0 +1,88 @@
+"""Débit et latence des pointages concurrents : transaction par appel contre fil d'écriture unique (lots).
+
+Usage : python benchmarks/bench_writes.py [bornes] [pointages_par_borne]
+Chaque borne (un thread) pointe ses propres employés via record_attendance, comme
+le ferait le serveur Flask servant plusieurs kiosques à la fois. Les agrégats du
+jour sont calculés avant le début, de sorte que chaque arrivée met aussi à jour
+daily_rollups dans la même mutation. Dans les deux modes, chaque pointage
+réussi doit être enregistré et les agrégats identiques à un recalcul complet ;
+le mode par transaction peut en outre échouer ('database is locked') quand une
+borne attend le verrou d'écriture plus longtemps que busy_timeout.
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from datetime import datetime
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.repository import Repository
+from services.attendance import AttendanceService
+from bench_tracking import populate
+
+
+def run_kiosks(service, n_kiosks, per_kiosk):
+    """Lance les bornes ensemble ; retourne la durée totale, la latence de chaque pointage et les échecs"""
+    latencies = [[] for _ in range(n_kiosks)]
+    failures = [0] * n_kiosks
+    start_barrier = threading.Barrier(n_kiosks + 1)
+
+    def kiosk(k):
+        start_barrier.wait()
+        for i in range(per_kiosk):
+            matricule = f'E{k * per_kiosk + i:05d}'
+            started = time.perf_counter()
+            result = service.record_attendance(matricule, matricule, 'Informatique')
+            latencies[k].append(time.perf_counter() - started)
+            failures[k] += result['status'] != 'success'  # 'database is locked' après busy_timeout
+
+    threads = [threading.Thread(target=kiosk, args=(k,)) for k in range(n_kiosks)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, np.concatenate([np.array(values) for values in latencies]), sum(failures)
+
+
+def check(service, today, expected):
+    """Un pointage par employé et agrégats incrémentaux égaux à un recalcul complet"""
+    repository = service.repository
+    count = len(repository.get_attendance(today, today))
+    incremental = repository.sum_rollups(today, today)
+    service.rollups.rebuild_day(today)
+    return count == expected and incremental == repository.sum_rollups(today, today)
+
+
+def main():
+    n_kiosks = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    per_kiosk = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    print(f"{n_kiosks} bornes × {per_kiosk} pointages")
+    print(f"{'Mode':>22} | {'Débit':>9} | {'p50':>8} | {'p95':>8} | {'p99':>9} | {'max':>9} | "
+          f"{'Échecs':>6} | Cohérent")
+    print("-" * 98)
+    for label, group_commit in (('transaction par appel', False), ('fil d\'écriture', True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            repository = Repository(os.path.join(tmp, 'bench.db'), data_dir=tmp, group_commit=group_commit)
+            populate(repository, n_kiosks * per_kiosk, 1)
+            service = AttendanceService(repository)
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                service.get_advanced_reports(today)
+                elapsed, latencies, failures = run_kiosks(service, n_kiosks, per_kiosk)
+                consistent = check(service, today, n_kiosks * per_kiosk - failures)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            print(f"{label:>22} | {(len(latencies) - failures) / elapsed:>6.0f} /s | {p50:>5.1f} ms | {p95:>5.1f} ms | "
+                  f"{p99:>6.1f} ms | {latencies.max() * 1000:>6.1f} ms | {failures:>6} | {consistent}")
+            if not consistent:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""Lancement en production : processus de travail préforkés partageant la galerie des visages.
+
+Usage : python serve.py [--host 0.0.0.0] [--port 8000] [--workers N] [--graceful-timeout 30]
+
+Le processus maître importe l'application une seule fois, attend la fin du chargement
+de la galerie des visages (lancé en arrière-plan par app.py), la publie en mémoire
+partagée (services.shared_gallery), puis crée les processus de travail par fork : une
+seule copie de la galerie pour tous, et un ajout ou une modification faite par l'un
+est vue par tous à leur accès suivant.
+Tous les processus servent la même socket d'écoute (serveur WSGI de Werkzeug, un
+thread par requête). La reconnaissance se fait dans le processus de la requête
+(RECOGNITION_WORKERS=0 conseillé : les processus de travail jouent déjà ce rôle).
+
+Signaux du maître :
+  SIGHUP           rechargement progressif : galerie rechargée dans le maître, nouveaux
+                   processus, puis arrêt des anciens une fois leurs requêtes terminées
+  SIGTTIN/SIGTTOU  un processus de travail de plus / de moins
+  SIGTERM/SIGINT   arrêt (requêtes en cours terminées, dans la limite du délai de grâce)
+Un processus de travail qui s'arrête de lui-même est remplacé.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from werkzeug.serving import make_server, select_address_family
+from werkzeug.wsgi import ClosingIterator
+
+SERVER_HOST = os.environ.get('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.environ.get('SERVER_PORT', 8000))
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', os.cpu_count() or 1))
+SERVER_GRACEFUL_TIMEOUT = float(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30))
+
+
+class InFlight:
+    """Intergiciel WSGI comptant les requêtes en cours (une réponse en flux compte jusqu'à sa fermeture)"""
+
+    def __init__(self, app):
+        self.app = app
+        self.count = 0
+        self._idle = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        with self._idle:
+            self.count += 1
+        try:
+            return ClosingIterator(self.app(environ, start_response), self._done)
+        except BaseException:
+            self._done()
+            raise
+
+    def _done(self):
+        with self._idle:
+            self.count -= 1
+            self._idle.notify_all()
+
+    def wait_idle(self, timeout):
+        """Attend la fin des requêtes en cours ; False si le délai est écoulé avant"""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self.count > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+
+def run_worker(wsgi_app, listener, graceful_timeout, on_stop=None):
+    """Processus de travail : sert la socket héritée du maître jusqu'à SIGTERM (on_stop : fin des réponses sans
+    fin, comme les flux SSE, pour ne pas attendre tout le délai de grâce)"""
+    # Les signaux de pilotage (et Ctrl-C, envoyé à tout le groupe) ne concernent que le maître
+    for signum in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU, signal.SIGINT):
+        signal.signal(signum, signal.SIG_IGN)
+
+    app = InFlight(wsgi_app)
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+    stopping = threading.Event()
+
+    def shutdown():
+        server.shutdown()
+        if on_stop is not None:
+            on_stop()
+
+    def stop(signum, frame):
+        # shutdown() attend la fin de serve_forever : il ne peut pas être appelé depuis le thread qui le sert
+        if not stopping.is_set():
+            stopping.set()
+            threading.Thread(target=shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    server.serve_forever()
+    if not app.wait_idle(graceful_timeout):
+        print(f"[SERVEUR] Processus {os.getpid()}: {app.count} requête(s) interrompue(s) à l'arrêt")
+
+
+class PreforkServer:
+    """Processus maître : crée, surveille et renouvelle les processus de travail"""
+
+    def __init__(self, wsgi_app, listener, workers=SERVER_WORKERS, graceful_timeout=SERVER_GRACEFUL_TIMEOUT,
+                 on_reload=None, on_stop=None):
+        self.wsgi_app = wsgi_app
+        self.listener = listener
+        self.size = max(workers, 1)
+        self.graceful_timeout = graceful_timeout
+        # Appelé dans le maître avant de créer les processus d'un rechargement (ex. relecture de la galerie)
+        self.on_reload = on_reload
+        # Appelé dans chaque processus de travail qui s'arrête
+        self.on_stop = on_stop
+        self.generation = 0
+        # pid -> génération ; les processus en cours d'arrêt restent listés jusqu'à leur fin
+        self.workers = {}
+        self.retiring = set()
+        self._signals = []
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.wsgi_app, self.listener, self.graceful_timeout, self.on_stop)
+            except BaseException as e:
+                print(f"[ERREUR] Processus de travail {os.getpid()}: {str(e)}")
+                code = 1
+            finally:
+                # Pas de nettoyage hérité du maître (atexit, destructeurs) dans le processus de travail
+                os._exit(code)
+        self.workers[pid] = self.generation
+        return pid
+
+    def current(self):
+        return [pid for pid, generation in self.workers.items()
+                if generation == self.generation and pid not in self.retiring]
+
+    def retire(self, pids):
+        for pid in pids:
+            if pid not in self.retiring:
+                self.retiring.add(pid)
+                self.kill(pid, signal.SIGTERM)
+
+    def kill(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        """Retire les processus terminés ; un processus de la génération courante est remplacé par manage()"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.workers.pop(pid, None)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+            else:
+                print(f"[SERVEUR] Processus {pid} arrêté (code {os.waitstatus_to_exitcode(status)}), remplacé")
+
+    def manage(self):
+        """Ramène la génération courante au nombre de processus demandé"""
+        current = self.current()
+        for _ in range(self.size - len(current)):
+            self.spawn()
+        self.retire(current[self.size:])
+
+    def reload(self):
+        """Nouvelle génération préparée dans le maître, puis arrêt progressif de l'ancienne"""
+        print(f"[SERVEUR] Rechargement (génération {self.generation + 1})")
+        if self.on_reload is not None:
+            self.on_reload()
+        gc.freeze()
+        self.generation += 1
+        self.manage()
+        self.retire([pid for pid, generation in self.workers.items() if generation != self.generation])
+
+    def stop(self):
+        self.retire(list(self.workers))
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            self.kill(pid, signal.SIGKILL)
+        self.reap()
+
+    def run(self):
+        for signum in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda signum, frame: self._signals.append(signum))
+        # Objets déjà chargés exclus du ramasse-miettes : ses parcours ne recopient pas leurs pages dans les fils
+        gc.freeze()
+        print(f"[SERVEUR] Maître {os.getpid()}, {self.size} processus de travail sur "
+              f"{':'.join(str(part) for part in self.listener.getsockname()[:2])}")
+        while True:
+            self.reap()
+            while self._signals:
+                signum = self._signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.stop()
+                    return
+                if signum == signal.SIGHUP:
+                    self.reload()
+                elif signum == signal.SIGTTIN:
+                    self.size += 1
+                elif signum == signal.SIGTTOU:
+                    self.size = max(self.size - 1, 1)
+            self.manage()
+            time.sleep(0.5)
+
+
+def listen(host, port, backlog=1024):
+    """Socket d'écoute créée par le maître et héritée par chaque processus de travail"""
+    listener = socket.socket(select_address_family(host, port), socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(backlog)
+    listener.set_inheritable(True)
+    return listener
+
+
+def serve(application, host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS,
+          graceful_timeout=SERVER_GRACEFUL_TIMEOUT):
+    """Sert le module app (déjà importé) avec des processus préforkés"""
+    listener = listen(host, port)
+    # Galerie chargée avant le fork : les processus de travail la partagent et aucun thread de chargement ne
+    # tourne pendant le fork (les connexions attendent dans la file de la socket)
+    print("[SERVEUR] Chargement des visages connus...")
+    application.face_service.wait_loaded()
+    # Le maître ne reconnaît rien : pas de pool de reconnaissance à partager avec les fils
+    application.recognition_engine.shutdown()
+    # Une seule galerie pour tous les processus : un ajout fait par l'un est vu par tous
+    gallery = application.face_service.share_gallery()
+    try:
+        PreforkServer(application.app, listener, workers, graceful_timeout,
+                      on_reload=application.face_service.load_known_faces,
+                      on_stop=application.attendance_service.feed.close).run()
+    finally:
+        gallery.close(unlink=True)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Serveur de production LIGGUEY-SINAA (processus préforkés)")
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS)
+    parser.add_argument('--graceful-timeout', type=float, default=SERVER_GRACEFUL_TIMEOUT)
+    args = parser.parse_args(argv[1:])
+
+    import app as application
+    serve(application, args.host, args.port, args.workers, args.graceful_timeout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
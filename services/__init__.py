@@ -1,5 +1,13 @@
 # Package initializer for services module
-from .face_service import FaceService
-from .attendance import AttendanceService
+# Imports à la demande : les services de données (dépôt, pointages, agrégats) s'utilisent sans charger dlib
+__all__ = ['FaceService', 'AttendanceService']
 
-__all__ = ['FaceService', 'AttendanceService']
\ No newline at end of file
+
+def __getattr__(name):
+    if name == 'FaceService':
+        from .face_service import FaceService
+        return FaceService
+    if name == 'AttendanceService':
+        from .attendance import AttendanceService
+        return AttendanceService
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,352 @@
+import os
+import sys
+import json
+import calendar
+import threading
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .time_rules import parse_seconds, format_seconds
+from .repository import Repository, ATTENDANCE_COLUMNS
+
+
+
+def archive_dir(data_dir='data'):
+    """Dossier de l'archive : LIGGEEY_ARCHIVE, sinon <data_dir>/ARCHIVE"""
+    return os.environ.get('LIGGEEY_ARCHIVE') or os.path.join(data_dir, 'ARCHIVE')
+
+
+ARCHIVE_DIR = archive_dir()
+
+# Colonnes typées : matricule et nom en dictionnaire, département catégoriel, date en jours,
+# heures telles que saisies (export CSV fidèle) doublées de leur valeur en secondes
+ARCHIVE_SCHEMA = pa.schema([
+    ('matricule', pa.dictionary(pa.int32(), pa.string())),
+    ('nom_complet', pa.dictionary(pa.int32(), pa.string())),
+    ('departement', pa.dictionary(pa.int16(), pa.string())),
+    ('date', pa.date32()),
+    ('heure_arrivee', pa.string()),
+    ('heure_depart', pa.string()),
+    ('arrivee_secondes', pa.int32()),
+    ('depart_secondes', pa.int32()),
+    ('signature', pa.string())
+])
+
+
+def default_departures(arrivals):
+    """Sorties par défaut (arrivée + 1 h, comme time_rules.default_departure) ; None pour une arrivée illisible"""
+    return format_seconds((parse_seconds(arrivals) + 3600) % 86400)
+
+
+def month_bounds(month):
+    """Premier et dernier jour d'un mois 'YYYY-MM'"""
+    first = date.fromisoformat(f'{month}-01')
+    return first, first.replace(day=calendar.monthrange(first.year, first.month)[1])
+
+
+def as_date(value):
+    """'YYYY-MM-DD' -> date ; un jour hors du mois ('2025-02-31', borne de fin usuelle) est ramené au dernier jour"""
+    year, month, day = (int(part) for part in value.split('-'))
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+class AttendanceArchive:
+    """Archive colonnaire des pointages : une partition Parquet par mois (year=AAAA/month=MM) et un manifeste.
+
+    Sert l'historique de l'application (history, iter_history) : les mois clos déjà écrits sont lus dans l'archive,
+    le mois en cours et les mois modifiés depuis leur écriture (table archive_changes, tenue par des déclencheurs)
+    dans la base. Un mois clos modifié est réécrit à sa lecture suivante.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.RLock()
+        self._manifest_mtime = None
+        self.manifest = self.load_manifest()
+
+    def load_manifest(self):
+        """Manifeste : pour chaque mois 'YYYY-MM', chemin, nombre de lignes, dates min/max, départements, empreinte"""
+        if not os.path.exists(self.manifest_path):
+            return {}
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+        with open(self.manifest_path, encoding='utf-8') as f:
+            return json.load(f)['partitions']
+
+    def refresh(self):
+        """Relit le manifeste s'il a été réécrit par un autre processus"""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._manifest_mtime:
+            with self._lock:
+                self.manifest = self.load_manifest()
+
+    @contextmanager
+    def writing(self):
+        """Écriture exclusive de l'archive, entre threads et entre processus (serveur préforké), manifeste relu"""
+        with self._lock:
+            try:
+                import fcntl
+            except ImportError:
+                fcntl = None
+            with open(os.path.join(self.root, '.lock'), 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self.manifest = self.load_manifest()
+                yield
+
+    def save_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'partitions': dict(sorted(self.manifest.items()))}, f, indent=1, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    def partition_path(self, month):
+        year, month_number = month.split('-')
+        return os.path.join(self.root, f'year={year}', f'month={month_number}', 'presents.parquet')
+
+    def months(self, start_date=None, end_date=None):
+        """Mois dont la plage [min, max] du manifeste recoupe l'intervalle demandé (tri chronologique)"""
+        return [month for month, entry in sorted(self.manifest.items())
+                if (not start_date or entry['max_date'] >= start_date)
+                and (not end_date or entry['min_date'] <= end_date)]
+
+    # --- Écriture ---
+
+    def to_table(self, df):
+        """Pointages bruts (colonnes texte du dépôt) -> table Arrow typée"""
+        df = df[ATTENDANCE_COLUMNS].astype(object).where(df[ATTENDANCE_COLUMNS].notna(), None)
+        arrival = parse_seconds(df['heure_arrivee'])
+        departure = parse_seconds(df['heure_depart'])
+        columns = {
+            'matricule': pa.array(df['matricule'].astype(str).tolist()).dictionary_encode(),
+            'nom_complet': pa.array(df['nom_complet'].tolist(), pa.string()).dictionary_encode(),
+            'departement': pa.array(df['departement'].tolist(), pa.string()).dictionary_encode(),
+            'date': pa.array(pd.to_datetime(df['date']).dt.date.tolist(), pa.date32()),
+            'heure_arrivee': pa.array(df['heure_arrivee'].tolist(), pa.string()),
+            'heure_depart': pa.array(df['heure_depart'].tolist(), pa.string()),
+            'arrivee_secondes': pa.array(arrival, pa.int32(), mask=np.isnan(arrival)),
+            'depart_secondes': pa.array(departure, pa.int32(), mask=np.isnan(departure)),
+            'signature': pa.array(df['signature'].tolist(), pa.string())
+        }
+        return pa.Table.from_arrays([columns[field.name].cast(field.type) for field in ARCHIVE_SCHEMA],
+                                    schema=ARCHIVE_SCHEMA)
+
+    def write_partition(self, month, df, digest=None):
+        """(Ré)écrit la partition d'un mois (fichier temporaire puis renommage atomique) et son entrée du manifeste"""
+        path = self.partition_path(month)
+        if df.empty:
+            if os.path.exists(path):
+                os.remove(path)
+            self.manifest.pop(month, None)
+            return 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        pq.write_table(self.to_table(df.sort_values('date', kind='stable')), tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+        self.manifest[month] = {
+            'path': os.path.relpath(path, self.root),
+            'rows': len(df),
+            'min_date': str(df['date'].min()),
+            'max_date': str(df['date'].max()),
+            'departements': sorted(df['departement'].dropna().astype(str).unique().tolist()),
+            'digest': digest,
+            'written_at': datetime.now().isoformat(timespec='seconds')
+        }
+        return len(df)
+
+    @staticmethod
+    def digest(df):
+        """Empreinte du contenu d'un mois (détecte toute modification, y compris d'identité)"""
+        return str(int(pd.util.hash_pandas_object(df[ATTENDANCE_COLUMNS], index=False).sum()))
+
+    def sync(self, repository, rebuild=False, months=None):
+        """Met l'archive en phase avec la base : seuls les mois modifiés depuis leur dernière écriture sont réécrits
+        (months : parmi ceux-ci, ceux demandés ; rebuild : tous les mois)"""
+        written = []
+        with self.writing():
+            changes = repository.get_archive_changes()
+            if rebuild:
+                targets = set(repository.get_attendance_months()) | set(self.manifest) | set(changes)
+            else:
+                targets = set(changes) if months is None else set(changes) & set(months)
+            for month in sorted(targets):
+                # Versions des marques lues avant les pointages : une écriture entre les deux laisse la marque en place
+                df = repository.get_attendance_month(month)
+                self.write_partition(month, df, self.digest(df))
+                written.append(month)
+            self.save_manifest()
+            for month in written:
+                if month in changes:
+                    repository.clear_archive_change(month, changes[month])
+        return written
+
+    # --- Lecture ---
+
+    def read(self, start_date=None, end_date=None, columns=None, matricule=None, departement=None):
+        """Pointages d'une plage de dates : partitions élaguées par le manifeste, filtres et colonnes poussés au lecteur"""
+        filters = []
+        if start_date:
+            filters.append(('date', '>=', as_date(start_date)))
+        if end_date:
+            filters.append(('date', '<=', as_date(end_date)))
+        if matricule:
+            filters.append(('matricule', '==', str(matricule)))
+
+        tables = []
+        for month in self.months(start_date, end_date):
+            entry = self.manifest[month]
+            partition_filters = list(filters)
+            if departement:
+                # Comparaison insensible à la casse résolue sur le manifeste : un mois sans ce département n'est pas lu
+                names = [name for name in entry['departements'] if name.lower() == departement.lower()]
+                if not names:
+                    continue
+                partition_filters.append(('departement', 'in', names))
+            tables.append(pq.read_table(os.path.join(self.root, entry['path']), columns=columns,
+                                        filters=partition_filters or None))
+
+        if not tables:
+            schema = ARCHIVE_SCHEMA if columns is None else pa.schema([ARCHIVE_SCHEMA.field(c) for c in columns])
+            return schema.empty_table().to_pandas(date_as_object=False)
+        return pa.concat_tables(tables).to_pandas(date_as_object=False)
+
+    def segments(self, repository, start_date=None, end_date=None, matricule=None):
+        """Découpe une plage en intervalles lus dans l'archive ('archive', début, fin) ou dans la base ('base', début,
+        fin), dans l'ordre chronologique. Les mois clos modifiés de la plage sont réécrits d'abord.
+        Un seul employé : toute la plage dans la base (index par matricule, ~100x plus rapide qu'un parcours des
+        partitions, qui ne sont triées que par date)"""
+        if matricule:
+            return [('base', start_date, end_date)]
+        self.refresh()
+        current_month = datetime.now().strftime('%Y-%m')
+        changes = repository.get_archive_changes()
+        stale = [month for month in changes if month < current_month
+                 and (not start_date or month >= start_date[:7]) and (not end_date or month <= end_date[:7])]
+        if stale:
+            self.sync(repository, months=stale)
+            changes = repository.get_archive_changes()
+
+        segments, start = [], start_date
+        for month in self.months(start_date, end_date):
+            if month >= current_month or month in changes:
+                continue
+            first, last = (day.isoformat() for day in month_bounds(month))
+            if not start or start < first:
+                segments.append(('base', start, (date.fromisoformat(first) - timedelta(days=1)).isoformat()))
+            segments.append(('archive', max(start or first, first), min(end_date or last, last)))
+            start = (date.fromisoformat(last) + timedelta(days=1)).isoformat()
+        if not segments or not (start and end_date and start > end_date):
+            segments.append(('base', start, end_date))
+        return segments
+
+    def read_segment(self, repository, segment, matricule=None, departement=None, newest_first=False):
+        """Pointages d'un segment au format de Repository.get_attendance (sortie non validée = arrivée + 1 h)"""
+        source, start_date, end_date = segment
+        if source == 'base':
+            return repository.get_attendance(start_date, end_date, matricule, departement)
+        df = self.read(start_date, end_date, ATTENDANCE_COLUMNS, matricule, departement)
+        df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+        df = df.astype(object)
+        departures = df['heure_depart'].to_numpy()
+        df['heure_depart'] = np.where(pd.isna(departures), default_departures(df['heure_arrivee']), departures)
+        df = df.where(df.notna(), None)
+        if newest_first:
+            # Partition triée par date, ordre d'enregistrement conservé à date égale (comme 'date DESC, rowid')
+            df = df.sort_values('date', ascending=False, kind='stable')
+        return df.reset_index(drop=True)
+
+    def history(self, repository, start_date=None, end_date=None, matricule=None, departement=None):
+        """Pointages d'une plage au format de Repository.get_attendance, triés par date (ordre d'enregistrement à
+        date égale) : mois clos lus dans l'archive, les autres dans la base"""
+        frames = [self.read_segment(repository, segment, matricule, departement)
+                  for segment in self.segments(repository, start_date, end_date, matricule)]
+        return pd.concat(frames, ignore_index=True).sort_values('date', kind='stable').reset_index(drop=True)
+
+    def iter_history(self, repository, start_date=None, end_date=None, matricule=None, departement=None,
+                     newest_first=False):
+        """Comme history, par lots (un mois archivé ou un lot de la base à la fois) : mémoire bornée"""
+        segments = self.segments(repository, start_date, end_date, matricule)
+        for segment in reversed(segments) if newest_first else segments:
+            if segment[0] == 'base':
+                yield from repository.iter_attendance(segment[1], segment[2], matricule, departement, newest_first)
+            else:
+                df = self.read_segment(repository, segment, matricule, departement, newest_first)
+                if len(df):
+                    yield df
+
+    def read_month(self, month):
+        """Partition d'un mois au format texte du dépôt (heure_depart à None tant que la sortie n'est pas validée)"""
+        if month not in self.manifest:
+            return pd.DataFrame(columns=ATTENDANCE_COLUMNS)
+        df = pq.read_table(os.path.join(self.root, self.manifest[month]['path']),
+                           columns=ATTENDANCE_COLUMNS).to_pandas()
+        df = df.astype(object)
+        df['date'] = [value.isoformat() for value in df['date']]
+        return df.where(df.notna(), None)
+
+    # --- Import / export CSV ---
+
+    def import_csv(self, repository, paths, default_departure=False):
+        """Importe des fichiers mensuels CSV dans la base puis réécrit les mois touchés de l'archive ; le mois vient de
+        la colonne date, pas du nom (dépendant de la locale). default_departure : fichiers où une sortie non validée
+        était enregistrée comme arrivée + 1 h (anciens fichiers, export_csv) ; ces sorties redeviennent non validées"""
+        frames = [pd.read_csv(path, dtype=str) for path in paths]
+        if not frames:
+            return []
+        df = pd.concat(frames, ignore_index=True).reindex(columns=ATTENDANCE_COLUMNS)
+        df = df[df['heure_arrivee'].notna() & df['date'].notna()].astype(object)
+        if default_departure:
+            departures = df['heure_depart'].to_numpy()
+            df['heure_depart'] = np.where(departures == default_departures(df['heure_arrivee']), None, departures)
+        df = df.where(df.notna(), None)
+
+        repository.import_attendance(list(df.itertuples(index=False, name=None)))
+        return self.sync(repository, months=df['date'].str[:7].unique())
+
+    def export_csv(self, month, path):
+        """Exporte un mois au format des fichiers mensuels (sortie non validée = arrivée + 1 h)"""
+        df = self.read_month(month)
+        departures = df['heure_depart'].to_numpy()
+        df['heure_depart'] = np.where(pd.isna(departures), default_departures(df['heure_arrivee']), departures)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        return len(df)
+
+
+def main(argv):
+    """python -m services.attendance_archive [sync|rebuild|import [--sorties-par-defaut] fichiers...|
+    export YYYY-MM fichier|manifest]"""
+    command = argv[1] if len(argv) > 1 else 'sync'
+    options = [arg for arg in argv[2:] if arg.startswith('--')]
+    arguments = [arg for arg in argv[2:] if not arg.startswith('--')]
+    repository = Repository()
+    archive = AttendanceArchive(archive_dir(repository.data_dir))
+    if command in ('sync', 'rebuild'):
+        for month in archive.sync(repository, rebuild=command == 'rebuild'):
+            print(archive.partition_path(month))
+    elif command == 'import' and arguments:
+        for month in archive.import_csv(repository, arguments, default_departure='--sorties-par-defaut' in options):
+            print(archive.partition_path(month))
+    elif command == 'export' and len(argv) > 3:
+        print(f"{archive.export_csv(argv[2], argv[3])} lignes -> {argv[3]}")
+    elif command == 'manifest':
+        for month, entry in sorted(archive.manifest.items()):
+            print(f"{month} | {entry['rows']:>7} lignes | {entry['min_date']} -> {entry['max_date']} | {entry['path']}")
+    else:
+        print(main.__doc__)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
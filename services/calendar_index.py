@@ -0,0 +1,196 @@
+import threading
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import date as date_type, datetime, timedelta
+
+
+def to_iso_date(date):
+    """Normalise une date (chaîne, datetime, Timestamp) au format 'YYYY-MM-DD', comparable comme une chaîne"""
+    if isinstance(date, str):
+        return date_type.fromisoformat(date).isoformat()
+    return date.strftime('%Y-%m-%d')
+
+
+class PeriodIndex:
+    """Périodes par matricule triées par date de début, avec maximum cumulé des dates de fin pour la recherche"""
+
+    def __init__(self, periods):
+        by_matricule = {}
+        for start, end, row in periods:
+            by_matricule.setdefault(str(row['matricule']).strip(), []).append((start, end, row))
+
+        self._starts = {}
+        self._periods = {}
+        self._max_ends = {}
+        for matricule, items in by_matricule.items():
+            items.sort(key=lambda item: (item[0], item[1]))
+            max_ends = []
+            running = ''
+            for _, end, _ in items:
+                running = max(running, end)
+                max_ends.append(running)
+            self._starts[matricule] = [item[0] for item in items]
+            self._periods[matricule] = items
+            self._max_ends[matricule] = max_ends
+
+    def intervals(self):
+        """Toutes les périodes indexées : (matricule, début, fin)"""
+        return [(matricule, start, end) for matricule, items in self._periods.items() for start, end, _ in items]
+
+    def covering(self, date):
+        """Matricules dont une période couvre la date"""
+        return {matricule for matricule in self._starts if self.find(matricule, date) is not None}
+
+    def find(self, matricule, date):
+        """Période couvrant la date (O(log n) : dichotomie sur les débuts, arrêt dès que les fins cumulées sont passées)"""
+        matricule = str(matricule).strip()
+        starts = self._starts.get(matricule)
+        if not starts:
+            return None
+        periods = self._periods[matricule]
+        max_ends = self._max_ends[matricule]
+        position = bisect_right(starts, date) - 1
+        while position >= 0 and max_ends[position] >= date:
+            start, end, row = periods[position]
+            if start <= date <= end:
+                return periods[position]
+            position -= 1
+        return None
+
+
+class CalendarIndex:
+    """Index des jours fériés, congés et missions, reconstruit uniquement quand la table source change"""
+
+    DATASETS = {'feriers': 'holidays', 'conges': 'leaves', 'missions': 'missions'}
+
+    def __init__(self, repository):
+        self.repository = repository
+        self._lock = threading.Lock()
+        # Cache par (type, année) : (version de la table au moment de la construction, index)
+        self._views = {}
+        # Versions épinglées par thread le temps d'un bloc pinned() : (Repository.commits à la lecture, versions ou None)
+        self._pinned = threading.local()
+
+    def _read_versions(self):
+        """Versions des trois tables en une requête"""
+        datasets = tuple(self.DATASETS.values())
+        return dict(zip(datasets, self.repository.versions(datasets)))
+
+    def pin(self, versions=None):
+        """Début d'un bloc (requête HTTP, photographie d'un jour) : versions lues une seule fois pour ses recherches
+        (ou celles que l'appelant vient de lire, dataset -> version). Une écriture validée par ce processus les fait
+        relire ; celles des autres processus sont vues au bloc suivant.
+        Retourne False si un bloc est déjà ouvert dans ce thread (c'est lui qui sera fermé)."""
+        if getattr(self._pinned, 'state', None) is not None:
+            return False
+        # Sans versions fournies, lues à la première recherche du bloc (rien pour une requête qui n'en fait pas)
+        self._pinned.state = (self.repository.commits, versions)
+        return True
+
+    def release(self):
+        self._pinned.state = None
+
+    @contextmanager
+    def pinned(self, versions=None):
+        opened = self.pin(versions)
+        try:
+            yield self
+        finally:
+            if opened:
+                self.release()
+
+    def _versions(self):
+        state = getattr(self._pinned, 'state', None)
+        if state is None:
+            return self._read_versions()
+        if state[1] is None or state[0] != self.repository.commits:
+            commits = self.repository.commits
+            state = self._pinned.state = (commits, self._read_versions())
+        return state[1]
+
+    def _view(self, kind, year):
+        """Index d'une année : toutes les périodes qui la chevauchent, y compris celles commencées l'année précédente"""
+        dataset = self.DATASETS[kind]
+        # Dans une transaction ouverte (fil d'écriture), la table peut contenir des lignes non validées : index
+        # construit sans être mis en cache ni comparé aux versions épinglées
+        if self.repository.connection.in_transaction:
+            return self._build(kind, year)
+        version = self._versions()[dataset]
+        with self._lock:
+            cached = self._views.get((kind, year))
+            # Versions croissantes : un index construit après la version épinglée (par un autre thread) convient aussi
+            if cached is not None and cached[0] >= version:
+                return cached[1]
+            index = self._build(kind, year)
+            self._views[(kind, year)] = (version, index)
+            return index
+
+    def _build(self, kind, year):
+        first_day, last_day = f'{year:04d}-01-01', f'{year:04d}-12-31'
+        periods = []
+        for row in self.repository.get_periods(self.DATASETS[kind], first_day, last_day).to_dict('records'):
+            start, end = row.get('date debut', row.get('date_debut')), row.get('date fin', row.get('date_fin'))
+            try:
+                start, end = to_iso_date(start), to_iso_date(end)
+            except (TypeError, ValueError, AttributeError):
+                continue
+            if end >= start:
+                periods.append((start, end, row))
+        if kind == 'feriers':
+            return self._build_holidays(periods, first_day, last_day)
+        return PeriodIndex(periods)
+
+    def _build_holidays(self, periods, first_day, last_day):
+        """Ensemble des jours fériés de l'année (date -> description), les plages étant dépliées jour par jour"""
+        holidays = {}
+        for start, end, row in periods:
+            day = datetime.strptime(max(start, first_day), '%Y-%m-%d')
+            last = datetime.strptime(min(end, last_day), '%Y-%m-%d')
+            while day <= last:
+                holidays.setdefault(day.strftime('%Y-%m-%d'), row.get('description'))
+                day += timedelta(days=1)
+        return holidays
+
+    def holidays(self, year):
+        return self._view('feriers', year)
+
+    def holiday_name(self, date):
+        """Description du jour férié, None si la date est ouvrée"""
+        date = to_iso_date(date)
+        return self.holidays(int(date[:4])).get(date)
+
+    def is_holiday(self, date):
+        date = to_iso_date(date)
+        return date in self.holidays(int(date[:4]))
+
+    def leave(self, matricule, date):
+        """Ligne de congé couvrant la date : (début, fin, ligne CSV) ou None"""
+        date = to_iso_date(date)
+        return self._view('conges', int(date[:4])).find(matricule, date)
+
+    def mission(self, matricule, date):
+        """Ligne de mission couvrant la date : (début, fin, ligne CSV) ou None"""
+        date = to_iso_date(date)
+        return self._view('missions', int(date[:4])).find(matricule, date)
+
+    def on_leave(self, date):
+        """Matricules en congé à la date"""
+        date = to_iso_date(date)
+        return self._view('conges', int(date[:4])).covering(date)
+
+    def on_mission(self, date):
+        """Matricules en mission à la date"""
+        date = to_iso_date(date)
+        return self._view('missions', int(date[:4])).covering(date)
+
+    def leave_intervals(self, years):
+        """Périodes de congé qui chevauchent les années données : (matricule, début, fin)"""
+        return [interval for year in sorted(set(years)) for interval in self._view('conges', year).intervals()]
+
+    def mission_intervals(self, years):
+        """Périodes de mission qui chevauchent les années données : (matricule, début, fin)"""
+        return [interval for year in sorted(set(years)) for interval in self._view('missions', year).intervals()]
+
+    def holiday_dates(self, years):
+        """Ensemble des jours fériés ('YYYY-MM-DD') des années données"""
+        return {day for year in sorted(set(years)) for day in self.holidays(year)}
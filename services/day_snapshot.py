@@ -0,0 +1,26 @@
+class DaySnapshot:
+    """Photographie d'une journée : effectif, pointages du jour et couverture congés/missions, calculés une seule fois"""
+
+    def __init__(self, date, employees, attendance, on_leave, on_mission, is_holiday=False, holiday_name=None):
+        self.date = date
+        self.employees = employees
+        # Pointages du jour avec les heures déjà converties en secondes (colonnes arrival_seconds / departure_seconds)
+        self.attendance = attendance
+        self.on_leave = on_leave
+        self.on_mission = on_mission
+        self.is_holiday = is_holiday
+        self.holiday_name = holiday_name
+        # Matricules ayant une ligne de pointage ce jour-là
+        self.present = set(attendance['matricule'].astype(str))
+
+    def coverage(self, employees):
+        """Masques (congé, mission) alignés sur les lignes de l'effectif donné"""
+        keys = employees['matricule'].astype(str).str.strip()
+        return keys.isin(self.on_leave).to_numpy(), keys.isin(self.on_mission).to_numpy()
+
+    def absent(self, employees=None):
+        """Employés sans pointage du jour, hors congés et missions (anti-jointure sur l'effectif)"""
+        employees = self.employees if employees is None else employees
+        on_leave, on_mission = self.coverage(employees)
+        present = employees['matricule'].astype(str).isin(self.present).to_numpy()
+        return employees[~on_leave & ~on_mission & ~present]
@@ -0,0 +1,99 @@
+import os
+import cv2
+import numpy as np
+import face_recognition
+
+# Paramètres de détection (surchargeables par variables d'environnement)
+DETECTION_SCALE = float(os.environ.get('FACE_DETECTION_SCALE', 0.5))
+DETECTION_UPSAMPLE = int(os.environ.get('FACE_DETECTION_UPSAMPLE', 1))
+DETECTION_MODEL = os.environ.get('FACE_DETECTION_MODEL', 'hog')
+MAX_FRAME_SIDE = int(os.environ.get('FACE_MAX_FRAME_SIDE', 1280))
+CROP_PADDING = 0.3
+
+# Modes de décodage JPEG réduit (la réduction est faite par le décodeur, sans redimensionnement)
+DECODE_MODES = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+
+def decode_frame(buffer, reduce=1):
+    """Décode une image compressée directement depuis le tampon de la requête en un unique tableau RGB"""
+    if reduce not in DECODE_MODES:
+        raise ValueError(f"Facteur de réduction non supporté: {reduce} (choix: 1, 2, 4, 8)")
+    image = cv2.imdecode(np.frombuffer(buffer, np.uint8), DECODE_MODES[reduce])
+    if image is None:
+        raise ValueError("Image illisible")
+    # face_recognition attend du RGB : conversion sur place, sans nouvelle copie
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+
+
+class FaceDetector:
+    """Détection en deux temps : HOG sur une copie réduite, encodage pleine résolution sur le recadrage du visage"""
+
+    def __init__(self, scale=DETECTION_SCALE, upsample=DETECTION_UPSAMPLE, model=DETECTION_MODEL,
+                 max_side=MAX_FRAME_SIDE, crop_padding=CROP_PADDING):
+        self.scale = scale
+        self.upsample = upsample
+        self.model = model
+        self.max_side = max_side
+        self.crop_padding = crop_padding
+
+    def limit_size(self, image):
+        """Plafonne la taille de l'image avant tout traitement"""
+        height, width = image.shape[:2]
+        longest = max(height, width)
+        if not self.max_side or longest <= self.max_side:
+            return image
+        factor = self.max_side / longest
+        return cv2.resize(image, (int(width * factor), int(height * factor)), interpolation=cv2.INTER_AREA)
+
+    def detect(self, image):
+        """Détecte les visages sur une copie réduite et renvoie les boîtes en pleine résolution"""
+        height, width = image.shape[:2]
+        if self.scale >= 1.0:
+            return face_recognition.face_locations(image, self.upsample, self.model)
+
+        small = cv2.resize(image, (0, 0), fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        locations = face_recognition.face_locations(small, self.upsample, self.model)
+        inverse = 1.0 / self.scale
+        return [
+            (
+                max(0, int(top * inverse)),
+                min(width, int(right * inverse)),
+                min(height, int(bottom * inverse)),
+                max(0, int(left * inverse))
+            )
+            for top, right, bottom, left in locations
+        ]
+
+    def crop_region(self, image, locations):
+        """Zone englobant tous les visages, élargie pour que les points de repère restent dans le cadre"""
+        height, width = image.shape[:2]
+        top = min(loc[0] for loc in locations)
+        right = max(loc[1] for loc in locations)
+        bottom = max(loc[2] for loc in locations)
+        left = min(loc[3] for loc in locations)
+        pad_y = int((bottom - top) * self.crop_padding)
+        pad_x = int((right - left) * self.crop_padding)
+        return max(0, top - pad_y), min(width, right + pad_x), min(height, bottom + pad_y), max(0, left - pad_x)
+
+    def encode(self, image, locations):
+        """Encode les visages en un seul appel, uniquement sur le recadrage qui les contient"""
+        if not locations:
+            return []
+        top, right, bottom, left = self.crop_region(image, locations)
+        crop = image[top:bottom, left:right]
+        shifted = [(t - top, r - left, b - top, l - left) for t, r, b, l in locations]
+        return face_recognition.face_encodings(crop, shifted)
+
+    def detect_and_encode(self, image, max_faces=None):
+        """Pipeline complet : plafonnement, détection réduite, encodage du recadrage"""
+        image = self.limit_size(image)
+        locations = self.detect(image)
+        if max_faces:
+            # Les plus grands visages sont les plus proches de la borne
+            locations = sorted(locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]), reverse=True)[:max_faces]
+        return locations, self.encode(image, locations)
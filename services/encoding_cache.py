@@ -0,0 +1,124 @@
+import os
+import hashlib
+import threading
+import numpy as np
+import face_recognition
+
+# Paramètres d'encodage utilisés par FaceService : toute modification invalide le cache
+DETECTION_MODEL = 'hog'
+UPSAMPLE_TIMES = 1
+NUM_JITTERS = 1
+LANDMARKS_MODEL = 'small'
+
+
+def encoding_params_tag():
+    """Retourne l'étiquette des paramètres d'encodage incluse dans chaque clé du cache"""
+    version = getattr(face_recognition, '__version__', 'unknown')
+    return f"fr{version}|{DETECTION_MODEL}|up{UPSAMPLE_TIMES}|jit{NUM_JITTERS}|{LANDMARKS_MODEL}"
+
+
+class EncodingCache:
+    """Cache disque des encodages faciaux indexé par empreinte du contenu de l'image"""
+
+    def __init__(self, cache_path=os.path.join('data', 'CACHE', 'encodings.npz')):
+        self.cache_path = cache_path
+        self.params_tag = encoding_params_tag()
+        self._entries = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Charge tout le cache en une seule lecture"""
+        with self._lock:
+            self._entries = {}
+            self._dirty = False
+            if not os.path.exists(self.cache_path):
+                return
+            try:
+                with np.load(self.cache_path, allow_pickle=False) as data:
+                    keys = data['keys']
+                    encodings = data['encodings']
+                    has_face = data['has_face']
+                for key, encoding, found in zip(keys, encodings, has_face):
+                    self._entries[str(key)] = encoding if found else None
+            except Exception as e:
+                print(f"[ERREUR] Lecture cache encodages: {str(e)}")
+                self._entries = {}
+
+    def save(self):
+        """Écrit le cache sur disque (fichier temporaire puis renommage atomique)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            keys = list(self._entries.keys())
+            encodings = np.zeros((len(keys), 128), dtype=np.float64)
+            has_face = np.zeros(len(keys), dtype=bool)
+            for i, key in enumerate(keys):
+                encoding = self._entries[key]
+                if encoding is not None:
+                    encodings[i] = encoding
+                    has_face[i] = True
+
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    np.savez(f, keys=np.array(keys, dtype=str), encodings=encodings, has_face=has_face)
+                os.replace(tmp_path, self.cache_path)
+                self._dirty = False
+            except Exception as e:
+                print(f"[ERREUR] Écriture cache encodages: {str(e)}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def key_for_bytes(self, content):
+        """Construit la clé du cache à partir du contenu brut de l'image"""
+        digest = hashlib.sha1(content).hexdigest()
+        return f"{digest}|{self.params_tag}"
+
+    def key_for_file(self, image_path):
+        """Construit la clé du cache pour un fichier image"""
+        with open(image_path, 'rb') as f:
+            return self.key_for_bytes(f.read())
+
+    def contains(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """Retourne l'encodage associé à la clé (None si aucun visage détecté)"""
+        return self._entries.get(key)
+
+    def put(self, key, encoding):
+        """Enregistre un encodage (ou None pour une image sans visage)"""
+        with self._lock:
+            self._entries[key] = None if encoding is None else np.asarray(encoding, dtype=np.float64)
+            self._dirty = True
+
+    def retain(self, keys):
+        """Supprime les entrées qui ne correspondent plus à aucune photo"""
+        keys = set(keys)
+        with self._lock:
+            stale = [key for key in self._entries if key not in keys]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self._dirty = True
+
+    def encode_file(self, image_path):
+        """Retourne l'encodage d'une image en passant par le cache, et indique s'il a été recalculé"""
+        key = self.key_for_file(image_path)
+        if self.contains(key):
+            return key, self.get(key), False
+
+        image = face_recognition.load_image_file(image_path)
+        face_locations = face_recognition.face_locations(
+            image, number_of_times_to_upsample=UPSAMPLE_TIMES, model=DETECTION_MODEL
+        )
+        encoding = None
+        if face_locations:
+            encoding = face_recognition.face_encodings(
+                image, face_locations[:1], num_jitters=NUM_JITTERS, model=LANDMARKS_MODEL
+            )[0]
+        self.put(key, encoding)
+        return key, encoding, True
@@ -0,0 +1,100 @@
+import json
+import threading
+
+# Délai de reconnexion suggéré au navigateur (ms)
+RETRY_MS = 3000
+
+
+def sse_message(event_type, data, event_id=None):
+    """Message Server-Sent Events (data : JSON sur une seule ligne)"""
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+class AttendanceFeed:
+    """Flux des pointages (arrivées, sorties, refus) pour le tableau de bord.
+
+    Les événements sont lus dans la table attendance_events : l'identifiant d'événement SSE est celui de la ligne,
+    ce qui permet la reprise (Last-Event-ID) après une coupure, un redémarrage ou d'un processus à l'autre. Les
+    abonnés du processus sont réveillés dès la validation d'un pointage ; ceux écrits par un autre processus sont
+    vus à la relecture suivante (poll_interval).
+
+    describe(événements) -> données JSON envoyées pour chacun, calculées une seule fois par événement quel que soit
+    le nombre d'abonnés (et pas du tout sans abonné).
+    """
+
+    def __init__(self, repository, describe=None, poll_interval=1.0, heartbeat=15.0, cache_size=1000):
+        self.repository = repository
+        self.describe = describe or (lambda events: [json.loads(event['payload']) for event in events])
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.cache_size = cache_size
+        # Messages déjà formatés par identifiant d'événement (les plus anciens sont retirés)
+        self._messages = {}
+        self._messages_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._latest = 0
+        self.closed = False
+
+    def notify(self, event_id):
+        """Réveille les abonnés : un événement vient d'être validé"""
+        with self._condition:
+            self._latest = max(self._latest, event_id)
+            self._condition.notify_all()
+
+    def close(self):
+        """Termine les flux en cours (arrêt du processus) ; les navigateurs se reconnectent avec Last-Event-ID"""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def wait(self, seen, timeout):
+        """Attend une notification postérieure à seen (dernier identifiant notifié avant la relecture)"""
+        with self._condition:
+            if self._latest <= seen and not self.closed:
+                self._condition.wait(timeout)
+
+    def messages(self, events):
+        """Messages SSE d'un lot d'événements ; seuls ceux jamais envoyés passent par describe"""
+        messages = {event['id']: self._messages.get(event['id']) for event in events}
+        missing = [event for event in events if messages[event['id']] is None]
+        if missing:
+            for event, data in zip(missing, self.describe(missing)):
+                messages[event['id']] = sse_message(event['type'], data, event['id'])
+            with self._messages_lock:
+                self._messages.update((event['id'], messages[event['id']]) for event in missing)
+                while len(self._messages) > self.cache_size:
+                    del self._messages[next(iter(self._messages))]
+        return [messages[event['id']] for event in events]
+
+    def stream(self, last_id=None):
+        """Messages SSE à partir de l'événement suivant last_id (None : seulement les nouveaux).
+
+        Si des événements manquants ont déjà été purgés (ou si la base a été recréée), un événement 'reset'
+        demande au client de tout recharger avant d'appliquer la suite.
+        """
+        first_id, latest_id = self.repository.event_bounds()
+        latest_id = latest_id or 0
+        yield f'retry: {RETRY_MS}\n\n'
+        if last_id is None:
+            last_id = latest_id
+        elif last_id > latest_id or (first_id is not None and last_id < first_id - 1):
+            last_id = latest_id
+            yield sse_message('reset', {}, last_id)
+
+        idle = 0.0
+        while not self.closed:
+            seen = self._latest
+            events = self.repository.events_after(last_id)
+            if events:
+                for message in self.messages(events):
+                    yield message
+                last_id = events[-1]['id']
+                idle = 0.0
+                continue
+            self.wait(seen, self.poll_interval)
+            idle += self.poll_interval
+            if idle >= self.heartbeat:
+                # Commentaire SSE : garde la connexion ouverte à travers les proxys
+                idle = 0.0
+                yield ': ping\n\n'
@@ -0,0 +1,83 @@
+import tempfile
+import pandas as pd
+from openpyxl import Workbook
+
+# Colonnes exportées (clés des réponses JSON, sans les classes CSS de l'interface)
+DAILY_FIELDS = ['date', 'matricule', 'nom_complet', 'departement', 'heure_arrivee', 'heure_depart', 'duree', 'status',
+                'signature']
+TRACKING_FIELDS = DAILY_FIELDS
+ABSENCE_FIELDS = ['date', 'matricule', 'nom', 'prenom', 'telephone', 'lieu_habitation', 'departement']
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+# Taille des morceaux du classeur XLSX renvoyés au client
+XLSX_CHUNK = 64 * 1024
+
+
+def csv_stream(frames, fields):
+    """Fichier CSV produit lot par lot : en-tête, puis les lignes de chaque lot dès qu'il est prêt"""
+    yield ','.join(fields).encode('utf-8') + b'\n'
+    for frame in frames:
+        yield frame.reindex(columns=fields).to_csv(index=False, header=False).encode('utf-8')
+
+
+def xlsx_stream(frames, fields, title):
+    """Classeur XLSX en écriture seule (lignes écrites au fil de l'eau sur disque), renvoyé par morceaux"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title[:31])
+    sheet.append(fields)
+    for frame in frames:
+        frame = frame.reindex(columns=fields).astype(object)
+        for row in frame.where(frame.notna(), None).itertuples(index=False, name=None):
+            sheet.append(row)
+    with tempfile.TemporaryFile() as f:
+        workbook.save(f)
+        f.seek(0)
+        while True:
+            chunk = f.read(XLSX_CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+
+class AttendanceExporter:
+    """Exports en flux des présences, du suivi et des absences : la mémoire ne dépend pas du nombre de lignes"""
+
+    def __init__(self, service):
+        self.service = service
+        self.repository = service.repository
+
+    def daily(self, date):
+        """Présences d'une journée, par lots de pointages"""
+        for df in self.repository.iter_attendance(date, date):
+            yield pd.DataFrame(self.service.daily_columns(df)).assign(date=date)
+
+    def tracking(self, start_date=None, end_date=None, matricule=None, departement=None):
+        """Suivi sur une plage quelconque, dates décroissantes (même ordre que get_employee_tracking)"""
+        if departement and str(departement).lower() == 'tous départements':
+            departement = None
+        for df in self.service.archive.iter_history(self.repository, start_date, end_date, matricule, departement,
+                                                    newest_first=True):
+            columns = self.service.tracking_columns(df)
+            if columns is not None:
+                yield pd.DataFrame(columns)
+
+    def absences(self, start_date, end_date=None, department=None):
+        """Absents jour par jour : la date seule, ou chaque jour ouvré (lundi-vendredi, hors fériés) d'une plage"""
+        if not end_date or end_date == start_date:
+            days = [start_date]
+        else:
+            days = pd.bdate_range(start_date, end_date).strftime('%Y-%m-%d')
+        for day in days:
+            snapshot = self.service.get_day_snapshot(day)
+            if not snapshot.is_holiday:
+                yield self.service.absent_frame(snapshot, department).assign(date=day)
+
+    def stream(self, frames, fields, export_format, title):
+        """Contenu du fichier (octets) au format 'csv' ou 'xlsx'"""
+        if export_format == 'xlsx':
+            return xlsx_stream(frames, fields, title)
+        return csv_stream(frames, fields)
@@ -0,0 +1,386 @@
+import os
+import math
+import time
+import heapq
+import numpy as np
+
+# Index utilisé par défaut (exact, ivf ou hnsw), configurable par variable d'environnement
+DEFAULT_INDEX = os.environ.get('FACE_INDEX', 'exact')
+
+
+def _top_k(distances, k):
+    """Retourne les positions des k plus petites distances, triées"""
+    n = len(distances)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    k = min(k, n)
+    top = np.argpartition(distances, k - 1)[:k] if k < n else np.arange(n)
+    return top[np.argsort(distances[top], kind='stable')]
+
+
+class BruteForceIndex:
+    """Recherche exacte : une distance par visage de la galerie"""
+
+    name = 'exact'
+
+    def reset(self):
+        pass
+
+    def rebuild(self, gallery):
+        pass
+
+    def add(self, gallery, row):
+        pass
+
+    def remove(self, gallery, row, moved_from):
+        pass
+
+    def search(self, gallery, query, k):
+        """Retourne (lignes, distances) des k plus proches voisins"""
+        distances = gallery.distances(query)
+        top = _top_k(distances, k)
+        return top, distances[top]
+
+    def search_many(self, gallery, queries, k):
+        """(lignes, distances) des k plus proches voisins de chaque requête"""
+        return [self.search(gallery, query, k) for query in queries]
+
+    def recall(self, gallery, queries, k=1):
+        """Mesure le rappel de l'index par rapport à la recherche exacte"""
+        return measure_recall(self, gallery, queries, k)
+
+
+def kmeans(data, n_clusters, iterations=10, seed=0):
+    """K-means NumPy (initialisation aléatoire, réinitialisation des groupes vides)"""
+    rng = np.random.default_rng(seed)
+    n = len(data)
+    centroids = data[rng.choice(n, size=n_clusters, replace=False)].copy()
+    data_sq = np.einsum('ij,ij->i', data, data)
+    assign = np.zeros(n, dtype=np.int64)
+    for _ in range(iterations):
+        centroid_sq = np.einsum('ij,ij->i', centroids, centroids)
+        distances = data_sq[:, None] - 2.0 * (data @ centroids.T) + centroid_sq[None, :]
+        assign = np.argmin(distances, axis=1)
+        counts = np.bincount(assign, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = data[rng.choice(n, size=int(empty.sum()), replace=False)]
+    return centroids.astype(np.float32), assign
+
+
+class IVFIndex(BruteForceIndex):
+    """Index à fichiers inversés : partitions k-means, seules nprobe partitions sont parcourues"""
+
+    name = 'ivf'
+
+    def __init__(self, nlist=None, nprobe=8, min_train_size=1024, iterations=10):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.iterations = iterations
+        self.reset()
+
+    def reset(self):
+        self.centroids = None
+        self.lists = []
+        self.assign = []
+        self.trained_size = 0
+
+    def rebuild(self, gallery):
+        """Réentraîne les partitions sur toute la galerie"""
+        self.reset()
+        n = len(gallery)
+        if n < self.min_train_size:
+            return
+        nlist = self.nlist or max(1, int(math.sqrt(n)))
+        self.centroids, assign = kmeans(gallery.encodings, nlist, self.iterations)
+        self.lists = [[] for _ in range(nlist)]
+        for row, cluster in enumerate(assign):
+            self.lists[cluster].append(row)
+        self.assign = assign.tolist()
+        self.trained_size = n
+
+    def _nearest_list(self, vector):
+        return int(np.argmin(np.sum((self.centroids - vector) ** 2, axis=1)))
+
+    def add(self, gallery, row):
+        # Réentraînement lorsque la galerie a doublé depuis le dernier entraînement
+        if self.centroids is None or len(gallery) >= 2 * self.trained_size:
+            if len(gallery) >= self.min_train_size:
+                self.rebuild(gallery)
+            return
+        cluster = self._nearest_list(gallery.encodings[row])
+        self.lists[cluster].append(row)
+        self.assign.append(cluster)
+
+    def remove(self, gallery, row, moved_from):
+        if self.centroids is None:
+            return
+        self.lists[self.assign[row]].remove(row)
+        if moved_from != row:
+            cluster = self.assign[moved_from]
+            members = self.lists[cluster]
+            members[members.index(moved_from)] = row
+            self.assign[row] = cluster
+        self.assign.pop()
+        if len(gallery) < self.trained_size // 2:
+            self.rebuild(gallery)
+
+    def search(self, gallery, query, k):
+        if self.centroids is None:
+            return super().search(gallery, query, k)
+        query = np.asarray(query, dtype=np.float32)
+        centroid_distances = np.sum((self.centroids - query) ** 2, axis=1)
+        probes = _top_k(centroid_distances, self.nprobe)
+        rows = np.fromiter(
+            (row for cluster in probes for row in self.lists[cluster]), dtype=np.int64
+        )
+        if len(rows) == 0:
+            return rows, np.empty(0, dtype=np.float32)
+        matrix = gallery.encodings[rows]
+        sq = gallery.sq_norms[rows] - 2.0 * (matrix @ query) + np.dot(query, query)
+        distances = np.sqrt(np.maximum(sq, 0.0))
+        top = _top_k(distances, k)
+        return rows[top], distances[top]
+
+    def search_many(self, gallery, queries, k):
+        """Comme search pour plusieurs requêtes : distances aux centroïdes en un GEMM, puis candidats notés en un GEMM
+        sur la réunion des partitions sondées quand les requêtes en partagent (même visage sur plusieurs images),
+        sinon requête par requête (visages différents d'une même image : la réunion multiplierait les calculs)"""
+        if self.centroids is None:
+            return super().search_many(gallery, queries, k)
+        queries = np.asarray(queries, dtype=np.float32)
+        query_sq = np.einsum('ij,ij->i', queries, queries)
+        centroid_distances = (np.einsum('ij,ij->i', self.centroids, self.centroids)[None, :]
+                              - 2.0 * (queries @ self.centroids.T) + query_sq[:, None])
+        probes = np.array([_top_k(distances, self.nprobe) for distances in centroid_distances])
+        # Partitions sondées, chacune une seule fois : ses lignes occupent rows[bounds[i]:bounds[i + 1]]
+        clusters, probed = np.unique(probes, return_inverse=True)
+        rows = np.fromiter((row for cluster in clusters for row in self.lists[cluster]), dtype=np.int64)
+        bounds = np.zeros(len(clusters) + 1, dtype=np.int64)
+        np.cumsum([len(self.lists[cluster]) for cluster in clusters], out=bounds[1:])
+        positions = [np.concatenate([np.arange(bounds[i], bounds[i + 1]) for i in own])
+                     for own in probed.reshape(len(queries), -1)]
+
+        shared = len(queries) * len(rows) <= 2 * sum(len(own) for own in positions)
+        if shared:
+            sq = gallery.sq_norms[rows][None, :] - 2.0 * (queries @ gallery.encodings[rows].T) + query_sq[:, None]
+            union_distances = np.sqrt(np.maximum(sq, 0.0))
+        results = []
+        for q, own in enumerate(positions):
+            candidates = rows[own]
+            if shared:
+                distances = union_distances[q, own]
+            else:
+                sq = gallery.sq_norms[candidates] - 2.0 * (gallery.encodings[candidates] @ queries[q]) + query_sq[q]
+                distances = np.sqrt(np.maximum(sq, 0.0))
+            top = _top_k(distances, k)
+            results.append((candidates[top], distances[top]))
+        return results
+
+
+class HNSWIndex(BruteForceIndex):
+    """Graphe HNSW (petits mondes navigables hiérarchiques) avec suppressions par pierre tombale"""
+
+    name = 'hnsw'
+
+    def __init__(self, m=16, ef_construction=100, ef_search=64, max_tombstone_ratio=0.25, seed=0):
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.max_tombstone_ratio = max_tombstone_ratio
+        self.level_mult = 1.0 / math.log(m)
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self):
+        self.vectors = None
+        self.links = []
+        self.node_row = []
+        self.row_node = {}
+        self.deleted = set()
+        self.entry_point = None
+        self.max_level = -1
+
+    def _distances(self, query, nodes):
+        diff = self.vectors[nodes] - query
+        return np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+    def _search_layer(self, query, entry_points, ef, level):
+        visited = set(entry_points)
+        distances = self._distances(query, entry_points)
+        candidates = [(d, node) for d, node in zip(distances, entry_points)]
+        heapq.heapify(candidates)
+        results = [(-d, node) for d, node in candidates]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            distance, node = heapq.heappop(candidates)
+            if distance > -results[0][0]:
+                break
+            neighbors = [n for n in self.links[node][level] if n not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            for d, neighbor in zip(self._distances(query, neighbors), neighbors):
+                if len(results) < ef or d < -results[0][0]:
+                    heapq.heappush(candidates, (d, neighbor))
+                    heapq.heappush(results, (-d, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted((-d, node) for d, node in results)
+
+    def _greedy_entry(self, query, target_level):
+        entry = self.entry_point
+        for level in range(self.max_level, target_level, -1):
+            entry = self._search_layer(query, [entry], 1, level)[0][1]
+        return entry
+
+    def _select_neighbors(self, found, limit):
+        """Heuristique HNSW : garde les voisins qui ne sont pas déjà couverts par un voisin plus proche"""
+        if len(found) <= limit:
+            return [n for _, n in found]
+        nodes = [n for _, n in found]
+        vectors = self.vectors[nodes]
+        sq = np.einsum('ij,ij->i', vectors, vectors)
+        pairwise = sq[:, None] - 2.0 * (vectors @ vectors.T) + sq[None, :]
+        base = np.array([d for d, _ in found], dtype=np.float32) ** 2
+
+        selected = []
+        pruned = []
+        for i in range(len(nodes)):
+            if len(selected) >= limit:
+                break
+            if selected and pairwise[i, selected].min() < base[i]:
+                pruned.append(i)
+            else:
+                selected.append(i)
+        # Complète avec les candidats écartés pour conserver la connectivité
+        selected.extend(pruned[:limit - len(selected)])
+        return [nodes[i] for i in selected]
+
+    def _shrink(self, node, level):
+        limit = self.m0 if level == 0 else self.m
+        neighbors = self.links[node][level]
+        if len(neighbors) > limit:
+            distances = self._distances(self.vectors[node], neighbors)
+            keep = np.argsort(distances)[:limit]
+            self.links[node][level] = [neighbors[i] for i in keep]
+
+    def _insert(self, vector):
+        node = len(self.node_row)
+        if self.vectors is None:
+            self.vectors = np.zeros((64, len(vector)), dtype=np.float32)
+        elif node >= self.vectors.shape[0]:
+            vectors = np.zeros((2 * self.vectors.shape[0], len(vector)), dtype=np.float32)
+            vectors[:node] = self.vectors[:node]
+            self.vectors = vectors
+        self.vectors[node] = vector
+        level = int(-math.log(1.0 - self.rng.random()) * self.level_mult)
+        self.links.append([[] for _ in range(level + 1)])
+
+        if self.entry_point is None:
+            self.entry_point = node
+            self.max_level = level
+            return node
+
+        entry = self._greedy_entry(vector, level)
+        entry_points = [entry]
+        for current in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(vector, entry_points, self.ef_construction, current)
+            neighbors = self._select_neighbors(found, self.m)
+            self.links[node][current] = neighbors
+            for neighbor in neighbors:
+                self.links[neighbor][current].append(node)
+                self._shrink(neighbor, current)
+            entry_points = [n for _, n in found]
+
+        if level > self.max_level:
+            self.entry_point = node
+            self.max_level = level
+        return node
+
+    def rebuild(self, gallery):
+        """Reconstruit le graphe à partir de la galerie (purge les pierres tombales)"""
+        self.reset()
+        for row in range(len(gallery)):
+            self.add(gallery, row)
+
+    def add(self, gallery, row):
+        node = self._insert(np.asarray(gallery.encodings[row], dtype=np.float32))
+        self.node_row.append(row)
+        self.row_node[row] = node
+
+    def remove(self, gallery, row, moved_from):
+        node = self.row_node.pop(row)
+        self.deleted.add(node)
+        self.node_row[node] = None
+        if moved_from != row:
+            moved_node = self.row_node.pop(moved_from)
+            self.row_node[row] = moved_node
+            self.node_row[moved_node] = row
+        if len(self.deleted) > self.max_tombstone_ratio * max(len(self.node_row), 1):
+            self.rebuild(gallery)
+
+    def search(self, gallery, query, k):
+        if self.entry_point is None or not self.row_node:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        entry = self._greedy_entry(query, 0)
+        ef = max(self.ef_search, 2 * k)
+        found = self._search_layer(query, [entry], ef, 0)
+        found = [(d, n) for d, n in found if n not in self.deleted][:k]
+        rows = np.array([self.node_row[n] for _, n in found], dtype=np.int64)
+        distances = np.array([d for d, _ in found], dtype=np.float32)
+        return rows, distances
+
+
+INDEX_BACKENDS = {
+    'exact': BruteForceIndex,
+    'ivf': IVFIndex,
+    'hnsw': HNSWIndex
+}
+
+
+def create_index(name=None, **params):
+    """Instancie le backend d'index demandé"""
+    name = (name or DEFAULT_INDEX).lower()
+    if name not in INDEX_BACKENDS:
+        raise ValueError(f"Index inconnu: {name} (choix: {', '.join(INDEX_BACKENDS)})")
+    return INDEX_BACKENDS[name](**params)
+
+
+def measure_recall(index, gallery, queries, k=1):
+    """Compare un index à la recherche exacte : rappel@k et latence moyenne par requête"""
+    exact = BruteForceIndex()
+    hits = 0
+    index_time = 0.0
+    exact_time = 0.0
+    for query in queries:
+        start = time.perf_counter()
+        expected, _ = exact.search(gallery, query, k)
+        exact_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        found, _ = index.search(gallery, query, k)
+        index_time += time.perf_counter() - start
+
+        hits += len(set(expected.tolist()) & set(found.tolist()))
+
+    total = max(len(queries), 1)
+    k = max(min(k, len(gallery)), 1)
+    return {
+        'backend': index.name,
+        'gallery_size': len(gallery),
+        'queries': len(queries),
+        'k': k,
+        'recall': round(hits / (total * k), 4) if len(queries) else None,
+        'latency_ms': round(1000 * index_time / total, 3),
+        'exact_latency_ms': round(1000 * exact_time / total, 3)
+    }
@@ -1,48 +1,104 @@
 import os
-import cv2
+import time
+import threading
 import numpy as np
 import face_recognition
 import pandas as pd
 from datetime import datetime
-import base64
-import io
-from PIL import Image
+from .encoding_cache import EncodingCache
+from .gallery import FaceGallery
+from .shared_gallery import SharedGallery
+from .face_index import create_index, measure_recall
+from .detection import FaceDetector
+from .recognizer import FaceRecognizer
+from .repository import Repository
 
-class FaceService:
-    def __init__(self):
-        self.known_face_encodings = []
-        self.known_face_metadata = []
-        self.load_known_faces()  # Charge les visages connus à l'initialisation
+class FaceService(FaceRecognizer):
+    def __init__(self, index_backend=None, repository=None, background=True):
+        self.repository = repository or Repository()
+        self.gallery = FaceGallery(index=create_index(index_backend))
+        self.encoding_cache = EncodingCache()
+        self.detector = FaceDetector()
+        # Progression du chargement (/api/ready) ; ready : une première galerie complète est installée
+        self.loading = {'state': 'en_attente', 'total': 0, 'processed': 0, 'loaded': 0,
+                        'started_at': None, 'finished_at': None, 'error': None}
+        self._loading_lock = threading.Lock()
+        self.ready = threading.Event()
+        self._load_lock = threading.Lock()
+        self._load_thread = None
+        # Modifications faites pendant un chargement, rejouées sur la nouvelle galerie avant son installation
+        self._gallery_lock = threading.RLock()
+        self._pending_edits = None
+        # Charge les visages connus à l'initialisation, en arrière-plan : le serveur répond pendant ce temps
+        if background:
+            self.start_loading()
+        else:
+            self.load_known_faces()
+
+    @property
+    def known_face_encodings(self):
+        """Encodages connus (vue float32 sur la matrice de la galerie)"""
+        return self.gallery.encodings
+
+    @property
+    def known_face_metadata(self):
+        return self.gallery.metadata
+
+    def start_loading(self):
+        """Lance le chargement des visages connus dans un thread ; la galerie actuelle reste servie jusqu'au bout"""
+        self._load_thread = threading.Thread(target=self.load_known_faces, name='liggeey-gallery-loader', daemon=True)
+        self._load_thread.start()
+        return self._load_thread
+
+    def wait_loaded(self, timeout=None):
+        """Attend la fin du chargement lancé par start_loading ; True si une galerie est installée"""
+        if self._load_thread is not None:
+            self._load_thread.join(timeout)
+        return self.ready.is_set()
+
+    def loading_progress(self):
+        """Copie cohérente de la progression du chargement (lue par /api/ready pendant que le chargement avance)"""
+        with self._loading_lock:
+            return dict(self.loading)
+
+    def _set_progress(self, **fields):
+        with self._loading_lock:
+            self.loading.update(fields)
 
     def load_known_faces(self):
         """Charge les visages connus depuis la base de données et retourne les logs"""
+        # Un seul chargement à la fois (rechargement demandé pendant le chargement initial : il attend)
+        with self._load_lock:
+            return self._load_known_faces()
+
+    def _load_known_faces(self):
         logs = []
+        self._set_progress(state='chargement', total=0, processed=0, loaded=0, started_at=time.time(),
+                           finished_at=None, error=None)
+        # Notées dès avant la lecture de la base : une modification déjà visible dans cette lecture est aussi
+        # rejouée, d'où des modifications idempotentes (ajout rejoué comme upsert)
+        with self._gallery_lock:
+            self._pending_edits = []
         try:
             logs.append("\nChargement des visages connus depuis la base de données...")
-            db_path = os.path.join('data', 'database.csv')
-            
-            # Vérifie si la base de données existe
-            if not os.path.exists(db_path):
-                df = pd.DataFrame(columns=['matricule', 'nom', 'prenom', 'telephone', 
-                                        'lieu_habitation', 'departement', 'image_path'])
-                df.to_csv(db_path, index=False)
-                logs.append("Création d'une nouvelle base de données vide.")
-                return logs
-
-            df = pd.read_csv(db_path)
-            self.known_face_encodings = []
-            self.known_face_metadata = []
+            df = self.repository.get_employees()
+            self._set_progress(total=len(df))
+            # Nouvelle galerie construite à part, puis installée en une fois
+            gallery = FaceGallery(index=create_index(self.gallery.index.name))
             loaded_count = 0
             missing_images = 0
             no_face_detected = 0
+            encoded_count = 0
+            used_keys = []
             
             header = f"\n{'Matricule':<10} | {'Nom complet':<25} | {'Fichier image':<20} | Statut"
             separator = "-" * 70
             logs.extend([header, separator])
             
-            for _, row in df.iterrows():
+            for position, (_, row) in enumerate(df.iterrows()):
+                self._set_progress(processed=position)
                 status = ""
-                if pd.isna(row['image_path']):
+                if pd.isna(row['image_path']) or not row['image_path']:
                     status = "Aucune image associée"
                     logs.append(f"{row['matricule']:<10} | {row['prenom'] + ' ' + row['nom']:<25} | {'':<20} | {status}")
                     continue
@@ -56,22 +112,17 @@ class FaceService:
                     continue
                     
                 try:
-                    image = face_recognition.load_image_file(image_path)
-                    face_encodings = face_recognition.face_encodings(image)
+                    # Seules les photos nouvelles ou modifiées sont réencodées
+                    cache_key, face_encoding, encoded = self.encoding_cache.encode_file(image_path)
+                    used_keys.append(cache_key)
+                    if encoded:
+                        encoded_count += 1
                     
-                    if len(face_encodings) > 0:
-                        self.known_face_encodings.append(face_encodings[0])
-                        self.known_face_metadata.append({
-                            'matricule': row['matricule'],
-                            'nom': row['nom'],
-                            'prenom': row['prenom'],
-                            'telephone': row['telephone'],
-                            'lieu_habitation': row['lieu_habitation'],
-                            'departement': row['departement'],
-                            'image_path': row['image_path']
-                        })
+                    if face_encoding is not None:
+                        gallery.add(face_encoding, self.build_metadata(row))
                         status = "Chargé avec succès"
                         loaded_count += 1
+                        self._set_progress(loaded=loaded_count)
                     else:
                         status = "Aucun visage détecté"
                         no_face_detected += 1
@@ -82,11 +133,23 @@ class FaceService:
                     status = f"Erreur traitement: {str(e)}"
                     logs.append(f"{row['matricule']:<10} | {row['prenom'] + ' ' + row['nom']:<25} | {row['image_path']:<20} | {status}")
             
+            self.encoding_cache.retain(used_keys)
+            self.encoding_cache.save()
+            with self._gallery_lock:
+                # Ajouts, mises à jour et retraits arrivés pendant la lecture, puis bascule en une fois
+                for method, args in self._pending_edits:
+                    getattr(gallery, 'upsert' if method == 'add' else method)(*args)
+                self._pending_edits = None
+                self.install_gallery(gallery)
+            self.ready.set()
+            self._set_progress(state='pret', processed=len(df), finished_at=time.time())
+            
             # Récapitulatif du chargement des visages
             summary = [
                 "\nRécapitulatif du chargement:",
                 f"- Employés dans la base: {len(df)}",
                 f"- Visages chargés avec succès: {loaded_count}",
+                f"- Photos (ré)encodées: {encoded_count} (les autres proviennent du cache)",
                 f"- Images manquantes: {missing_images}",
                 f"- Aucun visage détecté: {no_face_detected}",
                 f"- Sans image associée: {len(df) - loaded_count - missing_images - no_face_detected}"
@@ -95,73 +158,122 @@ class FaceService:
                 
         except Exception as e:
             logs.append(f"\nERREUR lors du chargement des visages: {str(e)}")
+            self._set_progress(state='erreur', error=str(e), finished_at=time.time())
+        finally:
+            with self._gallery_lock:
+                self._pending_edits = None
         
         return logs
 
-    def recognize_face(self, image_data):
-        """Reconnaît un visage à partir des données d'image"""
+    def edit_gallery(self, method, *args):
+        """Modifie la galerie installée (add, upsert, update_metadata, discard) ; pendant un chargement, la même
+        modification est notée pour être rejouée sur la galerie en construction.
+
+        La galerie servie n'est jamais modifiée sur place (les recherches la lisent sans verrou) : la modification
+        est faite sur une copie qui la remplace en une fois, comme une nouvelle génération de la galerie partagée.
+        """
+        with self._gallery_lock:
+            if self._pending_edits is not None:
+                self._pending_edits.append((method, args))
+            if isinstance(self.gallery, SharedGallery):
+                return getattr(self.gallery, method)(*args)
+            gallery = self.gallery.copy()
+            result = getattr(gallery, method)(*args)
+            self.gallery = gallery
+            return result
+
+    def install_gallery(self, gallery):
+        """Remplace la galerie (publiée pour tous les processus si elle est partagée) ; une fois installée, elle n'est
+        plus modifiée sur place (edit_gallery en installe une copie modifiée)"""
+        if isinstance(self.gallery, SharedGallery):
+            self.gallery.replace(gallery)
+        else:
+            self.gallery = gallery
+
+    def share_gallery(self, name=None):
+        """Passe la galerie en mémoire partagée (serveur préforké, avant la création des processus de travail)"""
+        with self._gallery_lock:
+            if not isinstance(self.gallery, SharedGallery):
+                self.gallery = SharedGallery(self.gallery, name)
+            return self.gallery
+
+    def build_metadata(self, employee):
+        """Construit les métadonnées d'un visage connu à partir d'une ligne de la base"""
+        return {
+            'matricule': employee['matricule'],
+            'nom': employee['nom'],
+            'prenom': employee['prenom'],
+            'telephone': employee['telephone'],
+            'lieu_habitation': employee['lieu_habitation'],
+            'departement': employee['departement'],
+            'image_path': employee['image_path']
+        }
+
+    def find_face_index(self, matricule):
+        """Retourne la position d'un employé dans les visages connus (None si absent)"""
+        return self.gallery.find(matricule)
+
+    def encode_employee_photo(self, image_path, image=None, face_locations=None):
+        """Encode la photo d'un employé en réutilisant la détection déjà faite si elle est fournie"""
+        if image is None or not face_locations:
+            _, face_encoding, _ = self.encoding_cache.encode_file(image_path)
+            return face_encoding
+
+        face_encoding = face_recognition.face_encodings(image, face_locations[:1])[0]
+        self.encoding_cache.put(self.encoding_cache.key_for_file(image_path), face_encoding)
+        return face_encoding
+
+    def enroll_employee(self, employee, image=None, face_locations=None):
+        """Ajoute (ou remplace) un seul employé dans les visages connus sans recharger la base"""
         try:
-            # Conversion des données d'image selon le format d'entrée
-            if isinstance(image_data, str) and image_data.startswith('data:image/'):
-                header, encoded = image_data.split(",", 1)
-                binary_data = io.BytesIO(base64.b64decode(encoded))
-                image = Image.open(binary_data)
-                unknown_image = np.array(image)
-                unknown_image = cv2.cvtColor(unknown_image, cv2.COLOR_RGB2BGR)
-            else:
-                nparr = np.frombuffer(image_data, np.uint8)
-                unknown_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-            # Détection des visages
-            face_locations = face_recognition.face_locations(unknown_image)
-        
-            if len(face_locations) == 0:
-                return {
-                    'status': 'error',
-                    'message': 'Aucun visage détecté'
-                }
-            
-            # Encodage du visage détecté
-            unknown_encoding = face_recognition.face_encodings(unknown_image, [face_locations[0]])[0]
-        
-            # Comparaison avec les visages connus avec une tolérance plus stricte
-            face_distances = face_recognition.face_distance(self.known_face_encodings, unknown_encoding)
-        
-            # Trouver la meilleure correspondance avec une distance minimale
-            best_match_index = np.argmin(face_distances)
-        
-            # Seuil de reconnaissance plus strict (0.5 par défaut, on passe à 0.4)
-            if face_distances[best_match_index] < 0.4:
-                metadata = self.known_face_metadata[best_match_index]
-                
-                return {
-                    'status': 'success',
-                    'employee_id': metadata['matricule'],
-                    'full_name': f"{metadata['prenom']} {metadata['nom']}",
-                    'department': metadata['departement']
-                }
-            else:
-                return {
-                    'status': 'error',
-                    'message': 'Visage non reconnu'
-                }
-            
+            if pd.isna(employee.get('image_path')) or not employee.get('image_path'):
+                self.remove_employee_face(employee['matricule'])
+                return False, "Aucune image associée"
+
+            image_path = os.path.join('data', 'images', employee['image_path'])
+            if not os.path.exists(image_path):
+                self.remove_employee_face(employee['matricule'])
+                return False, "Fichier image manquant"
+
+            face_encoding = self.encode_employee_photo(image_path, image, face_locations)
+            self.encoding_cache.save()
+            if face_encoding is None:
+                self.remove_employee_face(employee['matricule'])
+                return False, "Aucun visage détecté"
+
+            # Remplacement en une seule modification : l'employé reste reconnaissable pendant le réenrôlement
+            self.edit_gallery('upsert', face_encoding, self.build_metadata(employee))
+            return True, "Visage chargé avec succès"
+
         except Exception as e:
-            return {
-                'status': 'error',
-                'message': f'Erreur reconnaissance: {str(e)}'
-            }
+            print(f"[ERREUR] Enregistrement visage {employee.get('matricule')}: {str(e)}")
+            return False, f"Erreur traitement: {str(e)}"
+
+    def update_employee_face(self, employee, photo_changed=False):
+        """Met à jour un employé dans les visages connus (réencodage uniquement si la photo a changé)"""
+        if photo_changed or not self.edit_gallery('update_metadata', employee['matricule'],
+                                                    self.build_metadata(employee)):
+            return self.enroll_employee(employee)
+        return True, "Métadonnées mises à jour"
+
+    def remove_employee_face(self, matricule):
+        """Retire un employé des visages connus"""
+        return self.edit_gallery('discard', matricule)
+
+    def index_report(self, k=1, sample=200, noise=0.02):
+        """Rappel de l'index de la galerie par rapport à la recherche exacte (requêtes = visages connus bruités)"""
+        encodings = self.gallery.encodings
+        if len(encodings) == 0:
+            return measure_recall(self.gallery.index, self.gallery, [], k)
+        rng = np.random.default_rng(0)
+        rows = rng.choice(len(encodings), size=min(sample, len(encodings)), replace=False)
+        queries = encodings[rows] + rng.normal(0, noise, (len(rows), encodings.shape[1])).astype(np.float32)
+        return measure_recall(self.gallery.index, self.gallery, queries, k)
 
     def get_all_employees(self):
         """Récupère tous les employés de la base de données"""
         try:
-            db_path = os.path.join('data', 'database.csv')
-            if not os.path.exists(db_path):
-                return []
-                
-            df = pd.read_csv(db_path)
-            df = df.fillna('')
-            return df.to_dict('records')
+            return self.repository.get_employees().fillna('').to_dict('records')
         except Exception as e:
             print(f"Erreur get_all_employees: {str(e)}")
             return []
@@ -169,14 +281,8 @@ class FaceService:
     def add_employee(self, matricule, nom, prenom, telephone, lieu_habitation, departement, photo):
         """Ajoute un nouvel employé à la base de données"""
         try:
-            db_path = os.path.join('data', 'database.csv')
-            if os.path.exists(db_path):
-                df = pd.read_csv(db_path)
-                if matricule in df['matricule'].values:
-                    return False, "Matricule existe déjà"
-            else:
-                df = pd.DataFrame(columns=['matricule', 'nom', 'prenom', 'telephone', 
-                                         'lieu_habitation', 'departement', 'image_path'])
+            if self.repository.employee_exists(matricule):
+                return False, "Matricule existe déjà"
             
             # Création du répertoire images si nécessaire
             os.makedirs(os.path.join('data', 'images'), exist_ok=True)
@@ -217,11 +323,10 @@ class FaceService:
                 'image_path': filename
             }
             
-            df = pd.concat([df, pd.DataFrame([new_employee])], ignore_index=True)
-            df.to_csv(db_path, index=False)
+            self.repository.add_employee(new_employee)
             
-            # Rechargement des visages connus
-            self.load_known_faces()
+            # Ajout du seul nouveau visage, en réutilisant la détection ci-dessus
+            self.enroll_employee(new_employee, image, face_locations)
             
             return True, f"Employé {prenom} {nom} ajouté avec succès"
             
@@ -232,26 +337,21 @@ class FaceService:
     def delete_employee(self, matricule):
         """Supprime un employé de la base de données"""
         try:
-            db_path = os.path.join('data', 'database.csv')
-            df = pd.read_csv(db_path)
-            
-            if matricule not in df['matricule'].values:
+            employee = self.repository.get_employee(matricule)
+            if employee is None:
                 return False, "Employé non trouvé"
-                
-            employee = df[df['matricule'] == matricule].iloc[0]
             
             # Suppression de l'image associée
-            if not pd.isna(employee['image_path']):
+            if employee['image_path']:
                 image_path = os.path.join('data', 'images', employee['image_path'])
                 if os.path.exists(image_path):
                     os.remove(image_path)
             
             # Suppression de l'entrée dans la base de données
-            df = df[df['matricule'] != matricule]
-            df.to_csv(db_path, index=False)
+            self.repository.delete_employee(matricule)
             
-            # Rechargement des visages connus
-            self.load_known_faces()
+            # Retrait du seul visage concerné
+            self.remove_employee_face(matricule)
             
             return True, "Employé supprimé avec succès"
             
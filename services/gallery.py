@@ -0,0 +1,232 @@
+import pickle
+import numpy as np
+from .face_index import create_index
+
+ENCODING_DIM = 128
+
+
+class FaceGallery:
+    """Galerie des visages connus : matrice float32 contiguë, extensible, avec normes précalculées.
+
+    Les modifications se font sur place, sans verrou : une galerie servie aux recherches n'est jamais modifiée,
+    on en modifie une copie (copy) qui la remplace ensuite en une fois (FaceService.edit_gallery).
+    """
+
+    def __init__(self, dim=ENCODING_DIM, capacity=64, index=None):
+        self.dim = dim
+        self.index = index if index is not None else create_index()
+        self._matrix = np.zeros((max(capacity, 1), dim), dtype=np.float32)
+        self._sq_norms = np.zeros(max(capacity, 1), dtype=np.float32)
+        self._metadata = []
+        # Matricule -> ligne (recherche par matricule en O(1), tenue à jour à chaque modification)
+        self._rows = {}
+        self._size = 0
+        # Incrémenté à chaque modification (permet aux copies de savoir qu'elles sont périmées)
+        self.version = 0
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Reconstruit une galerie à partir d'un instantané (processus de travail)"""
+        encodings = snapshot['encodings']
+        gallery = cls(dim=encodings.shape[1], capacity=max(len(encodings), 1), index=create_index(snapshot['index']))
+        for encoding, metadata in zip(encodings, snapshot['metadata']):
+            gallery.add(encoding, metadata)
+        gallery.version = snapshot['version']
+        return gallery
+
+    def copy(self):
+        """Copie indépendante (encodages, métadonnées, table des matricules, index) à modifier puis installer"""
+        gallery = FaceGallery(dim=self.dim, capacity=1,
+                              index=pickle.loads(pickle.dumps(self.index, pickle.HIGHEST_PROTOCOL)))
+        gallery._matrix = self._matrix.copy()
+        gallery._sq_norms = self._sq_norms.copy()
+        gallery._metadata = list(self._metadata)
+        gallery._rows = dict(self._rows)
+        gallery._size = self._size
+        gallery.version = self.version
+        return gallery
+
+    def snapshot(self):
+        """Copie sérialisable de la galerie (encodages, métadonnées, backend d'index)"""
+        return {
+            'encodings': self.encodings.copy(),
+            'metadata': list(self._metadata),
+            'index': self.index.name,
+            'version': self.version
+        }
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return self._matrix.shape[0]
+
+    @property
+    def encodings(self):
+        """Vue (sans copie) sur les encodages actifs"""
+        return self._matrix[:self._size]
+
+    @property
+    def sq_norms(self):
+        return self._sq_norms[:self._size]
+
+    @property
+    def metadata(self):
+        return self._metadata
+
+    def _grow(self, min_capacity):
+        """Double la capacité réservée jusqu'à atteindre min_capacity"""
+        capacity = self.capacity
+        while capacity < min_capacity:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        sq_norms = np.zeros(capacity, dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        self._matrix = matrix
+        self._sq_norms = sq_norms
+
+    def clear(self):
+        self._metadata = []
+        self._rows = {}
+        self._size = 0
+        self.version += 1
+        self.index.reset()
+
+    def set_index(self, index):
+        """Remplace le backend d'index et le construit sur la galerie actuelle"""
+        self.index = index
+        self.index.rebuild(self)
+
+    def add(self, encoding, metadata):
+        """Ajoute un encodage et retourne sa ligne dans la matrice"""
+        if self._size >= self.capacity:
+            self._grow(self._size + 1)
+        row = self._size
+        self._matrix[row] = np.asarray(encoding, dtype=np.float32)
+        self._sq_norms[row] = float(np.dot(self._matrix[row], self._matrix[row]))
+        self._metadata.append(metadata)
+        self._rows[str(metadata['matricule'])] = row
+        self._size += 1
+        self.version += 1
+        self.index.add(self, row)
+        return row
+
+    def remove(self, row):
+        """Retire une ligne en y déplaçant la dernière (O(1)) et retourne l'ancienne position déplacée"""
+        last = self._size - 1
+        if row < 0 or row > last:
+            raise IndexError(row)
+        self._forget(row)
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            self._sq_norms[row] = self._sq_norms[last]
+            self._metadata[row] = self._metadata[last]
+            matricule = str(self._metadata[row]['matricule'])
+            if self._rows.get(matricule) == last:
+                self._rows[matricule] = row
+        self._metadata.pop()
+        self._size -= 1
+        self.version += 1
+        self.index.remove(self, row, last)
+        return last
+
+    def _forget(self, row):
+        """Retire le matricule d'une ligne de la table de recherche (sauf s'il pointe déjà vers une autre ligne)"""
+        matricule = str(self._metadata[row]['matricule'])
+        if self._rows.get(matricule) == row:
+            del self._rows[matricule]
+
+    def set_metadata(self, row, metadata):
+        self._forget(row)
+        self._metadata[row] = metadata
+        self._rows[str(metadata['matricule'])] = row
+        self.version += 1
+
+    def discard(self, matricule):
+        """Retire un matricule ; False s'il est absent"""
+        row = self.find(matricule)
+        if row is None:
+            return False
+        self.remove(row)
+        return True
+
+    def upsert(self, encoding, metadata):
+        """Ajoute un matricule ou remplace son encodage et ses métadonnées ; retourne sa ligne"""
+        previous = self.find(metadata['matricule'])
+        row = self.add(encoding, metadata)
+        if previous is None:
+            return row
+        self.remove(previous)
+        return previous
+
+    def update_metadata(self, matricule, metadata):
+        """Remplace les métadonnées d'un matricule ; False s'il est absent"""
+        row = self.find(matricule)
+        if row is None:
+            return False
+        self.set_metadata(row, metadata)
+        return True
+
+    def find(self, matricule):
+        """Retourne la ligne d'un matricule (None si absent)"""
+        return self._rows.get(str(matricule))
+
+    def distances(self, query):
+        """Distances euclidiennes entre la requête et toute la galerie (un seul GEMV)"""
+        query = np.asarray(query, dtype=np.float32)
+        n = self._size
+        # ||g - q||² = ||g||² - 2 g·q + ||q||²
+        sq = self._sq_norms[:n] - 2.0 * (self._matrix[:n] @ query) + np.dot(query, query)
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq, out=sq)
+
+    def match_top_k(self, query, k=3):
+        """Retourne les k meilleurs candidats avec leur distance et leur marge sur le candidat suivant"""
+        if self._size == 0:
+            return []
+        # Un candidat de plus pour calculer la marge du k-ième
+        rows, distances = self.index.search(self, query, k + 1)
+        return self._candidates(rows, distances, k)
+
+    def _candidates(self, rows, distances, k):
+        """k premiers candidats (lignes et distances triées) avec leur marge sur le candidat suivant"""
+        candidates = []
+        for position, row in enumerate(rows[:k]):
+            distance = float(distances[position])
+            next_distance = float(distances[position + 1]) if position + 1 < len(rows) else None
+            candidates.append({
+                'row': int(row),
+                'metadata': self._metadata[row],
+                'distance': distance,
+                'margin': None if next_distance is None else next_distance - distance
+            })
+        return candidates
+
+    def match_many(self, queries, k=2):
+        """Top-k pour plusieurs visages à la fois (un seul GEMM en recherche exacte)"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if self._size == 0 or len(queries) == 0:
+            return [[] for _ in range(len(queries))]
+        if self.index.name != 'exact':
+            return [self._candidates(rows, distances, k)
+                    for rows, distances in self.index.search_many(self, queries, k + 1)]
+
+        n = self._size
+        sq = (self._sq_norms[:n][None, :] - 2.0 * (queries @ self._matrix[:n].T)
+              + np.einsum('ij,ij->i', queries, queries)[:, None])
+        distances = np.sqrt(np.maximum(sq, 0.0))
+        kk = min(k + 1, n)
+        top = np.argpartition(distances, kk - 1, axis=1)[:, :kk] if kk < n else np.tile(np.arange(n), (len(queries), 1))
+        order = np.take_along_axis(distances, top, axis=1).argsort(axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+
+        return [self._candidates(rows, distances[q, rows], k) for q, rows in enumerate(top)]
+
+    def match(self, query, tolerance):
+        """Retourne le meilleur candidat s'il est sous le seuil de tolérance, sinon None"""
+        candidates = self.match_top_k(query, k=1)
+        if candidates and candidates[0]['distance'] < tolerance:
+            return candidates[0]
+        return None
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+
+def interval_mask(ordinals, days, intervals):
+    """Matrice employés × jours couverts par des périodes (matricule, début, fin), par différences cumulées"""
+    mask = np.zeros((len(ordinals), len(days)), dtype=bool)
+    if not intervals or not len(days):
+        return mask
+    matricules, starts, ends = (np.array(column, dtype=object) for column in zip(*intervals))
+    rows = ordinals.get_indexer(pd.Index(matricules.astype(str)).str.strip())
+    first = np.searchsorted(days, starts.astype(str), side='left')
+    last = np.searchsorted(days, ends.astype(str), side='right')
+    keep = (rows >= 0) & (last > first)
+    delta = np.zeros((len(ordinals), len(days) + 1), dtype=np.int32)
+    np.add.at(delta, (rows[keep], first[keep]), 1)
+    np.add.at(delta, (rows[keep], last[keep]), -1)
+    return np.cumsum(delta, axis=1)[:, :len(days)] > 0
+
+
+def longest_runs(mask):
+    """Plus longue suite de True de chaque ligne"""
+    if mask.shape[1] == 0:
+        return np.zeros(mask.shape[0], dtype=np.int64)
+    counts = np.cumsum(mask, axis=1)
+    resets = np.maximum.accumulate(np.where(mask, 0, counts), axis=1)
+    return (counts - resets).max(axis=1)
+
+
+class PresenceMatrix:
+    """Présences employés × jours ouvrés : une colonne booléenne par jour, une ligne par employé (ordinal stable)"""
+
+    def __init__(self, employees, days, present, leave, mission, holidays):
+        self.employees = employees.reset_index(drop=True)
+        # Ordinal d'un employé = sa position dans l'effectif
+        self.ordinals = pd.Index(self.employees['matricule'].astype(str).str.strip())
+        self.days = days
+        self.present = present
+        self.leave = leave
+        self.mission = mission
+        self.holidays = holidays
+        # Jour attendu : ouvré, non férié, hors congé et mission ; absence = attendu sans pointage
+        self.expected = ~holidays[None, :] & ~leave & ~mission
+        self.absent = self.expected & ~present
+
+    @classmethod
+    def build(cls, employees, attendance, start_date, end_date, leave_intervals, mission_intervals, holiday_dates):
+        """Construit la matrice d'une plage de dates (jours du lundi au vendredi)"""
+        days = pd.bdate_range(start_date, end_date).strftime('%Y-%m-%d').to_numpy(dtype=str)
+        ordinals = pd.Index(employees['matricule'].astype(str).str.strip())
+
+        present = np.zeros((len(ordinals), len(days)), dtype=bool)
+        rows = ordinals.get_indexer(attendance['matricule'].astype(str).str.strip())
+        columns = pd.Index(days).get_indexer(attendance['date'].astype(str))
+        keep = (rows >= 0) & (columns >= 0)
+        present[rows[keep], columns[keep]] = True
+
+        return cls(
+            employees, days, present,
+            interval_mask(ordinals, days, leave_intervals),
+            interval_mask(ordinals, days, mission_intervals),
+            np.isin(days, np.array(sorted(holiday_dates), dtype=str))
+        )
+
+    def day_range(self, start_date=None, end_date=None):
+        """Colonnes d'une sous-plage (les jours sont triés : recherche dichotomique)"""
+        first = np.searchsorted(self.days, start_date, side='left') if start_date else 0
+        last = np.searchsorted(self.days, end_date, side='right') if end_date else len(self.days)
+        return slice(first, last)
+
+    def employee_mask(self, departement=None):
+        if not departement or departement.lower() == 'tous départements':
+            return np.ones(len(self.employees), dtype=bool)
+        return (self.employees['departement'].astype(str).str.lower() == departement.lower()).to_numpy()
+
+    def summary(self, start_date=None, end_date=None, departement=None):
+        """Par employé : jours attendus, présents, absents, plus longue absence consécutive et taux de présence"""
+        columns = self.day_range(start_date, end_date)
+        rows = self.employee_mask(departement)
+        expected = self.expected[rows, columns]
+        absent = self.absent[rows, columns]
+        # Les jours fériés ne comptent pas et n'interrompent pas une suite d'absences
+        working = ~self.holidays[columns]
+
+        df = self.employees[rows].reset_index(drop=True)
+        df['expected_days'] = expected.sum(axis=1)
+        df['present_days'] = (self.present[rows, columns] & expected).sum(axis=1)
+        df['absent_days'] = absent.sum(axis=1)
+        df['longest_absence'] = longest_runs(absent[:, working])
+        df['attendance_rate'] = np.where(df['expected_days'] > 0,
+                                         df['present_days'] / np.maximum(df['expected_days'], 1), np.nan)
+        return df
+
+    def department_rates(self, start_date=None, end_date=None):
+        """Par département : effectif, jours attendus, jours présents et taux de présence"""
+        df = self.summary(start_date, end_date)
+        df['departement'] = df['departement'].fillna('')
+        rates = df.groupby('departement', sort=True).agg(
+            employees=('matricule', 'size'),
+            expected_days=('expected_days', 'sum'),
+            present_days=('present_days', 'sum'),
+            absent_days=('absent_days', 'sum')
+        ).reset_index()
+        rates['attendance_rate'] = np.where(rates['expected_days'] > 0,
+                                            rates['present_days'] / np.maximum(rates['expected_days'], 1), np.nan)
+        return rates
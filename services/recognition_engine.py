@@ -0,0 +1,172 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from .detection import FaceDetector
+from .recognizer import FaceRecognizer
+
+# Configuration du moteur (0 processus = reconnaissance dans le thread de la requête).
+# Pool désactivé par défaut : en production (serve.py), les processus préforkés parallélisent déjà la
+# reconnaissance, et un pool par processus multiplierait les processus par le nombre de cœurs ; les processus
+# du pool (spawn) réimportent en outre le script principal. À activer pour le serveur de développement
+# (RECOGNITION_WORKERS=4, ou le nombre de cœurs).
+RECOGNITION_WORKERS = int(os.environ.get('RECOGNITION_WORKERS', 0))
+RECOGNITION_QUEUE_SIZE = int(os.environ.get('RECOGNITION_QUEUE_SIZE', 8))
+RECOGNITION_DEADLINE_MS = int(os.environ.get('RECOGNITION_DEADLINE_MS', 4000))
+
+
+class EngineBusy(Exception):
+    """File de reconnaissance pleine : le client doit réessayer plus tard"""
+
+    def __init__(self, retry_after_ms):
+        super().__init__(f"Serveur occupé, réessayez dans {retry_after_ms} ms")
+        self.retry_after_ms = retry_after_ms
+
+
+class DeadlineExceeded(Exception):
+    """La reconnaissance n'a pas abouti avant l'échéance de la requête"""
+
+
+# Détecteur propre à chaque processus de travail (sans galerie : l'identification se fait dans le processus parent)
+_worker_recognizer = None
+
+
+def _init_worker():
+    global _worker_recognizer
+    _worker_recognizer = FaceRecognizer(None, FaceDetector())
+
+
+def _detect_in_worker(image_data, reduce, multi, deadline):
+    # Requête déjà expirée pendant son attente dans la file : inutile de la traiter
+    if time.time() > deadline:
+        return None
+    return _worker_recognizer.detect(image_data, reduce, max_faces=None if multi else 1)
+
+
+class RecognitionEngine:
+    """Moteur de reconnaissance : pool de processus (détection et encodage), file bornée, échéance par requête.
+
+    Les processus du pool ne détiennent pas la galerie : ils renvoient les encodages, comparés ensuite à la galerie
+    courante du processus parent. Un ajout ou un retrait d'agent ne touche donc pas au pool.
+    """
+
+    def __init__(self, face_service, workers=RECOGNITION_WORKERS, queue_size=RECOGNITION_QUEUE_SIZE,
+                 deadline_ms=RECOGNITION_DEADLINE_MS):
+        self.face_service = face_service
+        self.workers = workers
+        self.queue_size = queue_size
+        self.deadline_ms = deadline_ms
+        # Places disponibles (requêtes en cours + en attente)
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        # Moyenne glissante de la durée d'une reconnaissance, pour estimer le délai de réessai
+        self._avg_ms = 300.0
+        self.stats = {'submitted': 0, 'rejected': 0, 'expired': 0}
+
+    def _ensure_pool(self):
+        """Crée le pool au premier besoin (une seule fois par processus)"""
+        with self._lock:
+            if self._pool_pid != os.getpid():
+                # Processus fils (serveur préforké) : le pool hérité appartient au parent
+                self._pool = None
+            if self._pool is None:
+                # spawn : pas de fork d'un processus Flask multi-threadé
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _discard_pool(self, pool):
+        """Oublie un pool cassé (processus de travail tué) : le suivant est créé à la requête suivante"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        """Démarre le pool à l'avance pour que la première requête ne paie pas le lancement"""
+        if self.workers > 0:
+            self._ensure_pool()
+        return self
+
+    def retry_after_ms(self):
+        """Délai de réessai estimé : temps pour écouler la file actuelle"""
+        return int(self._avg_ms * self.queue_size / max(self.workers, 1))
+
+    def recognize(self, image_data, reduce=1, multi=False):
+        """Soumet une image ; lève EngineBusy si la file est pleine, DeadlineExceeded si l'échéance est dépassée"""
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise EngineBusy(self.retry_after_ms())
+
+        self._count('submitted')
+        start = time.time()
+        deadline = start + self.deadline_ms / 1000
+        try:
+            if self.workers <= 0:
+                try:
+                    if multi:
+                        result = self.face_service.recognize_faces(image_data, reduce=reduce)
+                    else:
+                        result = self.face_service.recognize_face(image_data, reduce=reduce)
+                finally:
+                    self._slots.release()
+            else:
+                result = self._recognize_in_pool(image_data, reduce, multi, deadline)
+
+            if result is None:
+                self._count('expired')
+                raise DeadlineExceeded(f"Reconnaissance non terminée en {self.deadline_ms} ms")
+            return result
+        finally:
+            elapsed_ms = 1000 * (time.time() - start)
+            with self._lock:
+                self._avg_ms = 0.8 * self._avg_ms + 0.2 * elapsed_ms
+
+    def _count(self, key):
+        """Compteurs partagés par les threads des requêtes : incrémentés sous verrou"""
+        with self._lock:
+            self.stats[key] += 1
+
+    def _recognize_in_pool(self, image_data, reduce, multi, deadline):
+        """Détection et encodage dans le pool, identification ici ; None si l'échéance est dépassée"""
+        pool = self._ensure_pool()
+        try:
+            future = pool.submit(_detect_in_worker, image_data, reduce, multi, deadline)
+        except BaseException:
+            self._slots.release()
+            raise
+        # La place n'est rendue qu'à la fin effective de la tâche : une tâche expirée déjà démarrée occupe encore
+        # un processus du pool (cancel() n'arrête que les tâches en attente)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            detected = future.result(timeout=max(deadline - time.time(), 0))
+        except FutureTimeoutError:
+            future.cancel()
+            return None
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise
+        except Exception as e:
+            return self.face_service.recognition_error(e, multi)
+        if detected is None:
+            return None
+        try:
+            if multi:
+                return self.face_service.match_faces(*detected)
+            return self.face_service.match_face(*detected)
+        except Exception as e:
+            return self.face_service.recognition_error(e, multi)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,117 @@
+import base64
+import numpy as np
+from .detection import decode_frame
+
+# Seuil de reconnaissance plus strict (0.6 par défaut dans face_recognition)
+RECOGNITION_TOLERANCE = 0.4
+
+
+class FaceRecognizer:
+    """Reconnaissance sur une galerie déjà chargée (sans galerie : détection et encodage seuls, processus de travail)"""
+
+    def __init__(self, gallery, detector):
+        self.gallery = gallery
+        self.detector = detector
+
+    def load_frame(self, image_data, reduce=1):
+        """Convertit les données reçues (octets bruts, data URL ou tableau déjà décodé) en image RGB"""
+        if isinstance(image_data, np.ndarray):
+            return image_data
+        if isinstance(image_data, str) and image_data.startswith('data:image/'):
+            # Ancien format des bornes : data URL base64 dans du JSON
+            header, encoded = image_data.split(",", 1)
+            image_data = base64.b64decode(encoded)
+        return decode_frame(image_data, reduce)
+
+    def detect(self, image_data, reduce=1, max_faces=None):
+        """Détection et encodage, la partie coûteuse (exécutable dans un processus sans galerie)"""
+        unknown_image = self.load_frame(image_data, reduce)
+        # Détection sur une copie réduite, encodage pleine résolution des seuls visages retenus
+        return self.detector.detect_and_encode(unknown_image, max_faces=max_faces)
+
+    def recognition_error(self, error, multi=False):
+        result = {
+            'status': 'error',
+            'message': f'Erreur reconnaissance: {str(error)}'
+        }
+        if multi:
+            result['faces'] = []
+        return result
+
+    def recognize_face(self, image_data, reduce=1):
+        """Reconnaît un visage à partir des données d'image"""
+        try:
+            return self.match_face(*self.detect(image_data, reduce, max_faces=1))
+        except Exception as e:
+            return self.recognition_error(e)
+
+    def match_face(self, face_locations, face_encodings):
+        """Identifie le visage détecté dans la galerie"""
+        if len(face_locations) == 0:
+            return {
+                'status': 'error',
+                'message': 'Aucun visage détecté'
+            }
+
+        # Comparaison avec toute la galerie en un seul produit matrice-vecteur
+        candidates = self.gallery.match_top_k(face_encodings[0], k=2)
+        return self.build_match_result(candidates)
+
+    def build_match_result(self, candidates):
+        """Construit le résultat de reconnaissance à partir des meilleurs candidats"""
+        if candidates and candidates[0]['distance'] < RECOGNITION_TOLERANCE:
+            best = candidates[0]
+            metadata = best['metadata']
+            
+            return {
+                'status': 'success',
+                'employee_id': metadata['matricule'],
+                'full_name': f"{metadata['prenom']} {metadata['nom']}",
+                'department': metadata['departement'],
+                'distance': round(best['distance'], 4),
+                'margin': None if best['margin'] is None else round(best['margin'], 4)
+            }
+        return {
+            'status': 'error',
+            'message': 'Visage non reconnu'
+        }
+
+    def recognize_faces(self, image_data, reduce=1, max_faces=None):
+        """Reconnaît tous les visages d'une image (encodage groupé, comparaison matricielle)"""
+        try:
+            return self.match_faces(*self.detect(image_data, reduce, max_faces=max_faces))
+        except Exception as e:
+            return self.recognition_error(e, multi=True)
+
+    def match_faces(self, face_locations, face_encodings):
+        """Identifie tous les visages détectés, un seul visage retenu par agent"""
+        if len(face_locations) == 0:
+            return {
+                'status': 'error',
+                'message': 'Aucun visage détecté',
+                'faces': []
+            }
+
+        faces = []
+        seen = set()
+        all_candidates = self.gallery.match_many(face_encodings, k=2)
+        # Les meilleures correspondances d'abord, pour ne garder qu'un visage par agent
+        order = sorted(range(len(face_locations)),
+                       key=lambda i: all_candidates[i][0]['distance'] if all_candidates[i] else float('inf'))
+        for i in order:
+            result = self.build_match_result(all_candidates[i])
+            if result['status'] == 'success':
+                if result['employee_id'] in seen:
+                    result = {'status': 'error', 'message': 'Agent déjà détecté dans l\'image'}
+                else:
+                    seen.add(result['employee_id'])
+            result['location'] = [int(v) for v in face_locations[i]]
+            faces.append(result)
+
+        # Ordre de lecture : de gauche à droite
+        faces.sort(key=lambda face: face['location'][3])
+        return {
+            'status': 'success' if seen else 'error',
+            'message': f'{len(seen)} agent(s) reconnu(s) sur {len(faces)} visage(s)',
+            'faces': faces
+        }
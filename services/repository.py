@@ -0,0 +1,759 @@
+import os
+import csv
+import sys
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+from .time_rules import default_departure
+from .write_queue import WriteQueue
+
+DATABASE_PATH = os.environ.get('LIGGEEY_DATABASE', os.path.join('data', 'liggeey.db'))
+
+EMPLOYEE_COLUMNS = ['matricule', 'nom', 'prenom', 'telephone', 'lieu_habitation', 'departement', 'image_path']
+ATTENDANCE_COLUMNS = ['matricule', 'nom_complet', 'departement', 'date', 'heure_arrivee', 'heure_depart', 'signature']
+
+# Colonnes SQL -> en-têtes des fichiers CSV historiques (format d'export et clés JSON attendues par l'interface)
+LEAVE_COLUMNS = {'matricule': 'matricule', 'nom_complet': 'nom complet', 'date_debut': 'date debut', 'date_fin': 'date fin'}
+MISSION_COLUMNS = {'matricule': 'matricule', 'nom_complet': 'nom complet', 'nom_mission': 'nom mission',
+                   'date_debut': 'date debut', 'date_fin': 'date fin', 'departement': 'departement'}
+HOLIDAY_COLUMNS = {'description': 'description', 'date_debut': 'date_debut', 'date_fin': 'date_fin'}
+
+DATASETS = ['employees', 'attendance', 'leaves', 'missions', 'holidays']
+
+# Taille des lots lus au curseur pour les parcours en flux (exports)
+CHUNK_SIZE = 5000
+
+# Événements de pointage conservés pour la reprise d'un flux (les plus anciens sont purgés)
+EVENT_RETENTION = 10000
+
+# Listes paginées : colonnes exposées (SQL -> clé JSON) et colonnes couvertes par la recherche libre ?q=
+LIST_COLUMNS = {
+    'employees': {column: column for column in EMPLOYEE_COLUMNS},
+    'leaves': LEAVE_COLUMNS,
+    'missions': MISSION_COLUMNS,
+    'holidays': HOLIDAY_COLUMNS
+}
+SEARCH_COLUMNS = {
+    'employees': ['matricule', 'nom', 'prenom', 'departement', 'lieu_habitation'],
+    'leaves': ['matricule', 'nom_complet'],
+    'missions': ['matricule', 'nom_complet', 'nom_mission', 'departement'],
+    'holidays': ['description'],
+    'attendance': ['matricule', 'nom_complet', 'departement']
+}
+# Clés de tri du suivi (les statuts et durées sont calculés après lecture de la page)
+TRACKING_SORT_COLUMNS = ['date', 'matricule', 'nom_complet', 'departement', 'heure_arrivee', 'heure_depart']
+
+# Compteurs des agrégats journaliers (par date et département)
+ROLLUP_COUNTERS = ['total', 'present', 'absent', 'late', 'early_departures', 'missing_departures', 'overtime',
+                   'worked_seconds']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS employees (
+    matricule TEXT PRIMARY KEY,
+    nom TEXT, prenom TEXT, telephone TEXT, lieu_habitation TEXT, departement TEXT, image_path TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_employees_departement ON employees(departement);
+
+CREATE TABLE IF NOT EXISTS attendance (
+    matricule TEXT NOT NULL,
+    nom_complet TEXT, departement TEXT,
+    date TEXT NOT NULL,
+    heure_arrivee TEXT NOT NULL,
+    heure_depart TEXT,
+    signature TEXT,
+    PRIMARY KEY (matricule, date)
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(date);
+CREATE INDEX IF NOT EXISTS idx_attendance_departement ON attendance(departement, date);
+
+CREATE TABLE IF NOT EXISTS leaves (
+    id INTEGER PRIMARY KEY,
+    matricule TEXT NOT NULL, nom_complet TEXT,
+    date_debut TEXT NOT NULL, date_fin TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_leaves_matricule ON leaves(matricule, date_debut);
+CREATE INDEX IF NOT EXISTS idx_leaves_dates ON leaves(date_debut, date_fin);
+
+CREATE TABLE IF NOT EXISTS missions (
+    id INTEGER PRIMARY KEY,
+    matricule TEXT NOT NULL, nom_complet TEXT, nom_mission TEXT,
+    date_debut TEXT NOT NULL, date_fin TEXT NOT NULL, departement TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_missions_matricule ON missions(matricule, date_debut);
+CREATE INDEX IF NOT EXISTS idx_missions_dates ON missions(date_debut, date_fin);
+
+CREATE TABLE IF NOT EXISTS holidays (
+    id INTEGER PRIMARY KEY,
+    description TEXT, date_debut TEXT NOT NULL, date_fin TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_holidays_dates ON holidays(date_debut, date_fin);
+
+-- Agrégats journaliers : une ligne par jour calculé (versions des tables dont il dépend), puis une par département
+CREATE TABLE IF NOT EXISTS rollup_days (
+    date TEXT PRIMARY KEY,
+    basis TEXT NOT NULL,
+    is_holiday INTEGER NOT NULL DEFAULT 0,
+    holiday_name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    date TEXT NOT NULL,
+    departement TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0, present INTEGER NOT NULL DEFAULT 0, absent INTEGER NOT NULL DEFAULT 0,
+    late INTEGER NOT NULL DEFAULT 0, early_departures INTEGER NOT NULL DEFAULT 0,
+    missing_departures INTEGER NOT NULL DEFAULT 0, overtime INTEGER NOT NULL DEFAULT 0,
+    worked_seconds INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (date, departement)
+);
+
+-- Flux des pointages (arrivées, sorties, refus) : id croissant jamais réutilisé = identifiant d'événement SSE
+CREATE TABLE IF NOT EXISTS attendance_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    date TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+
+-- Mois de pointages modifiés depuis leur dernière écriture dans l'archive colonnaire (attendance_archive)
+CREATE TABLE IF NOT EXISTS archive_changes (month TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 1);
+
+CREATE TABLE IF NOT EXISTS versions (dataset TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# Compteur de version par jeu de données, incrémenté par la base elle-même à chaque écriture
+VERSION_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS bump_{table}_{event} AFTER {event} ON {table}
+BEGIN
+    UPDATE versions SET version = version + 1 WHERE dataset = '{table}';
+END;
+"""
+
+# Chaque écriture de pointage marque son mois (ancien et nouveau pour une mise à jour) à réécrire dans l'archive
+ARCHIVE_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS archive_attendance_{event} AFTER {event} ON attendance
+BEGIN
+{changes}
+END;
+"""
+ARCHIVE_CHANGE = ("    INSERT INTO archive_changes (month) VALUES (substr({row}.date, 1, 7)) "
+                  "ON CONFLICT(month) DO UPDATE SET version = version + 1;")
+ARCHIVE_TRIGGER_ROWS = {'INSERT': ['NEW'], 'UPDATE': ['OLD', 'NEW'], 'DELETE': ['OLD']}
+
+
+def replay_journal(journal_file):
+    """Lignes de pointage d'un journal mensuel de l'ancien stockage CSV (événements rejoués dans l'ordre) :
+    première arrivée du jour, premier départ validé, corrections d'identité appliquées aux lignes déjà vues"""
+    states = {}
+    with open(journal_file, newline='', encoding='utf-8') as f:
+        for event in csv.DictReader(f):
+            key = (event['date'], event['matricule'])
+            if event['type'] == 'arrivee' and key not in states:
+                states[key] = {
+                    'matricule': event['matricule'],
+                    'nom_complet': event['nom_complet'],
+                    'departement': event['departement'],
+                    'date': event['date'],
+                    'heure_arrivee': event['heure'],
+                    'heure_depart': None,
+                    'signature': event['signature']
+                }
+            elif event['type'] == 'depart' and key in states and states[key]['heure_depart'] is None:
+                states[key]['heure_depart'] = event['heure']
+            elif event['type'] == 'identite':
+                for state in states.values():
+                    if state['matricule'] == event['matricule']:
+                        state['nom_complet'] = event['nom_complet']
+                        state['departement'] = event['departement']
+    return list(states.values())
+
+
+class Repository:
+    """Accès aux données (employés, pointages, congés, missions, jours fériés) dans une base SQLite en mode WAL"""
+
+    def __init__(self, db_path=DATABASE_PATH, data_dir='data', group_commit=True):
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self._local = threading.local()
+        # Transactions validées par ce processus : avis de changement pour les caches en mémoire (CalendarIndex)
+        self.commits = 0
+        # Écritures de l'application : un seul fil, validées par lots (None = transaction dans le thread appelant)
+        self.writes = WriteQueue(self) if group_commit else None
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.create_schema()
+        if self.get_meta('migrated_at') is None:
+            self.migrate_from_csv()
+
+    @property
+    def connection(self):
+        """Une connexion par thread (les connexions SQLite ne se partagent pas entre threads, ni avec un processus
+        fils : après un fork, le fil principal en ouvre une nouvelle)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA busy_timeout=10000')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """Transaction d'écriture directe (schéma, migration, scripts) : verrou pris dès le début, validée ou annulée en bloc"""
+        connection = self.connection
+        if connection.in_transaction:
+            yield connection
+            return
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        self.commits += 1
+
+    def write(self, mutation, *args):
+        """Applique une mutation fonction(connexion, *args) et retourne son résultat une fois validée"""
+        if self.writes is None:
+            with self.transaction() as connection:
+                return mutation(connection, *args)
+        return self.writes.run(mutation, *args)
+
+    def after_commit(self, callback):
+        """Appelle callback() après validation de la mutation en cours (immédiatement hors fil d'écriture)"""
+        if self.writes is None:
+            callback()
+        else:
+            self.writes.after_commit(callback)
+
+    def submit(self, mutation, *args):
+        """Comme write, sans attendre : Future résolu à la validation du lot qui contient la mutation"""
+        if self.writes is None:
+            future = Future()
+            try:
+                future.set_result(self.write(mutation, *args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self.writes.submit(mutation, *args)
+
+    def create_schema(self):
+        with self.transaction() as connection:
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    connection.execute(statement)
+            for dataset in DATASETS:
+                connection.execute('INSERT OR IGNORE INTO versions (dataset, version) VALUES (?, 0)', (dataset,))
+                for event in ('INSERT', 'UPDATE', 'DELETE'):
+                    connection.execute(VERSION_TRIGGER.format(table=dataset, event=event))
+            for event, rows in ARCHIVE_TRIGGER_ROWS.items():
+                connection.execute(ARCHIVE_TRIGGER.format(
+                    event=event, changes='\n'.join(ARCHIVE_CHANGE.format(row=row) for row in rows)))
+            # Pointages antérieurs au suivi des modifications : tous leurs mois sont à écrire dans l'archive
+            if connection.execute("SELECT 1 FROM meta WHERE key = 'archive_changes_since'").fetchone() is None:
+                connection.execute('INSERT OR IGNORE INTO archive_changes (month) '
+                                   'SELECT DISTINCT substr(date, 1, 7) FROM attendance')
+                connection.execute("INSERT INTO meta (key, value) VALUES ('archive_changes_since', ?)",
+                                   (datetime.now().isoformat(timespec='seconds'),))
+
+    def query(self, sql, params=()):
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def query_frame(self, sql, params=(), columns=None):
+        """Résultat d'une requête sous forme de DataFrame (colonnes conservées même sans ligne)"""
+        cursor = self.connection.execute(sql, params)
+        names = [description[0] for description in cursor.description]
+        return pd.DataFrame(cursor.fetchall(), columns=columns or names)
+
+    def search_clause(self, dataset, search, prefix=''):
+        """Recherche libre (sous-chaîne, sans casse) sur les colonnes texte d'une table"""
+        columns = SEARCH_COLUMNS[dataset]
+        return (f"({' OR '.join(f'{prefix}{column} LIKE ?' for column in columns)})",
+                [f'%{search.strip()}%'] * len(columns))
+
+    def order_clause(self, sort, allowed, aliases=None, prefix='', default='rowid'):
+        """Clause ORDER BY d'une liste de clés ('-date' : décroissant) ; rowid en dernier pour un ordre stable"""
+        terms = []
+        for key in sort or []:
+            descending = key.startswith('-')
+            column = key.lstrip('-+')
+            column = (aliases or {}).get(column, column)
+            if column not in allowed:
+                raise ValueError(f'Tri impossible sur {column}')
+            terms.append(f"{prefix}{column}{' DESC' if descending else ''}")
+        return ', '.join(terms + [f'{prefix}{default}'])
+
+    def page(self, sql_from, where, params, order, limit, offset, select):
+        """Nombre total de lignes filtrées et DataFrame de la seule page demandée (LIMIT/OFFSET)"""
+        where = f" WHERE {' AND '.join(where)}" if where else ''
+        total = self.connection.execute(f'SELECT COUNT(*) FROM {sql_from}{where}', params).fetchone()[0]
+        df = self.query_frame(f'SELECT {select} FROM {sql_from}{where} ORDER BY {order} LIMIT ? OFFSET ?',
+                              list(params) + [int(limit), int(offset)])
+        return df, total
+
+    def get_meta(self, key):
+        row = self.connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def version(self, dataset):
+        """Version courante d'un jeu de données (change à chaque écriture, y compris depuis un autre processus)"""
+        row = self.connection.execute('SELECT version FROM versions WHERE dataset = ?', (dataset,)).fetchone()
+        return row[0] if row else 0
+
+    def versions(self, datasets=DATASETS):
+        """Versions de plusieurs jeux de données lues en une requête, dans l'ordre demandé"""
+        rows = self.connection.execute(
+            f"SELECT dataset, version FROM versions WHERE dataset IN ({', '.join('?' * len(datasets))})", list(datasets))
+        found = dict(rows.fetchall())
+        return tuple(found.get(dataset, 0) for dataset in datasets)
+
+    # --- Employés ---
+
+    def get_employees(self, departement=None):
+        sql = f"SELECT {', '.join(EMPLOYEE_COLUMNS)} FROM employees"
+        params = ()
+        if departement:
+            sql += ' WHERE departement = ? COLLATE NOCASE'
+            params = (departement,)
+        return self.query_frame(sql + ' ORDER BY rowid', params, EMPLOYEE_COLUMNS)
+
+    def get_employee(self, matricule):
+        rows = self.query(f"SELECT {', '.join(EMPLOYEE_COLUMNS)} FROM employees WHERE matricule = ?",
+                          (str(matricule).strip(),))
+        return rows[0] if rows else None
+
+    def employee_exists(self, matricule):
+        return self.get_employee(matricule) is not None
+
+    def add_employee(self, employee):
+        self.write(lambda connection: connection.execute(
+            f"INSERT INTO employees ({', '.join(EMPLOYEE_COLUMNS)}) VALUES ({', '.join('?' * len(EMPLOYEE_COLUMNS))})",
+            [employee.get(column, '') for column in EMPLOYEE_COLUMNS]
+        ))
+
+    def update_employee(self, matricule, fields):
+        columns = [column for column in fields if column in EMPLOYEE_COLUMNS and column != 'matricule']
+        self.write(lambda connection: connection.execute(
+            f"UPDATE employees SET {', '.join(f'{column} = ?' for column in columns)} WHERE matricule = ?",
+            [fields[column] for column in columns] + [matricule]
+        ))
+
+    def delete_employee(self, matricule):
+        return self.write(lambda connection: connection.execute(
+            'DELETE FROM employees WHERE matricule = ?', (matricule,)).rowcount)
+
+    def update_identity(self, matricule, full_name, department):
+        """Propage un changement de nom ou de département aux pointages, congés et missions"""
+        def update(connection):
+            connection.execute('UPDATE attendance SET nom_complet = ?, departement = ? WHERE matricule = ?',
+                               (full_name, department, matricule))
+            connection.execute('UPDATE missions SET nom_complet = ?, departement = ? WHERE matricule = ?',
+                               (full_name, department, matricule))
+            connection.execute('UPDATE leaves SET nom_complet = ? WHERE matricule = ?', (full_name, matricule))
+        self.write(update)
+
+    # --- Pointages ---
+
+    def attendance_query(self, start_date=None, end_date=None, matricule=None, departement=None, newest_first=False):
+        """Requête des pointages filtrés par l'index ; une sortie non validée vaut l'arrivée + 1 h comme dans les
+        fichiers mensuels. newest_first : dates décroissantes, ordre d'enregistrement conservé à date égale"""
+        clauses, params = [], []
+        if start_date:
+            clauses.append('date >= ?')
+            params.append(start_date)
+        if end_date:
+            clauses.append('date <= ?')
+            params.append(end_date)
+        if matricule:
+            clauses.append('matricule = ?')
+            params.append(str(matricule))
+        if departement:
+            clauses.append('departement = ? COLLATE NOCASE')
+            params.append(departement)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        return ("SELECT matricule, nom_complet, departement, date, heure_arrivee, "
+                "COALESCE(heure_depart, time(heure_arrivee, '+1 hour')) AS heure_depart, signature "
+                f"FROM attendance{where} ORDER BY {'date DESC, rowid' if newest_first else 'rowid'}", params)
+
+    def get_attendance(self, start_date=None, end_date=None, matricule=None, departement=None):
+        sql, params = self.attendance_query(start_date, end_date, matricule, departement)
+        return self.query_frame(sql, params, ATTENDANCE_COLUMNS)
+
+    def iter_attendance(self, start_date=None, end_date=None, matricule=None, departement=None, newest_first=False,
+                        chunk_size=CHUNK_SIZE):
+        """Pointages par lots de chunk_size lignes lus au curseur : mémoire bornée quelle que soit la plage"""
+        sql, params = self.attendance_query(start_date, end_date, matricule, departement, newest_first)
+        cursor = self.connection.execute(sql, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield pd.DataFrame(rows, columns=ATTENDANCE_COLUMNS)
+        finally:
+            cursor.close()
+
+    def tracking_page(self, start_date=None, end_date=None, matricule=None, departement=None, search=None,
+                      sort=None, limit=50, offset=0):
+        """Page de pointages du suivi : jours fériés et congés de l'employé exclus dans la requête, pour que total et
+        page soient exacts sans lire les autres lignes (par défaut dates décroissantes, ordre d'enregistrement)"""
+        clauses = [
+            'NOT EXISTS (SELECT 1 FROM holidays h WHERE h.date_debut <= a.date AND a.date <= h.date_fin)',
+            'NOT EXISTS (SELECT 1 FROM leaves l WHERE l.matricule = trim(a.matricule) '
+            'AND l.date_debut <= a.date AND a.date <= l.date_fin)'
+        ]
+        params = []
+        for clause, value in (('a.date >= ?', start_date), ('a.date <= ?', end_date),
+                              ('a.matricule = ?', matricule), ('a.departement = ? COLLATE NOCASE', departement)):
+            if value:
+                clauses.append(clause)
+                params.append(str(value))
+        if search:
+            clause, values = self.search_clause('attendance', search, 'a.')
+            clauses.append(clause)
+            params.extend(values)
+        order = self.order_clause(sort or ['-date'], TRACKING_SORT_COLUMNS, prefix='a.')
+        select = ("a.matricule, a.nom_complet, a.departement, a.date, a.heure_arrivee, "
+                  "COALESCE(a.heure_depart, time(a.heure_arrivee, '+1 hour')) AS heure_depart, a.signature")
+        return self.page('attendance a', clauses, params, order, limit, offset, select)
+
+    def get_attendance_record(self, matricule, date):
+        """Pointage brut du jour (heure_depart à None tant que la sortie n'est pas validée)"""
+        rows = self.query(f"SELECT {', '.join(ATTENDANCE_COLUMNS)} FROM attendance WHERE matricule = ? AND date = ?",
+                          (str(matricule), date))
+        return rows[0] if rows else None
+
+    def get_pending_departures(self, date):
+        """Matricules pointés à l'arrivée dont la sortie n'est pas validée (heure_depart brute NULL ou vide)"""
+        return {row['matricule'] for row in self.query(
+            "SELECT matricule FROM attendance WHERE date = ? AND (heure_depart IS NULL OR heure_depart = '')", (date,))}
+
+    def add_arrival(self, matricule, full_name, department, date, time, signature):
+        self.write(lambda connection: connection.execute(
+            'INSERT INTO attendance (matricule, nom_complet, departement, date, heure_arrivee, signature) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (str(matricule), full_name, department, date, time, signature)
+        ))
+
+    def set_departure(self, matricule, date, time):
+        self.write(lambda connection: connection.execute(
+            'UPDATE attendance SET heure_depart = ? WHERE matricule = ? AND date = ?', (time, str(matricule), date)))
+
+    def import_attendance(self, rows):
+        """Insère des pointages (tuples dans l'ordre de ATTENDANCE_COLUMNS) en une transaction ; un pointage déjà
+        présent pour le même matricule et la même date est conservé. Retourne le nombre de lignes insérées"""
+        return self.write(lambda connection: connection.executemany(
+            f"INSERT OR IGNORE INTO attendance ({', '.join(ATTENDANCE_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(ATTENDANCE_COLUMNS))})", rows).rowcount)
+
+    def get_attendance_months(self):
+        """Mois ('YYYY-MM') pour lesquels des pointages existent"""
+        return [row['month'] for row in self.query(
+            "SELECT DISTINCT substr(date, 1, 7) AS month FROM attendance ORDER BY month")]
+
+    def get_attendance_month(self, month):
+        """Pointages bruts d'un mois 'YYYY-MM' (heure_depart à None tant que la sortie n'est pas validée)"""
+        return self.query_frame(f"SELECT {', '.join(ATTENDANCE_COLUMNS)} FROM attendance "
+                                "WHERE date >= ? AND date <= ? ORDER BY rowid", (f'{month}-01', f'{month}-31'),
+                                ATTENDANCE_COLUMNS)
+
+    # --- Archive colonnaire ---
+
+    def get_archive_changes(self):
+        """Mois modifiés depuis leur dernière écriture dans l'archive -> version de leur marque"""
+        return dict(self.connection.execute('SELECT month, version FROM archive_changes').fetchall())
+
+    def clear_archive_change(self, month, version):
+        """Retire la marque d'un mois réécrit, sauf s'il a été modifié depuis la lecture de cette version"""
+        self.write(lambda connection: connection.execute(
+            'DELETE FROM archive_changes WHERE month = ? AND version = ?', (month, version)))
+
+    # --- Congés, missions, jours fériés ---
+
+    def get_periods(self, dataset, start_date=None, end_date=None, matricule=None):
+        """Périodes d'une table qui chevauchent [start_date, end_date] (colonnes au format CSV historique)"""
+        columns = {'leaves': LEAVE_COLUMNS, 'missions': MISSION_COLUMNS, 'holidays': HOLIDAY_COLUMNS}[dataset]
+        clauses, params = [], []
+        if end_date:
+            clauses.append('date_debut <= ?')
+            params.append(end_date)
+        if start_date:
+            clauses.append('date_fin >= ?')
+            params.append(start_date)
+        if matricule:
+            clauses.append('matricule = ?')
+            params.append(str(matricule))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        select = ', '.join(f'{column} AS "{alias}"' for column, alias in columns.items())
+        return self.query_frame(f"SELECT {select} FROM {dataset}{where} ORDER BY id", params, list(columns.values()))
+
+    def list_page(self, dataset, filters=None, search=None, start_date=None, end_date=None, sort=None, limit=50,
+                  offset=0):
+        """Page d'une liste (employés, congés, missions, jours fériés) : filtres exacts par colonne, recherche libre,
+        périodes chevauchant [start_date, end_date], tri ; retourne (DataFrame de la page, total filtré)"""
+        columns = LIST_COLUMNS[dataset]
+        aliases = {alias: column for column, alias in columns.items()}
+        clauses, params = [], []
+        for key, value in (filters or {}).items():
+            column = aliases.get(key, key)
+            if column not in columns:
+                raise ValueError(f'Filtre inconnu: {key}')
+            clauses.append(f'{column} = ? COLLATE NOCASE' if column == 'departement' else f'{column} = ?')
+            params.append(str(value).strip())
+        if search:
+            clause, values = self.search_clause(dataset, search)
+            clauses.append(clause)
+            params.extend(values)
+        if dataset != 'employees':
+            if end_date:
+                clauses.append('date_debut <= ?')
+                params.append(end_date)
+            if start_date:
+                clauses.append('date_fin >= ?')
+                params.append(start_date)
+        order = self.order_clause(sort, columns, aliases)
+        select = ', '.join(f'{column} AS "{alias}"' for column, alias in columns.items())
+        return self.page(dataset, clauses, params, order, limit, offset, select)
+
+    def get_year_periods(self, dataset, year):
+        """Périodes d'une année au sens des fichiers annuels (année de la date de début)"""
+        columns = {'leaves': LEAVE_COLUMNS, 'missions': MISSION_COLUMNS, 'holidays': HOLIDAY_COLUMNS}[dataset]
+        select = ', '.join(f'{column} AS "{alias}"' for column, alias in columns.items())
+        return self.query_frame(f"SELECT {select} FROM {dataset} WHERE date_debut >= ? AND date_debut <= ? ORDER BY id",
+                                (f'{year}-01-01', f'{year}-12-31'), list(columns.values()))
+
+    def find_overlap(self, dataset, matricule, start_date, end_date):
+        """Première période de l'employé qui chevauche [start_date, end_date], None sinon"""
+        rows = self.query(f"SELECT date_debut, date_fin FROM {dataset} "
+                          "WHERE matricule = ? AND date_debut <= ? AND date_fin >= ? ORDER BY date_debut LIMIT 1",
+                          (str(matricule), end_date, start_date))
+        return rows[0] if rows else None
+
+    def add_leave(self, matricule, full_name, start_date, end_date):
+        self.write(lambda connection: connection.execute(
+            'INSERT INTO leaves (matricule, nom_complet, date_debut, date_fin) VALUES (?, ?, ?, ?)',
+            (matricule, full_name, start_date, end_date)))
+
+    def add_mission(self, matricule, full_name, mission_name, start_date, end_date, departement=None):
+        self.write(lambda connection: connection.execute(
+            'INSERT INTO missions (matricule, nom_complet, nom_mission, date_debut, date_fin, departement) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (matricule, full_name, mission_name, start_date, end_date, departement)
+        ))
+
+    def add_holiday(self, description, start_date, end_date):
+        self.write(lambda connection: connection.execute(
+            'INSERT INTO holidays (description, date_debut, date_fin) VALUES (?, ?, ?)',
+            (description, start_date, end_date)))
+
+    def delete_period(self, dataset, matricule, start_date):
+        """Supprime les périodes d'un employé commençant à la date donnée ; retourne le nombre de lignes supprimées"""
+        return self.write(lambda connection: connection.execute(
+            f"DELETE FROM {dataset} WHERE matricule = ? AND date_debut = ?", (matricule, start_date)).rowcount)
+
+    # --- Flux des pointages ---
+
+    def add_event(self, event_type, date, payload):
+        """Enregistre un événement de pointage ; retourne son identifiant"""
+        def add(connection):
+            event_id = connection.execute('INSERT INTO attendance_events (type, date, payload) VALUES (?, ?, ?)',
+                                          (event_type, date, payload)).lastrowid
+            if event_id % 1000 == 0:
+                connection.execute('DELETE FROM attendance_events WHERE id <= ?', (event_id - EVENT_RETENTION,))
+            return event_id
+        return self.write(add)
+
+    def events_after(self, last_id, limit=500):
+        return self.query('SELECT id, type, date, payload FROM attendance_events WHERE id > ? ORDER BY id LIMIT ?',
+                          (last_id, limit))
+
+    def event_bounds(self):
+        """Plus ancien et plus récent identifiants conservés (None, None si aucun événement)"""
+        row = self.connection.execute('SELECT MIN(id), MAX(id) FROM attendance_events').fetchone()
+        return row[0], row[1]
+
+    # --- Agrégats journaliers ---
+
+    def get_rollup_day(self, date):
+        rows = self.query('SELECT date, basis, is_holiday, holiday_name FROM rollup_days WHERE date = ?', (date,))
+        return rows[0] if rows else None
+
+    def replace_rollup_day(self, date, basis, rows, is_holiday=False, holiday_name=None):
+        """Remplace en bloc les agrégats d'une journée"""
+        def replace(connection):
+            connection.execute('DELETE FROM daily_rollups WHERE date = ?', (date,))
+            connection.executemany(
+                f"INSERT INTO daily_rollups (date, departement, {', '.join(ROLLUP_COUNTERS)}) "
+                f"VALUES ({', '.join('?' * (len(ROLLUP_COUNTERS) + 2))})",
+                [[date, row['departement']] + [int(row[counter]) for counter in ROLLUP_COUNTERS] for row in rows]
+            )
+            connection.execute(
+                'INSERT OR REPLACE INTO rollup_days (date, basis, is_holiday, holiday_name) VALUES (?, ?, ?, ?)',
+                (date, basis, int(is_holiday), holiday_name)
+            )
+        self.write(replace)
+
+    def add_to_rollup(self, date, departement, deltas):
+        """Ajoute des écarts aux compteurs d'un département (ligne créée à zéro si besoin)"""
+        counters = [counter for counter in ROLLUP_COUNTERS if deltas.get(counter)]
+        if not counters:
+            return
+        def add(connection):
+            connection.execute('INSERT OR IGNORE INTO daily_rollups (date, departement) VALUES (?, ?)',
+                               (date, departement))
+            connection.execute(
+                f"UPDATE daily_rollups SET {', '.join(f'{counter} = {counter} + ?' for counter in counters)} "
+                "WHERE date = ? AND departement = ?",
+                [int(deltas[counter]) for counter in counters] + [date, departement]
+            )
+        self.write(add)
+
+    def sum_rollups(self, start_date, end_date, departement=None):
+        """Somme des compteurs sur une plage de dates (tous départements ou un seul)"""
+        sql = (f"SELECT {', '.join(f'COALESCE(SUM({counter}), 0) AS {counter}' for counter in ROLLUP_COUNTERS)} "
+               "FROM daily_rollups WHERE date >= ? AND date <= ?")
+        params = [start_date, end_date]
+        if departement:
+            sql += ' AND departement = ?'
+            params.append(departement)
+        return self.query(sql, params)[0]
+
+    def get_rollups(self, start_date, end_date):
+        return self.query_frame(
+            f"SELECT date, departement, {', '.join(ROLLUP_COUNTERS)} FROM daily_rollups "
+            "WHERE date >= ? AND date <= ? ORDER BY date, departement",
+            (start_date, end_date), ['date', 'departement'] + ROLLUP_COUNTERS
+        )
+
+    # --- Migration et export CSV ---
+
+    def migrate_from_csv(self):
+        """Import unique de l'arborescence CSV existante (base, pointages, congés, missions, fériés)"""
+        data_dir = self.data_dir
+        counts = dict.fromkeys(DATASETS, 0)
+        with self.transaction() as connection:
+            db_path = os.path.join(data_dir, 'database.csv')
+            if os.path.exists(db_path):
+                df = pd.read_csv(db_path, dtype=str).fillna('')
+                for employee in df.to_dict('records'):
+                    employee['matricule'] = employee['matricule'].strip()
+                    counts['employees'] += connection.execute(
+                        f"INSERT OR IGNORE INTO employees ({', '.join(EMPLOYEE_COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * len(EMPLOYEE_COLUMNS))})",
+                        [employee.get(column, '') for column in EMPLOYEE_COLUMNS]
+                    ).rowcount
+
+            # Pointages : le journal fait foi pour les mois journalisés, sinon le fichier mensuel
+            rows = []
+            journal_months = set()
+            journal_dir = os.path.join(data_dir, 'JOURNAL')
+            for filename in sorted(os.listdir(journal_dir)) if os.path.exists(journal_dir) else []:
+                if filename.startswith('journal') and filename.endswith('.csv'):
+                    journal_months.add(filename[len('journal'):-len('.csv')])
+                    rows.extend(replay_journal(os.path.join(journal_dir, filename)))
+
+            presents_dir = os.path.join(data_dir, 'PRESENTS')
+            for filename in sorted(os.listdir(presents_dir)) if os.path.exists(presents_dir) else []:
+                if not (filename.startswith('presents') and filename.endswith('.csv')):
+                    continue
+                df = pd.read_csv(os.path.join(presents_dir, filename), dtype=str).fillna('')
+                for row in df.to_dict('records'):
+                    if not row.get('heure_arrivee') or row.get('date', '')[:7] in journal_months:
+                        continue
+                    # Une sortie égale à la valeur par défaut n'a pas été validée
+                    if row.get('heure_depart') == default_departure(row['heure_arrivee']):
+                        row['heure_depart'] = None
+                    rows.append(row)
+
+            for row in rows:
+                values = [row.get(column, '') for column in ATTENDANCE_COLUMNS]
+                values[ATTENDANCE_COLUMNS.index('heure_depart')] = row.get('heure_depart') or None
+                counts['attendance'] += connection.execute(
+                    f"INSERT OR IGNORE INTO attendance ({', '.join(ATTENDANCE_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(ATTENDANCE_COLUMNS))})",
+                    values
+                ).rowcount
+
+            for dataset, folder, prefix, columns in (
+                ('leaves', 'CONGES', 'conges', LEAVE_COLUMNS),
+                ('missions', 'MISSIONS', 'missions', MISSION_COLUMNS),
+                ('holidays', 'FERIERS', 'feriers', HOLIDAY_COLUMNS)
+            ):
+                folder_path = os.path.join(data_dir, folder)
+                for filename in sorted(os.listdir(folder_path)) if os.path.exists(folder_path) else []:
+                    if not (filename.startswith(prefix) and filename.endswith('.csv')):
+                        continue
+                    df = pd.read_csv(os.path.join(folder_path, filename), dtype=str).fillna('')
+                    for row in df.to_dict('records'):
+                        values = [str(row.get(alias, '')).strip() or None for alias in columns.values()]
+                        connection.execute(
+                            f"INSERT INTO {dataset} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                            values
+                        )
+                        counts[dataset] += 1
+
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_at', ?)",
+                               (datetime.now().isoformat(timespec='seconds'),))
+        print(f"Migration CSV -> SQLite: {counts}")
+        return counts
+
+    def write_csv(self, df, path):
+        """Écrit un fichier d'export (fichier temporaire puis renommage atomique)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def export_csv(self, data_dir=None):
+        """Exporte la base dans l'arborescence CSV historique ; retourne la liste des fichiers écrits"""
+        data_dir = data_dir or self.data_dir
+        written = []
+
+        path = os.path.join(data_dir, 'database.csv')
+        self.write_csv(self.get_employees(), path)
+        written.append(path)
+
+        for month in self.get_attendance_months():
+            df = self.get_attendance(f'{month}-01', f'{month}-31')
+            path = os.path.join(data_dir, 'PRESENTS', f"presents{datetime.strptime(month, '%Y-%m').strftime('%B%Y')}.csv")
+            self.write_csv(df, path)
+            written.append(path)
+
+        for dataset, folder, prefix in (('leaves', 'CONGES', 'conges'), ('missions', 'MISSIONS', 'missions'),
+                                        ('holidays', 'FERIERS', 'feriers')):
+            years = [row['year'] for row in self.query(
+                f"SELECT DISTINCT substr(date_debut, 1, 4) AS year FROM {dataset} ORDER BY year")]
+            for year in years:
+                path = os.path.join(data_dir, folder, f'{prefix}{year}.csv')
+                self.write_csv(self.get_year_periods(dataset, year), path)
+                written.append(path)
+        return written
+
+
+def main(argv):
+    """python -m services.repository [migrate|export] [dossier]"""
+    command = argv[1] if len(argv) > 1 else 'export'
+    repository = Repository()
+    if command == 'migrate':
+        # Réimport complet depuis les CSV (remplace le contenu de la base)
+        with repository.transaction() as connection:
+            for dataset in DATASETS:
+                connection.execute(f'DELETE FROM {dataset}')
+        repository.migrate_from_csv()
+    elif command == 'export':
+        for path in repository.export_csv(argv[2] if len(argv) > 2 else None):
+            print(path)
+    else:
+        print(main.__doc__)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
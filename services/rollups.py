@@ -0,0 +1,278 @@
+import os
+import sys
+import calendar
+import threading
+from datetime import datetime, date as date_type, timedelta
+import numpy as np
+import pandas as pd
+from .repository import ROLLUP_COUNTERS
+from .time_rules import parse_seconds
+
+REPORTS_DIR = os.path.join('data', 'RAPPORTS')
+# Délai (secondes) entre un pointage et la réécriture du fichier RAPPORTS de son mois : une rafale de pointages
+# ne réécrit le fichier qu'une fois
+REPORT_DELAY = 5
+
+# Tables dont dépend l'effectif et la couverture d'une journée ; les pointages sont suivis par écarts
+BASIS_DATASETS = ['employees', 'leaves', 'missions', 'holidays']
+
+
+def default_departure_seconds(arrival):
+    """Sortie par défaut (arrivée + 1 h) en secondes"""
+    return (arrival + 3600) % 86400
+
+
+def is_weekend(day):
+    """Samedi ou dimanche ('YYYY-MM-DD')"""
+    return date_type.fromisoformat(day).weekday() >= 5
+
+
+class AttendanceRollups:
+    """Compteurs journaliers par département : tenus à jour à chaque pointage, relus en O(1) par les rapports"""
+
+    def __init__(self, repository, snapshot, rules, reports_dir=REPORTS_DIR, report_delay=REPORT_DELAY):
+        self.repository = repository
+        # Fournisseur de DaySnapshot (AttendanceService.get_day_snapshot)
+        self.snapshot = snapshot
+        self.rules = rules
+        # Chemin absolu : la réécriture différée ne dépend pas du dossier courant au moment où elle s'exécute
+        self.reports_dir = os.path.abspath(reports_dir)
+        self.report_delay = report_delay
+        # Journées pointées depuis la dernière réécriture des fichiers RAPPORTS
+        self._report_lock = threading.Lock()
+        self._report_dates = set()
+        self._report_timer = None
+
+    def basis(self):
+        """Versions des tables et des règles horaires sur lesquelles repose un agrégat"""
+        self.rules.refresh()
+        return ':'.join([str(version) for version in self.repository.versions(BASIS_DATASETS)] + [self.rules.version])
+
+    def counters(self, arrival, departure, validated, departements):
+        """Compteurs par pointage (secondes, NaN si illisible) selon les règles horaires du département.
+
+        departure est la sortie retenue (par défaut l'arrivée + 1 h) ; validated indique si elle a été pointée : une
+        sortie par défaut compte dans les heures et les départs anticipés, mais reste une sortie manquante.
+        """
+        arrival = np.asarray(arrival, dtype=float)
+        result = self.rules.evaluate(arrival, departure, departements)
+        return {
+            'late': result['late'].astype(np.int64),
+            'early_departures': result['early'].astype(np.int64),
+            'missing_departures': (~np.isnan(arrival) & ~np.asarray(validated, dtype=bool)).astype(np.int64),
+            'overtime': result['overtime'].astype(np.int64),
+            'worked_seconds': result['duration']
+        }
+
+    def is_current(self, date):
+        day = self.repository.get_rollup_day(date)
+        return day is not None and day['basis'] == self.basis()
+
+    def compute_day(self, date):
+        """Agrégats d'une journée recalculés depuis ses pointages et son effectif (une ligne par département)"""
+        snapshot = self.snapshot(date)
+        if snapshot.is_holiday:
+            return [], snapshot
+        employees = snapshot.employees
+        attendance = snapshot.attendance
+
+        # Côté pointages : retards, sorties, heures, rattachés au département du pointage
+        departments = attendance['departement'].fillna('').astype(str).to_numpy()
+        counters = pd.DataFrame(self.counters(attendance['arrival_seconds'], attendance['departure_seconds'],
+                                              attendance['departure_validated'], departments))
+        counters['departement'] = departments
+        by_attendance = counters.groupby('departement').sum()
+
+        # Côté effectif : présents et absents d'un département d'après ses propres pointages, hors congés et missions
+        arrived = attendance[~np.isnan(attendance['arrival_seconds'].to_numpy(dtype=float))]
+        arrived_keys = pd.MultiIndex.from_arrays([arrived['matricule'].astype(str),
+                                                  arrived['departement'].fillna('').astype(str)])
+        departments = employees['departement'].fillna('').astype(str)
+        has_arrived = pd.MultiIndex.from_arrays([employees['matricule'].astype(str), departments]).isin(arrived_keys)
+        on_leave, on_mission = snapshot.coverage(employees)
+        roster = pd.DataFrame({
+            'departement': departments.to_numpy(),
+            'total': 1,
+            'present': (~(on_leave & on_mission) & has_arrived).astype(np.int64),
+            'absent': (~on_leave & ~on_mission & ~has_arrived).astype(np.int64)
+        })
+        by_roster = roster.groupby('departement').sum()
+
+        rows = by_roster.join(by_attendance, how='outer').fillna(0).astype(np.int64)
+        rows = rows.reindex(columns=ROLLUP_COUNTERS, fill_value=0).reset_index()
+        return rows.to_dict('records'), snapshot
+
+    def rebuild_day(self, date, force=True):
+        """Recalcule une journée dans une seule mutation du fil d'écriture : aucun pointage ne peut être validé entre
+        la lecture des pointages et l'écriture des compteurs (son écart serait perdu). force=False : seulement si la
+        journée n'est pas déjà à jour (un autre appel a pu la recalculer pendant l'attente)"""
+        def rebuild(connection):
+            basis = self.basis()
+            day = self.repository.get_rollup_day(date)
+            if force or day is None or day['basis'] != basis:
+                rows, snapshot = self.compute_day(date)
+                self.repository.replace_rollup_day(date, basis, rows, snapshot.is_holiday, snapshot.holiday_name)
+                day = self.repository.get_rollup_day(date)
+            return day
+        return self.repository.write(rebuild)
+
+    def ensure_day(self, date):
+        """Agrégats d'une journée, recalculés seulement si l'effectif, les congés, missions ou fériés ont changé"""
+        day = self.repository.get_rollup_day(date)
+        if day is None or day['basis'] != self.basis():
+            day = self.rebuild_day(date, force=False)
+        return day
+
+    # --- Mise à jour incrémentale (dans la mutation du pointage, fil d'écriture) ---
+
+    def record_arrival(self, matricule, departement, date, arrival):
+        """Une arrivée : présent, retard éventuel, sortie par défaut comptée dans les heures mais manquante"""
+        self.repository.after_commit(lambda: self.schedule_report(date))
+        if not self.is_current(date):
+            return  # journée recalculée entièrement à la prochaine lecture
+        arrival_seconds = parse_seconds([arrival])
+        deltas = {key: int(value[0]) for key, value in
+                  self.counters(arrival_seconds, default_departure_seconds(arrival_seconds), [False],
+                                [departement]).items()}
+        employee = self.repository.get_employee(matricule)
+        if employee is not None and (employee['departement'] or '') == (departement or ''):
+            deltas['present'] = 1
+            deltas['absent'] = -1
+        self.repository.add_to_rollup(date, departement or '', deltas)
+
+    def record_departure(self, departement, date, arrival, departure):
+        """Une sortie validée remplace la sortie par défaut"""
+        self.repository.after_commit(lambda: self.schedule_report(date))
+        if not self.is_current(date):
+            return
+        arrival_seconds = parse_seconds([arrival])
+        before = self.counters(arrival_seconds, default_departure_seconds(arrival_seconds), [False], [departement])
+        after = self.counters(arrival_seconds, parse_seconds([departure]), [True], [departement])
+        self.repository.add_to_rollup(date, departement or '',
+                                      {key: int(after[key][0] - before[key][0]) for key in after})
+
+    # --- Lecture ---
+
+    def summary(self, totals):
+        return {
+            'total_employees': int(totals['total']),
+            'present_today': int(totals['present']),
+            'absent_today': int(totals['absent']),
+            'late_arrivals': int(totals['late']),
+            'early_departures': int(totals['early_departures']),
+            'missing_departures': int(totals['missing_departures']),
+            'overtime': int(totals['overtime']),
+            'total_hours': round(totals['worked_seconds'] / 3600, 2)
+        }
+
+    def report(self, date, departement=None):
+        """Rapport du jour (tous départements ou un seul) lu dans les agrégats"""
+        day = self.ensure_day(date)
+        if day['is_holiday']:
+            return {
+                'status': 'holiday',
+                'message': f"Aucun rapport généré - {day['holiday_name']}",
+                'is_holiday': True
+            }
+        return self.summary(self.repository.sum_rollups(date, date, departement))
+
+    def month_days(self, month):
+        year, month_number = (int(part) for part in month.split('-'))
+        return [date_type(year, month_number, day).isoformat()
+                for day in range(1, calendar.monthrange(year, month_number)[1] + 1)]
+
+    def monthly_report(self, month, departement=None):
+        """Cumul du mois ('YYYY-MM') jusqu'à aujourd'hui : journées-employés présentes, absentes, retards, heures...
+        Jours ouvrés : hors week-ends et jours fériés ; personne n'est compté absent un samedi ou un dimanche"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        days = [day for day in self.month_days(month) if day <= today]
+        holidays = {day for day in days if self.ensure_day(day)['is_holiday']}
+        working_days = sum(day not in holidays and not is_weekend(day) for day in days)
+        rows = self.repository.get_rollups(f'{month}-01', f'{month}-31')
+        if departement:
+            rows = rows[rows['departement'] == departement]
+        totals = rows[ROLLUP_COUNTERS].sum()
+        totals['absent'] = rows['absent'][~rows['date'].map(is_weekend).to_numpy(dtype=bool)].sum()
+        summary = self.summary(totals)
+        return {
+            'month': month,
+            'days': working_days,
+            'present_days': summary['present_today'],
+            'absent_days': summary['absent_today'],
+            **{key: summary[key] for key in ('late_arrivals', 'early_departures', 'missing_departures', 'overtime',
+                                             'total_hours')}
+        }
+
+    # --- Reconstruction et fichiers RAPPORTS ---
+
+    def write_month(self, month):
+        """Écrit data/RAPPORTS/rapports<YYYY-MM>.csv (une ligne par jour et département)"""
+        df = self.repository.get_rollups(f'{month}-01', f'{month}-31')
+        df['heures'] = (df['worked_seconds'] / 3600).round(2)
+        path = os.path.join(self.reports_dir, f'rapports{month}.csv')
+        os.makedirs(self.reports_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        df.drop(columns='worked_seconds').to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        return path
+
+    def schedule_report(self, date):
+        """Réécrit le fichier RAPPORTS du mois d'une journée pointée, au plus tard report_delay secondes après :
+        les pointages arrivés entre-temps sont pris en compte par la même réécriture"""
+        with self._report_lock:
+            self._report_dates.add(date)
+            if self._report_timer is None:
+                self._report_timer = threading.Timer(self.report_delay, self.flush_reports)
+                self._report_timer.daemon = True
+                self._report_timer.start()
+
+    def flush_reports(self):
+        """Met à jour les journées pointées depuis la dernière réécriture et réécrit les fichiers de leurs mois"""
+        with self._report_lock:
+            dates, self._report_dates = sorted(self._report_dates), set()
+            if self._report_timer is not None:
+                self._report_timer.cancel()
+                self._report_timer = None
+        try:
+            for date in dates:
+                self.ensure_day(date)
+            return [self.write_month(month) for month in sorted({date[:7] for date in dates})]
+        except Exception as e:
+            print(f"[ERREUR] Écriture rapports: {str(e)}")
+            return []
+
+    def rebuild(self, start_date=None, end_date=None):
+        """Recalcule tous les jours d'une plage (par défaut du premier pointage à aujourd'hui) et réécrit RAPPORTS"""
+        months = self.repository.get_attendance_months()
+        start = datetime.strptime(start_date or (f'{months[0]}-01' if months else datetime.now().strftime('%Y-%m-%d')),
+                                  '%Y-%m-%d')
+        end = datetime.strptime(end_date or datetime.now().strftime('%Y-%m-%d'), '%Y-%m-%d')
+        day = start
+        while day <= end:
+            self.rebuild_day(day.strftime('%Y-%m-%d'))
+            day += timedelta(days=1)
+        return [self.write_month(month) for month in
+                sorted({(start + timedelta(days=n)).strftime('%Y-%m') for n in range((end - start).days + 1)})]
+
+
+def main(argv):
+    """python -m services.rollups [rebuild [debut] [fin]|export YYYY-MM]"""
+    # Import local : AttendanceService crée lui-même ses agrégats (dépendance circulaire au niveau module)
+    from .attendance import AttendanceService
+    command = argv[1] if len(argv) > 1 else 'rebuild'
+    rollups = AttendanceService().rollups
+    if command == 'rebuild':
+        for path in rollups.rebuild(*argv[2:4]):
+            print(path)
+    elif command == 'export' and len(argv) > 2:
+        for day in rollups.month_days(argv[2]):
+            rollups.ensure_day(day)
+        print(rollups.write_month(argv[2]))
+    else:
+        print(main.__doc__)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
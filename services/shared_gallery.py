@@ -0,0 +1,420 @@
+import os
+import json
+import pickle
+import tempfile
+import threading
+from contextlib import contextmanager
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from .gallery import FaceGallery
+
+# En-tête d'un segment : taille des tableaux qui suivent, génération à laquelle l'index a changé pour la dernière fois
+HEADER = np.dtype([('size', '<i8'), ('dim', '<i8'), ('matricule_width', '<i8'), ('blob_size', '<i8'),
+                   ('index_size', '<i8'), ('index_generation', '<i8')])
+
+
+def segment_layout(size, dim, matricule_width, blob_size, index_size):
+    """Position, type et forme de chaque tableau d'un segment (alignés sur 8 octets), et taille totale"""
+    parts = [
+        ('encodings', np.dtype(np.float32), (size, dim)),
+        ('sq_norms', np.dtype(np.float32), (size,)),
+        # Métadonnées : un enregistrement JSON (UTF-8) par ligne, lignes i = blob[offsets[i]:offsets[i + 1]]
+        ('offsets', np.dtype(np.int64), (size + 1,)),
+        ('matricules', np.dtype(f'S{matricule_width}'), (size,)),
+        ('blob', np.dtype(np.uint8), (blob_size,)),
+        # Index de recherche sérialisé (partitions IVF ou graphe HNSW), construit une seule fois par le publieur
+        ('index', np.dtype(np.uint8), (index_size,))
+    ]
+    layout, position = {}, HEADER.itemsize
+    for name, dtype, shape in parts:
+        layout[name] = (position, dtype, shape)
+        position += -(-dtype.itemsize * int(np.prod(shape)) // 8) * 8
+    return layout, position
+
+
+def segment_arrays(buffer, layout, readonly=False):
+    arrays = {}
+    for name, (position, dtype, shape) in layout.items():
+        array = np.ndarray(shape, dtype, buffer=buffer, offset=position)
+        array.flags.writeable = not readonly
+        arrays[name] = array
+    return arrays
+
+
+def gallery_columns(gallery):
+    """Colonnes d'une galerie privée : encodages, normes, matricules, décalages et enregistrements JSON"""
+    records = [json.dumps(metadata, ensure_ascii=False, default=str).encode('utf-8') for metadata in gallery.metadata]
+    offsets = np.zeros(len(records) + 1, dtype=np.int64)
+    np.cumsum([len(record) for record in records], out=offsets[1:])
+    matricules = np.array([str(metadata['matricule']).encode('utf-8') for metadata in gallery.metadata] or [b''],
+                          dtype=bytes)[:len(records)]
+    blob = np.frombuffer(b''.join(records), dtype=np.uint8)
+    return gallery.encodings, gallery.sq_norms, matricules, offsets, blob
+
+
+def appended_columns(columns, encoding, metadata):
+    """Colonnes avec une ligne de plus à la fin (comme FaceGallery.add)"""
+    encodings, sq_norms, matricules, offsets, blob = columns
+    record = np.frombuffer(json.dumps(metadata, ensure_ascii=False, default=str).encode('utf-8'), np.uint8)
+    encoding = np.asarray(encoding, dtype=np.float32).reshape(1, -1)
+    return (np.concatenate([encodings, encoding]),
+            np.concatenate([sq_norms, np.einsum('ij,ij->i', encoding, encoding)]),
+            np.concatenate([matricules, np.array([str(metadata['matricule']).encode('utf-8')])]),
+            np.append(offsets, offsets[-1] + len(record)),
+            np.concatenate([blob, record]))
+
+
+def swap_removed_columns(columns, row):
+    """Colonnes sans la ligne row, la dernière prenant sa place (comme FaceGallery.remove)"""
+    encodings, sq_norms, matricules, offsets, blob = columns
+    last = len(encodings) - 1
+    order = np.arange(last)
+    if row != last:
+        order[row] = last
+        blob = np.concatenate([blob[:offsets[row]], blob[offsets[last]:offsets[last + 1]],
+                               blob[offsets[row + 1]:offsets[last]]])
+    else:
+        blob = blob[:offsets[last]]
+    kept_offsets = np.zeros(last + 1, dtype=np.int64)
+    np.cumsum(np.diff(offsets)[order], out=kept_offsets[1:])
+    return encodings[order], sq_norms[order], matricules[order], kept_offsets, blob
+
+
+class PendingColumns:
+    """Colonnes d'une génération en cours de publication, vues comme une galerie par les index"""
+
+    def __init__(self, columns):
+        self.encodings, self.sq_norms = columns[0], columns[1]
+
+    def __len__(self):
+        return len(self.encodings)
+
+
+def write_segment(name, columns, index_bytes, index_generation):
+    """Crée un segment partagé contenant une génération complète et son index sérialisé"""
+    encodings, sq_norms, matricules, offsets, blob = columns
+    size, dim = encodings.shape
+    width = max(matricules.dtype.itemsize, 1)
+    layout, total = segment_layout(size, dim, width, len(blob), len(index_bytes))
+    shm = SharedMemory(name, create=True, size=total)
+    header = np.ndarray((), HEADER, buffer=shm.buf)
+    header['size'], header['dim'], header['matricule_width'], header['blob_size'] = size, dim, width, len(blob)
+    header['index_size'], header['index_generation'] = len(index_bytes), index_generation
+    arrays = segment_arrays(shm.buf, layout)
+    arrays['encodings'][:] = encodings
+    arrays['sq_norms'][:] = sq_norms
+    arrays['offsets'][:] = offsets
+    arrays['matricules'][:] = matricules
+    arrays['blob'][:] = blob
+    arrays['index'][:] = np.frombuffer(index_bytes, dtype=np.uint8)
+    del header, arrays
+    return shm
+
+
+def unlink_segment(name):
+    """Supprime un segment par son nom (sans erreur s'il n'existe plus)"""
+    try:
+        shm = SharedMemory(name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+class MetadataTable:
+    """Métadonnées d'une génération : décodées à la demande, ligne par ligne (seulement les candidats retenus)"""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return json.loads(self.blob[self.offsets[row]:self.offsets[row + 1]].tobytes())
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+
+class SharedGalleryGeneration(FaceGallery):
+    """Génération de la galerie projetée en lecture seule depuis un segment partagé (aucune copie des encodages).
+
+    L'index de recherche est lu dans le segment, jamais reconstruit : celui de la génération précédente du même
+    processus est repris tel quel si seules des métadonnées ont changé, sinon il est désérialisé.
+    """
+
+    def __init__(self, shm, generation, previous=None, index=None):
+        header = np.ndarray((), HEADER, buffer=shm.buf)
+        layout, _ = segment_layout(int(header['size']), int(header['dim']), int(header['matricule_width']),
+                                   int(header['blob_size']), int(header['index_size']))
+        arrays = segment_arrays(shm.buf, layout, readonly=True)
+        self._shm = shm
+        self.dim = int(header['dim'])
+        self._size = int(header['size'])
+        self._matrix = arrays['encodings']
+        self._sq_norms = arrays['sq_norms']
+        self._offsets = arrays['offsets']
+        self._matricules = arrays['matricules']
+        self._blob = arrays['blob']
+        self._index_blob = arrays['index']
+        self._metadata = MetadataTable(self._offsets, self._blob)
+        self.version = generation
+        self.index_generation = int(header['index_generation'])
+        if index is None:
+            if previous is not None and previous.index_generation == self.index_generation:
+                index = previous.index
+            else:
+                index = self.copy_index()
+        self.index = index
+
+    def copy_index(self):
+        """Copie privée de l'index de cette génération (à modifier pour publier la suivante)"""
+        return pickle.loads(self._index_blob)
+
+    def find(self, matricule):
+        rows = np.flatnonzero(self._matricules == str(matricule).encode('utf-8'))
+        return int(rows[0]) if len(rows) else None
+
+    def columns(self):
+        return self._matrix, self._sq_norms, self._matricules, self._offsets, self._blob
+
+    def __del__(self):
+        # Les tableaux d'abord : le segment ne se ferme pas tant qu'une vue sur sa mémoire existe
+        self._matrix = self._sq_norms = self._offsets = self._matricules = self._blob = None
+        self._index_blob = self._metadata = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass
+
+
+class SharedGallery:
+    """Galerie des visages partagée entre les processus du serveur préforké : une seule copie en mémoire.
+
+    Chaque modification (ajout, mise à jour, retrait, rechargement) publie une nouvelle génération complète dans un
+    nouveau segment, puis incrémente le numéro de génération du segment de contrôle. Chaque processus compare ce
+    numéro à chaque accès et projette la nouvelle génération dès qu'il change : bascule en une fois, les recherches
+    en cours se terminent sur l'ancienne. Les publications sont sérialisées entre processus par un verrou de fichier.
+    Le publieur applique la modification à une copie de l'index courant (FaceGallery.add / remove) et la sérialise
+    dans le segment ; les autres processus la désérialisent sans rien reconstruire.
+    Interface de lecture identique à FaceGallery ; modifications par matricule (les lignes changent d'une génération
+    à l'autre).
+    """
+
+    def __init__(self, gallery, name=None):
+        self.name = name or f'liggeey_gallery_{os.getpid()}'
+        self.index_name = gallery.index.name
+        self._control = SharedMemory(f'{self.name}_ctl', create=True, size=np.dtype(np.int64).itemsize)
+        self._generation = np.ndarray((1,), np.int64, buffer=self._control.buf)
+        self._generation[0] = 0
+        self._lock = threading.Lock()
+        self._lock_path = os.path.join(tempfile.gettempdir(), f'{self.name}.lock')
+        self._lock_file = None
+        self._lock_pid = None
+        self._view = None
+        self.replace(gallery)
+
+    def segment_name(self, generation):
+        return f'{self.name}_{generation}'
+
+    def current(self):
+        """Génération publiée la plus récente (projetée au premier accès qui suit sa publication)"""
+        view = self._view
+        if view is not None and view.version == self._generation[0]:
+            return view
+        with self._lock:
+            return self._latest()
+
+    def _latest(self):
+        for _ in range(100):
+            generation = int(self._generation[0])
+            if generation == 0:
+                return None
+            if self._view is not None and self._view.version == generation:
+                return self._view
+            try:
+                shm = SharedMemory(self.segment_name(generation))
+            except FileNotFoundError:
+                # Génération remplacée entre la lecture de son numéro et sa projection
+                continue
+            self._view = SharedGalleryGeneration(shm, generation, previous=self._view)
+            return self._view
+        raise RuntimeError(f"Galerie partagée {self.name} introuvable")
+
+    @contextmanager
+    def _publication(self):
+        # POSIX : la galerie partagée n'est utilisée qu'avec le serveur préforké (serve.py)
+        import fcntl
+        if self._lock_pid != os.getpid():
+            # Verrou par description de fichier : chaque processus ouvre la sienne
+            self._lock_file = open(self._lock_path, 'a')
+            self._lock_pid = os.getpid()
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield self._latest()
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _publish(self, edit):
+        """Publie une modification ; retourne True si publiée.
+
+        edit(génération courante) retourne None (rien à publier) ou (colonnes, change) : change(index, galerie)
+        applique la modification à une copie de l'index courant, None si l'index ne change pas.
+        """
+        with self._publication() as current:
+            edited = edit(current)
+            if edited is None:
+                return False
+            columns, change = edited
+            generation = int(self._generation[0]) + 1
+            if change is None:
+                self._install(current, generation, columns, current._index_blob, current.index_generation)
+            else:
+                index = current.copy_index()
+                change(index, PendingColumns(columns))
+                self._install(current, generation, columns, pickle.dumps(index, pickle.HIGHEST_PROTOCOL), generation,
+                              index)
+            return True
+
+    def _install(self, current, generation, columns, index_bytes, index_generation, index=None):
+        """Écrit le segment de la génération, la projette, la publie et supprime le segment précédent"""
+        shm = write_segment(self.segment_name(generation), columns, index_bytes, index_generation)
+        self._view = SharedGalleryGeneration(shm, generation, previous=current, index=index)
+        self._generation[0] = generation
+        if current is not None:
+            current._shm.unlink()
+
+    # --- Modifications ---
+
+    def replace(self, gallery):
+        """Publie toute une galerie privée (chargement ou rechargement) avec l'index déjà construit pour elle"""
+        columns = gallery_columns(gallery)
+        index_bytes = pickle.dumps(gallery.index, pickle.HIGHEST_PROTOCOL)
+        with self._publication() as current:
+            generation = int(self._generation[0]) + 1
+            self._install(current, generation, columns, index_bytes, generation)
+
+    def add(self, encoding, metadata):
+        def edit(current):
+            row = len(current)
+            return (appended_columns(current.columns(), encoding, metadata),
+                    lambda index, gallery: index.add(gallery, row))
+        self._publish(edit)
+
+    def discard(self, matricule):
+        """Retire un matricule ; False s'il est absent"""
+        def edit(current):
+            row = current.find(matricule)
+            if row is None:
+                return None
+            last = len(current) - 1
+            return (swap_removed_columns(current.columns(), row),
+                    lambda index, gallery: index.remove(gallery, row, last))
+        return self._publish(edit)
+
+    def upsert(self, encoding, metadata):
+        """Ajoute un matricule ou remplace son encodage et ses métadonnées, en une seule génération (jamais publiée
+        sans lui)"""
+        def edit(current):
+            row = current.find(metadata['matricule'])
+            if row is None:
+                added = len(current)
+                return (appended_columns(current.columns(), encoding, metadata),
+                        lambda index, gallery: index.add(gallery, added))
+            last = len(current) - 1
+            removed = swap_removed_columns(current.columns(), row)
+
+            def change(index, gallery):
+                # Retrait sur les colonnes intermédiaires : un index qui se reconstruit n'y voit pas le nouvel encodage
+                index.remove(PendingColumns(removed), row, last)
+                index.add(gallery, last)
+            return appended_columns(removed, encoding, metadata), change
+        self._publish(edit)
+
+    def update_metadata(self, matricule, metadata):
+        """Remplace les métadonnées d'un matricule ; False s'il est absent"""
+        record = np.frombuffer(json.dumps(metadata, ensure_ascii=False, default=str).encode('utf-8'), np.uint8)
+
+        def edit(current):
+            row = current.find(matricule)
+            if row is None:
+                return None
+            encodings, sq_norms, matricules, offsets, blob = current.columns()
+            start, end = offsets[row], offsets[row + 1]
+            offsets = offsets.copy()
+            offsets[row + 1:] += len(record) - (end - start)
+            matricules = matricules.copy()
+            matricules[row] = str(metadata['matricule']).encode('utf-8')
+            return (encodings, sq_norms, matricules, offsets, np.concatenate([blob[:start], record, blob[end:]])), None
+        return self._publish(edit)
+
+    def close(self, unlink=False):
+        """Libère les segments de ce processus ; unlink=True (processus maître, à l'arrêt) : les supprime"""
+        with self._lock:
+            view, self._view = self._view, None
+            if unlink:
+                # Par son nom : la vue de ce processus peut être en retard sur la dernière publication
+                generation = int(self._generation[0])
+                if generation:
+                    unlink_segment(self.segment_name(generation))
+                self._control.unlink()
+                if os.path.exists(self._lock_path):
+                    os.remove(self._lock_path)
+            del view
+            self._generation = None
+            self._control.close()
+
+    # --- Lecture (génération courante) ---
+
+    def __len__(self):
+        return len(self.current())
+
+    @property
+    def dim(self):
+        return self.current().dim
+
+    @property
+    def version(self):
+        return self.current().version
+
+    @property
+    def index(self):
+        return self.current().index
+
+    @property
+    def encodings(self):
+        return self.current().encodings
+
+    @property
+    def sq_norms(self):
+        return self.current().sq_norms
+
+    @property
+    def metadata(self):
+        return self.current().metadata
+
+    def find(self, matricule):
+        return self.current().find(matricule)
+
+    def distances(self, query):
+        return self.current().distances(query)
+
+    def match_top_k(self, query, k=3):
+        return self.current().match_top_k(query, k)
+
+    def match_many(self, queries, k=2):
+        return self.current().match_many(queries, k)
+
+    def match(self, query, tolerance):
+        return self.current().match(query, tolerance)
+
+    def snapshot(self):
+        return self.current().snapshot()
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+# Règles horaires par défaut (secondes depuis minuit), ajustables par département dans data/regles_horaires.csv
+MAX_ARRIVAL = 8 * 3600 + 15 * 60
+MIN_DEPARTURE = 16 * 3600 + 45 * 60
+EARLY_ARRIVAL = 7 * 3600 + 15 * 60
+LATE_THRESHOLD = 17 * 3600 + 45 * 60
+
+# Même grammaire que strptime('%H:%M:%S') : 1 ou 2 chiffres par champ, rien avant ni après
+TIME_PATTERN = r'^(2[0-3]|[0-1]\d|\d):([0-5]\d|\d):([0-5]\d|\d)$'
+
+
+def default_departure(arrival_time):
+    """Sortie prévue par défaut : une heure après l'arrivée"""
+    return (datetime.strptime(arrival_time, '%H:%M:%S') + timedelta(hours=1)).strftime('%H:%M:%S')
+
+
+@lru_cache(maxsize=1)
+def clock_labels():
+    """Les 86 400 heures 'HH:MM:SS' d'une journée (position = secondes) et leur index de recherche"""
+    labels = np.array([f'{t // 3600:02d}:{t % 3600 // 60:02d}:{t % 60:02d}' for t in range(86400)], dtype=object)
+    # dtype object explicite : un index de chaînes Arrow (pandas 3) reconvertirait les 86 400 libellés à chaque recherche
+    return labels, pd.Index(labels, dtype=object)
+
+
+@lru_cache(maxsize=1)
+def duration_labels():
+    """Les 1 440 durées 'XhYYmin' d'une journée (position = minutes)"""
+    return np.array([f'{m // 60}h{m % 60:02d}min' for m in range(1440)], dtype=object)
+
+
+def parse_seconds(times):
+    """Heures 'HH:MM:SS' -> secondes depuis minuit (NaN pour une valeur vide ou invalide)"""
+    times = pd.Series(times, dtype=object)
+    seconds = clock_labels()[1].get_indexer(times).astype(float)
+    seconds[seconds < 0] = np.nan
+    # Formes non canoniques ('8:5:3') : même grammaire que strptime
+    retry = np.isnan(seconds) & times.notna().to_numpy()
+    if retry.any():
+        parts = times[retry].str.extract(TIME_PATTERN).astype(float)
+        seconds[retry] = (parts[0] * 3600 + parts[1] * 60 + parts[2]).to_numpy()
+    return seconds
+
+
+def parse_stripped_seconds(times, seconds):
+    """Secondes des heures débarrassées de leurs espaces (ancien format_time), seules les valeurs rejetées sont réanalysées"""
+    times = pd.Series(times, dtype=object)
+    retry = np.isnan(seconds) & times.notna().to_numpy()
+    if not retry.any():
+        return seconds
+    seconds = seconds.copy()
+    seconds[retry] = parse_seconds(times[retry].str.strip())
+    return seconds
+
+
+def format_seconds(seconds):
+    """Secondes -> 'HH:MM:SS' (None pour NaN)"""
+    valid = ~np.isnan(seconds)
+    labels = clock_labels()[0][np.where(valid, seconds, 0).astype(np.int64)]
+    labels[~valid] = None
+    return labels
+
+
+def format_durations(start, end):
+    """Durées 'XhYYmin' entre deux colonnes de secondes (passage de minuit compris, '0h00min' si une heure manque)"""
+    valid = ~(np.isnan(start) | np.isnan(end))
+    delta = np.where(valid, end - start, 0)
+    delta = np.where(delta < 0, delta + 86400, delta).astype(np.int64)
+    return duration_labels()[delta // 60]
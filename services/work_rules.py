@@ -0,0 +1,122 @@
+import os
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from .time_rules import MAX_ARRIVAL, MIN_DEPARTURE, EARLY_ARRIVAL, LATE_THRESHOLD, parse_seconds
+
+RULES_PATH = os.environ.get('LIGGEEY_WORK_RULES', os.path.join('data', 'regles_horaires.csv'))
+
+# Colonnes du fichier de règles (heures 'HH:MM:SS') ; la ligne de département '*' donne les valeurs par défaut
+RULE_COLUMNS = ['arrivee_max', 'depart_min', 'arrivee_anticipee', 'depart_tardif']
+DEFAULT_THRESHOLDS = [MAX_ARRIVAL, MIN_DEPARTURE, EARLY_ARRIVAL, LATE_THRESHOLD]
+
+# Codes de statut (position dans STATUSES), dans l'ordre de priorité de l'ancien calcul ligne à ligne
+NORMAL, ABSENT, ERROR, MISSING_DEPARTURE, OVERTIME, IRREGULAR, LATE, EARLY = range(8)
+STATUSES = np.array(['normal', 'absent', 'error', 'missing-departure', 'overtime', 'irregular', 'late', 'early'],
+                    dtype=object)
+CSS_CLASSES = np.array([f'{status}-row' for status in STATUSES], dtype=object)
+
+
+class WorkRules:
+    """Règles horaires par département, compilées une fois en tableaux de secondes et appliquées à des colonnes entières"""
+
+    def __init__(self, path=RULES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.compile([])
+
+    def compile(self, rows):
+        """Table des seuils : ligne 0 = valeurs par défaut, puis une ligne par département (nom en minuscules)"""
+        defaults = list(DEFAULT_THRESHOLDS)
+        departments, thresholds = [], []
+        for row in rows:
+            values = parse_seconds([str(row.get(column, '') or '').strip() for column in RULE_COLUMNS])
+            name = str(row.get('departement', '') or '').strip().lower()
+            if name == '*':
+                defaults = [default if np.isnan(value) else int(value) for value, default in zip(values, defaults)]
+            elif name:
+                departments.append(name)
+                thresholds.append(values)
+        table = np.array([defaults] + thresholds, dtype=float)
+        # Seuil non renseigné pour un département : valeur par défaut
+        table = np.where(np.isnan(table), table[0], table).astype(np.int32)
+        self._departments = pd.Index(departments)
+        self._table = table
+        self.version = hashlib.md5(repr((departments, table.tolist())).encode()).hexdigest()[:12]
+
+    def refresh(self):
+        """Recompile si le fichier de règles a changé (un stat par appel)"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            rows = []
+            if mtime is not None:
+                try:
+                    rows = pd.read_csv(self.path, dtype=str).fillna('').to_dict('records')
+                except Exception as e:
+                    print(f"[ERREUR] Lecture des règles horaires: {str(e)}")
+            self.compile(rows)
+            self._mtime = mtime
+
+    def thresholds(self, departements=None, size=1):
+        """Seuils (arrivée max, départ min, arrivée anticipée, départ tardif) ligne par ligne, en secondes"""
+        self.refresh()
+        if departements is None:
+            rows = np.zeros(size, dtype=np.int64)
+        else:
+            keys = pd.Index(pd.Series(departements, dtype=object).fillna('').astype(str)).str.strip().str.lower()
+            rows = self._departments.get_indexer(keys) + 1
+        return self._table[rows].T
+
+    def evaluate(self, arrival, departure, departements=None):
+        """Indicateurs d'heures déjà converties en secondes (NaN si absente ou illisible)"""
+        arrival = np.asarray(arrival, dtype=float)
+        departure = np.asarray(departure, dtype=float)
+        max_arrival, min_departure, early_arrival, late_threshold = self.thresholds(departements, len(arrival))
+        valid = ~np.isnan(arrival) & ~np.isnan(departure)
+        late = arrival > max_arrival
+        duration = np.where(valid, departure - arrival, 0)
+        duration = np.where(duration < 0, duration + 86400, duration)
+        # Heures supplémentaires : avant l'arrivée anticipée et après le départ tardif
+        overtime_seconds = np.where(valid, np.maximum(early_arrival - arrival, 0)
+                                    + np.maximum(departure - late_threshold, 0), 0)
+        return {
+            'late': late,
+            'early': departure < min_departure,
+            'overtime': valid & ~late & (departure >= late_threshold),
+            'missing': ~np.isnan(arrival) & np.isnan(departure),
+            'duration': duration.astype(np.int64),
+            'overtime_seconds': overtime_seconds.astype(np.int64)
+        }
+
+    def classify(self, arrivals, departures, departements=None):
+        """Statuts de colonnes d'heures brutes (mêmes règles et priorités que l'ancien calcul), durées et heures sup."""
+        arrivals = pd.Series(arrivals, dtype=object)
+        departures = pd.Series(departures, dtype=object)
+        arrival = parse_seconds(arrivals)
+        departure = parse_seconds(departures)
+        result = self.evaluate(arrival, departure, departements)
+        codes = np.select(
+            [
+                arrivals.isna().to_numpy(),
+                np.isnan(arrival),
+                (departures.isna() | (departures == '')).to_numpy(),
+                np.isnan(departure),
+                result['overtime'],
+                result['late'] & result['early'],
+                result['late'],
+                result['early']
+            ],
+            [ABSENT, ERROR, MISSING_DEPARTURE, ERROR, OVERTIME, IRREGULAR, LATE, EARLY],
+            default=NORMAL
+        )
+        return dict(result, arrival=arrival, departure=departure, codes=codes, status=STATUSES[codes],
+                    css_class=CSS_CLASSES[codes])
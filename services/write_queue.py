@@ -0,0 +1,113 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class WriteQueue:
+    """Fil d'écriture unique : les mutations en attente sont appliquées par lots, un seul COMMIT par lot"""
+
+    def __init__(self, repository, max_batch=256):
+        self.repository = repository
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        # Fonctions à appeler après validation du lot en cours (réservé au fil d'écriture)
+        self._on_commit = []
+
+    def in_writer(self):
+        return threading.current_thread() is self._thread
+
+    def _start(self):
+        """Démarre le fil d'écriture au premier appel (et de nouveau dans un processus fils après fork)"""
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='liggeey-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, mutation, *args):
+        """Met en file une mutation fonction(connexion, *args) ; le Future est résolu une fois son lot validé"""
+        future = Future()
+        if self.in_writer():
+            # Mutation imbriquée dans une autre : elle fait partie de la transaction du lot en cours
+            try:
+                future.set_result(mutation(self.repository.connection, *args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if self._pid != os.getpid():
+            self._start()
+        self._queue.put((future, mutation, args))
+        return future
+
+    def after_commit(self, callback):
+        """Appelle callback() une fois le lot en cours validé (oubliée si la mutation ou le lot est annulé)"""
+        if self.in_writer():
+            self._on_commit.append(callback)
+        else:
+            callback()
+
+    def run(self, mutation, *args):
+        """Applique une mutation et attend son résultat (l'exception de la mutation est relancée chez l'appelant)"""
+        if self.in_writer():
+            return mutation(self.repository.connection, *args)
+        return self.submit(mutation, *args).result()
+
+    def _next_batch(self):
+        """Première mutation en attente, puis toutes celles arrivées entre-temps (sans attente supplémentaire)"""
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        connection = self.repository.connection
+        while True:
+            self._apply(connection, self._next_batch())
+
+    def _apply(self, connection, batch):
+        """Un lot = une transaction ; chaque mutation dans son point de sauvegarde pour échouer seule"""
+        outcomes = []
+        self._on_commit = []
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            for future, mutation, args in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                connection.execute('SAVEPOINT mutation')
+                callbacks = len(self._on_commit)
+                try:
+                    outcomes.append((future, mutation(connection, *args), None))
+                    connection.execute('RELEASE mutation')
+                except Exception as e:
+                    connection.execute('ROLLBACK TO mutation')
+                    connection.execute('RELEASE mutation')
+                    del self._on_commit[callbacks:]
+                    outcomes.append((future, None, e))
+            connection.execute('COMMIT')
+            self.repository.commits += 1
+        except Exception as e:
+            # Échec du lot lui-même (verrou, disque) : aucune mutation n'est validée
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            for future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for callback in self._on_commit:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[ERREUR] Après validation: {str(e)}")
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
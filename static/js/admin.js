@@ -1,6 +1,14 @@
 class AdminManager {
     constructor() {
         this.currentSection = 'employees';
+        this.pageSize = 50;
+        // Réponses GET déjà reçues (URL -> ETag et corps), revalidées par If-None-Match
+        this.responseCache = new Map();
+        // Présences du jour tenues à jour par le flux des pointages (null tant que non chargées)
+        this.liveAttendance = null;
+        this.liveAttendanceDate = null;
+        this.livePresent = null;
+        this.feedEvents = [];
         this.init();
     }
 
@@ -9,6 +17,7 @@ class AdminManager {
         this.initModals();
         this.initEventListeners();
         this.initLeavesEventListeners();
+        this.initLiveFeed();
         this.loadInitialData();
     }
 
@@ -107,7 +116,7 @@ capitalizeFirstLetter(string) {
             
             try {
                 // Vérifier que l'employé existe
-                const response = await fetch('/api/employees');
+                const response = await this.cachedFetch('/api/employees');
                 if (!response.ok) throw new Error('Erreur de récupération des employés');
                 
                 const employees = await response.json();
@@ -198,7 +207,7 @@ capitalizeFirstLetter(string) {
             
             try {
                 // Vérifier que l'employé existe
-                const response = await fetch('/api/employees');
+                const response = await this.cachedFetch('/api/employees');
                 if (!response.ok) throw new Error('Erreur de récupération des employés');
                 
                 const employees = await response.json();
@@ -414,9 +423,9 @@ updateForm.addEventListener('submit', async (e) => {
 
     async openUpdateModal(matricule) {
     try {
-        const response = await fetch(`/api/employees`, { credentials: 'same-origin' });
-        const employees = await response.json();
-        const employee = employees.find(emp => emp.matricule === matricule);
+        const response = await this.cachedFetch(`/api/employees?matricule=${encodeURIComponent(matricule)}&limit=1`, { credentials: 'same-origin' });
+        const page = await response.json();
+        const employee = (page.items || []).find(emp => emp.matricule === matricule);
         
         if (!employee) {
             throw new Error('Employé non trouvé');
@@ -495,10 +504,18 @@ updateForm.addEventListener('submit', async (e) => {
                 await this.loadEmployees();
                 break;
             case 'present':
-                await this.loadPresentEmployees();
+                if (this.isLive() && this.livePresent) {
+                    this.renderPresentEmployees(this.livePresent);
+                } else {
+                    await this.loadPresentEmployees();
+                }
                 break;
             case 'attendance':
-                await this.loadAttendance();
+                if (this.isLive() && this.liveAttendanceDate === this.today()) {
+                    this.renderAttendance(this.liveAttendance);
+                } else {
+                    await this.loadAttendance();
+                }
                 break;
             case 'absence':
                 await this.loadAbsentEmployees();
@@ -521,7 +538,7 @@ updateForm.addEventListener('submit', async (e) => {
         }
     }
 
-    async loadMissions() {
+    async loadMissions(offset = 0) {
     try {
         const tbody = document.querySelector('#missionsTable tbody');
         tbody.innerHTML = '<tr><td colspan="6" class="loading"><i class="fas fa-spinner fa-spin"></i> Chargement...</td></tr>';
@@ -529,16 +546,12 @@ updateForm.addEventListener('submit', async (e) => {
         const matricule = document.getElementById('missionSearch').value;
         const month = document.getElementById('missionMonthSearch').value;
         
-        let url = '/api/missions';
-        const params = new URLSearchParams();
+        const params = new URLSearchParams({ limit: this.pageSize, offset });
         if (matricule) params.append('matricule', matricule);
         if (month) params.append('month', month);
-        
-        if (params.toString()) {
-            url += `?${params.toString()}`;
-        }
+        const url = `/api/missions?${params.toString()}`;
 
-        const response = await fetch(url, { 
+        const response = await this.cachedFetch(url, { 
             credentials: 'same-origin',
             headers: {
                 'Content-Type': 'application/json',
@@ -550,14 +563,15 @@ updateForm.addEventListener('submit', async (e) => {
             throw new Error(`Erreur HTTP: ${response.status}`);
         }
         
-        const missions = await response.json();
+        const page = await response.json();
         
         // Vérifier que la réponse est bien un tableau
-        if (!Array.isArray(missions)) {
+        if (!Array.isArray(page.items)) {
             throw new Error('Format de données invalide');
         }
 
-        this.renderMissions(missions);
+        this.renderMissions(page.items);
+        this.renderPager('missionsTable', page, (next) => this.loadMissions(next));
     } catch (error) {
         console.error('Erreur chargement missions:', error);
         document.querySelector('#missionsTable tbody').innerHTML = `
@@ -659,19 +673,20 @@ updateForm.addEventListener('submit', async (e) => {
         }
     }
 
-    async loadEmployees() {
+    async loadEmployees(offset = 0) {
         try {
             const employeesGrid = document.getElementById('employeesGrid');
             employeesGrid.innerHTML = '<div class="loading"><i class="fas fa-spinner fa-spin"></i> Chargement...</div>';
 
-            const response = await fetch('/api/employees', { credentials: 'same-origin' });
-            const employees = await response.json();
+            const response = await this.cachedFetch(`/api/employees?limit=${this.pageSize}&offset=${offset}`, { credentials: 'same-origin' });
+            const page = await response.json();
 
-            if (!Array.isArray(employees)) {
+            if (!Array.isArray(page.items)) {
                 throw new Error('Les données reçues ne sont pas un tableau');
             }
 
-            this.renderEmployees(employees);
+            this.renderEmployees(page.items);
+            this.renderPager('employeesGrid', page, (next) => this.loadEmployees(next));
         } catch (error) {
             console.error('Erreur chargement employés:', error);
             document.getElementById('employeesGrid').innerHTML = `
@@ -743,14 +758,16 @@ updateForm.addEventListener('submit', async (e) => {
             const presentGrid = document.getElementById('presentEmployeesGrid');
             presentGrid.innerHTML = '<div class="loading"><i class="fas fa-spinner fa-spin"></i> Chargement...</div>';
 
-            const response = await fetch('/api/present-employees', { credentials: 'same-origin' });
+            const response = await this.cachedFetch('/api/present-employees', { credentials: 'same-origin' });
             const presentEmployees = await response.json();
 
             if (!Array.isArray(presentEmployees)) {
                 throw new Error('Les données reçues ne sont pas un tableau');
             }
 
-            this.renderPresentEmployees(presentEmployees);
+            this.livePresent = presentEmployees.some(employee => employee.is_holiday) ? null : presentEmployees;
+            this.replayFeedEvents();
+            this.renderPresentEmployees(this.livePresent || presentEmployees);
         } catch (error) {
             console.error('Erreur chargement présents:', error);
             document.getElementById('presentEmployeesGrid').innerHTML = `
@@ -792,7 +809,7 @@ updateForm.addEventListener('submit', async (e) => {
             const date = dateEl ? dateEl.value : new Date().toISOString().split('T')[0];
             const department = document.getElementById('absenceDepartment')?.value || '';
             
-            const response = await fetch(`/api/absent-employees?date=${date}&department=${department}`, {
+            const response = await this.cachedFetch(`/api/absent-employees?date=${date}&department=${department}`, {
                 credentials: 'same-origin'
             });
             
@@ -877,14 +894,17 @@ updateForm.addEventListener('submit', async (e) => {
         try {
             if (!date) date = new Date().toISOString().split('T')[0];
             
-            const response = await fetch(`/api/attendance?date=${date}`, { credentials: 'same-origin' });
+            const response = await this.cachedFetch(`/api/attendance?date=${date}`, { credentials: 'same-origin' });
             const attendance = await response.json();
 
             if (!Array.isArray(attendance)) {
                 throw new Error('Les données reçues ne sont pas un tableau');
             }
 
-            this.renderAttendance(attendance);
+            this.liveAttendance = attendance;
+            this.liveAttendanceDate = date;
+            this.replayFeedEvents();
+            this.renderAttendance(this.liveAttendance);
         } catch (error) {
             console.error('Erreur chargement présences:', error);
             document.querySelector('#attendanceTable tbody').innerHTML = `
@@ -928,7 +948,7 @@ updateForm.addEventListener('submit', async (e) => {
         }).join('');
     }
 
-    async loadEmployeeTracking() {
+    async loadEmployeeTracking(offset = 0) {
         try {
             const tbody = document.querySelector('#trackingTable tbody');
             tbody.innerHTML = '<tr><td colspan="9" class="loading"><i class="fas fa-spinner fa-spin"></i> Chargement...</td></tr>';
@@ -937,7 +957,9 @@ updateForm.addEventListener('submit', async (e) => {
             const departement = document.getElementById('departmentSearch').value;
             const month = document.getElementById('monthSearch').value;
             
-            const response = await fetch(`/api/employee-tracking?matricule=${matricule}&departement=${departement}&month=${month}`, { 
+            const params = new URLSearchParams({ matricule, departement, limit: this.pageSize, offset });
+            if (month) params.append('month', month);
+            const response = await this.cachedFetch(`/api/employee-tracking?${params.toString()}`, { 
                 credentials: 'same-origin' 
             });
             
@@ -945,13 +967,14 @@ updateForm.addEventListener('submit', async (e) => {
                 throw new Error(`Erreur HTTP: ${response.status}`);
             }
             
-            const trackingData = await response.json();
+            const page = await response.json();
             
-            if (!Array.isArray(trackingData)) {
+            if (!Array.isArray(page.items)) {
                 throw new Error('Les données reçues ne sont pas un tableau');
             }
 
-            this.renderEmployeeTracking(trackingData);
+            this.renderEmployeeTracking(page.items);
+            this.renderPager('trackingTable', page, (next) => this.loadEmployeeTracking(next));
         } catch (error) {
             console.error('Erreur chargement suivi:', error);
             document.querySelector('#trackingTable tbody').innerHTML = `
@@ -1047,7 +1070,7 @@ updateForm.addEventListener('submit', async (e) => {
             const tbody = document.querySelector('#holidaysTable tbody');
             tbody.innerHTML = '<tr><td colspan="4" class="loading"><i class="fas fa-spinner fa-spin"></i> Chargement...</td></tr>';
 
-            const response = await fetch('/api/holidays', { credentials: 'same-origin' });
+            const response = await this.cachedFetch('/api/holidays', { credentials: 'same-origin' });
             const holidays = await response.json();
 
             if (!Array.isArray(holidays)) {
@@ -1106,7 +1129,7 @@ updateForm.addEventListener('submit', async (e) => {
         });
     }
 
-    async loadLeaves() {
+    async loadLeaves(offset = 0) {
         try {
             const tbody = document.querySelector('#leavesTable tbody');
             tbody.innerHTML = '<tr><td colspan="5" class="loading"><i class="fas fa-spinner fa-spin"></i> Chargement...</td></tr>';
@@ -1114,24 +1137,21 @@ updateForm.addEventListener('submit', async (e) => {
             const matricule = document.getElementById('leaveSearch').value;
             const month = document.getElementById('leaveMonthSearch').value;
             
-            let url = '/api/leaves';
-            const params = new URLSearchParams();
+            const params = new URLSearchParams({ limit: this.pageSize, offset });
             if (matricule) params.append('matricule', matricule);
             if (month) params.append('month', month);
-            
-            if (params.toString()) {
-                url += `?${params.toString()}`;
-            }
+            const url = `/api/leaves?${params.toString()}`;
 
-            const response = await fetch(url, { credentials: 'same-origin' });
+            const response = await this.cachedFetch(url, { credentials: 'same-origin' });
             if (!response.ok) throw new Error(`Erreur HTTP: ${response.status}`);
             
-            const leaves = await response.json();
-            if (!Array.isArray(leaves)) {
+            const page = await response.json();
+            if (!Array.isArray(page.items)) {
                 throw new Error('Les données reçues ne sont pas un tableau');
             }
 
-            this.renderLeaves(leaves);
+            this.renderLeaves(page.items);
+            this.renderPager('leavesTable', page, (next) => this.loadLeaves(next));
         } catch (error) {
             console.error('Erreur chargement congés:', error);
             document.querySelector('#leavesTable tbody').innerHTML = `
@@ -1327,6 +1347,116 @@ updateForm.addEventListener('submit', async (e) => {
         }
     }
 
+    // Flux SSE des pointages : arrivées et sorties appliquées localement, sans recharger la journée.
+    // EventSource se reconnecte seul en renvoyant Last-Event-ID, le serveur reprend après le dernier événement reçu.
+    initLiveFeed() {
+        if (!window.EventSource) return;
+        this.feed = new EventSource('/api/attendance/stream');
+        ['arrivee', 'depart'].forEach(type => {
+            this.feed.addEventListener(type, (e) => {
+                const event = JSON.parse(e.data);
+                // Conservés pour être rejoués sur un chargement en cours (réponse éventuellement antérieure)
+                this.feedEvents.push(event);
+                if (this.feedEvents.length > 500) this.feedEvents.shift();
+                this.applyFeedEvent(event, true);
+            });
+        });
+        this.feed.addEventListener('rejet', (e) => {
+            const event = JSON.parse(e.data);
+            console.info(`Pointage refusé (${event.matricule}): ${event.message}`);
+        });
+        // Événements manquants déjà purgés côté serveur : rechargement complet
+        this.feed.addEventListener('reset', () => {
+            this.feedEvents = [];
+            this.loadAttendance(this.liveAttendanceDate);
+            this.loadPresentEmployees();
+        });
+    }
+
+    isLive() {
+        return this.feed && this.feed.readyState === EventSource.OPEN;
+    }
+
+    today() {
+        return new Date().toISOString().split('T')[0];
+    }
+
+    replayFeedEvents() {
+        this.feedEvents.forEach(event => this.applyFeedEvent(event, false));
+    }
+
+    // Idempotent : chaque événement porte la ligne de présence complète de l'agent
+    applyFeedEvent(event, render) {
+        if (!event.record) return;
+
+        if (this.liveAttendance && event.date === this.liveAttendanceDate) {
+            const index = this.liveAttendance.findIndex(record => record.matricule === event.matricule);
+            if (index >= 0) {
+                this.liveAttendance[index] = event.record;
+            } else {
+                this.liveAttendance.push(event.record);
+            }
+            if (render) this.renderAttendance(this.liveAttendance);
+        }
+
+        if (this.livePresent && event.action === 'arrivee' && event.date === this.today()
+                && !this.livePresent.some(employee => employee.matricule === event.matricule)) {
+            this.livePresent.push({
+                matricule: event.matricule,
+                nom_complet: event.record.nom_complet,
+                departement: event.record.departement,
+                heure_arrivee: event.record.heure_arrivee,
+                date: event.date
+            });
+            if (render) this.renderPresentEmployees(this.livePresent);
+        }
+    }
+
+    // Requête GET conditionnelle : le serveur répond 304 si les données n'ont pas changé depuis la dernière réponse
+    async cachedFetch(url, options = {}) {
+        const cached = this.responseCache.get(url);
+        const headers = new Headers(options.headers || {});
+        if (cached) headers.set('If-None-Match', cached.etag);
+        const response = await fetch(url, { credentials: 'same-origin', ...options, headers });
+
+        if (response.status === 304 && cached) {
+            return new Response(cached.body, { status: 200, headers: { 'Content-Type': 'application/json' } });
+        }
+        const etag = response.headers.get('ETag');
+        if (response.ok && etag) {
+            this.responseCache.delete(url);
+            this.responseCache.set(url, { etag, body: await response.clone().text() });
+            if (this.responseCache.size > 100) {
+                this.responseCache.delete(this.responseCache.keys().next().value);
+            }
+        }
+        return response;
+    }
+
+    // Pagination côté serveur : seule la page affichée est demandée, navigation précédente / suivante
+    renderPager(anchorId, page, load) {
+        let pager = document.getElementById(`${anchorId}Pager`);
+        if (!pager) {
+            pager = document.createElement('div');
+            pager.id = `${anchorId}Pager`;
+            pager.className = 'pager';
+            document.getElementById(anchorId).insertAdjacentElement('afterend', pager);
+        }
+        const first = page.total === 0 ? 0 : page.offset + 1;
+        const last = Math.min(page.offset + page.limit, page.total);
+        pager.innerHTML = `
+            <button class="btn btn-secondary pager-prev" ${page.offset === 0 ? 'disabled' : ''}>
+                <i class="fas fa-chevron-left"></i> Précédent
+            </button>
+            <span class="pager-info">${first}–${last} sur ${page.total}</span>
+            <button class="btn btn-secondary pager-next" ${last >= page.total ? 'disabled' : ''}>
+                Suivant <i class="fas fa-chevron-right"></i>
+            </button>
+        `;
+        pager.querySelector('.pager-prev').addEventListener('click', () => load(Math.max(page.offset - page.limit, 0)));
+        pager.querySelector('.pager-next').addEventListener('click', () => load(page.offset + page.limit));
+    }
+
     showMessage(message, type) {
         const oldMessages = document.querySelectorAll('.message-center');
         oldMessages.forEach(msg => msg.remove());
@@ -1359,7 +1489,7 @@ updateForm.addEventListener('submit', async (e) => {
             const date = document.getElementById('reportDate')?.value || new Date().toISOString().split('T')[0];
             const department = document.getElementById('reportDepartment')?.value || '';
             
-            const response = await fetch(`/api/advanced-reports?date=${date}&department=${department}`, {
+            const response = await this.cachedFetch(`/api/advanced-reports?date=${date}&department=${department}`, {
                 credentials: 'same-origin'
             });
             
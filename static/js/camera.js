@@ -15,6 +15,7 @@ class CameraManager {
         this.autoScanInterval = null;
         this.lastCaptureTime = 0;
         this.captureDelay = 3000; // 3 secondes entre les captures
+        this.multiFace = true; // Tous les visages de l'image sont pointés (file d'attente)
         this.isMobile = Utils.isMobile();
         
         this.init();
@@ -163,11 +164,23 @@ class CameraManager {
     
     try {
         this.isCapturing = true;
-        const imageData = this.captureFrame();
+        const imageData = await this.captureFrame();
         if (!imageData) throw new Error('Impossible de capturer l\'image');
 
         const response = await this.sendForRecognition(imageData);
         
+        // Mode multi-visages : un résultat par agent détecté
+        if (Array.isArray(response.results)) {
+            const anySuccess = response.results.some(r => r.status === 'success');
+            const messages = response.results.map(r => r.message).join('<br>');
+            this.showScanMessage(messages || response.message, anySuccess);
+            if (anySuccess) {
+                this.video.classList.add('pulse');
+                setTimeout(() => this.video.classList.remove('pulse'), 1000);
+            }
+            return;
+        }
+        
         // Gestion spéciale pour le cas "déjà complet"
         if (response.action === 'deja_complet') {
             this.showScanMessage(response.message, false);
@@ -183,6 +196,11 @@ class CameraManager {
         }
         
     } catch (error) {
+        // 503 : file de reconnaissance pleine, le prochain scan automatique réessaiera
+        if (error.message.includes('503')) {
+            this.showScanMessage('Serveur occupé, nouvel essai dans quelques secondes...', false);
+            return;
+        }
         this.showScanMessage(
             error.message.includes('déjà complété') ? 
             error.message : 'Erreur de reconnaissance',
@@ -280,7 +298,13 @@ class CameraManager {
             ctx.drawImage(this.video, 0, 0, videoWidth, videoHeight);
             
             // Qualité réduite sur mobile pour performance
-            return this.canvas.toDataURL('image/jpeg', this.isMobile ? 0.6 : 0.8);
+            const quality = this.isMobile ? 0.6 : 0.8;
+            
+            // Envoi binaire (JPEG brut) ; data URL pour les navigateurs sans toBlob
+            if (!this.canvas.toBlob) {
+                return this.canvas.toDataURL('image/jpeg', quality);
+            }
+            return new Promise(resolve => this.canvas.toBlob(resolve, 'image/jpeg', quality));
             
         } catch (error) {
             console.error('Erreur capture frame:', error);
@@ -290,16 +314,30 @@ class CameraManager {
 
     async sendForRecognition(imageData) {
         try {
-            const response = await Utils.apiRequest('/api/detect', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ 
-                    image: imageData,
-                    platform: this.platform 
-                })
-            });
+            let response;
+            if (imageData instanceof Blob) {
+                // Corps binaire : pas d'encodage base64 ni de JSON côté serveur
+                const multi = this.multiFace ? '&multi=1' : '';
+                response = await Utils.apiRequest(`/api/detect?platform=${encodeURIComponent(this.platform)}${multi}`, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'image/jpeg',
+                    },
+                    body: imageData
+                });
+            } else {
+                response = await Utils.apiRequest('/api/detect', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify({ 
+                        image: imageData,
+                        platform: this.platform,
+                        multi: this.multiFace
+                    })
+                });
+            }
             
             if (!response) {
                 throw new Error('Réponse vide du serveur');
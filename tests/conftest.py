@@ -0,0 +1,21 @@
+import pytest
+from services.repository import Repository
+
+
+@pytest.fixture
+def repository(tmp_path, monkeypatch):
+    """Base SQLite vide dans un dossier temporaire, qui sert aussi de dossier courant (data/...)"""
+    monkeypatch.chdir(tmp_path)
+    return Repository(str(tmp_path / 'test.db'), data_dir=str(tmp_path))
+
+
+@pytest.fixture
+def employees(repository):
+    """Ajoute count employés (E000, E001...) répartis entre deux départements"""
+    def add(count, departments=('Informatique', 'Comptabilité')):
+        rows = [(f'E{i:03d}', f'NOM{i}', f'Prenom{i}', '', '', departments[i % len(departments)], '')
+                for i in range(count)]
+        with repository.transaction() as connection:
+            connection.executemany('INSERT INTO employees VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        return rows
+    return add
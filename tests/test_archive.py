@@ -0,0 +1,129 @@
+import os
+from datetime import datetime
+import pandas as pd
+import pytest
+from services.attendance_archive import AttendanceArchive
+from services.repository import Repository, ATTENDANCE_COLUMNS
+
+CURRENT_MONTH = datetime.now().strftime('%Y-%m')
+MONTHS = ['2024-01', '2024-02', '2024-04', CURRENT_MONTH]
+
+
+@pytest.fixture
+def attendance(repository, employees):
+    """Pointages de trois mois clos et du mois en cours, sorties validées ou non, arrivées dans le désordre"""
+    staff = employees(6)
+    rows = []
+    for month in MONTHS:
+        for day in (14, 3, 9):
+            for i, (matricule, nom, prenom, _, _, departement, _) in enumerate(staff):
+                departure = None if (day + i) % 4 == 0 else f'{16 + i % 3:02d}:{10 * i:02d}:00'
+                rows.append((matricule, f'{prenom} {nom}', departement, f'{month}-{day:02d}',
+                             f'08:{5 * i:02d}:00', departure, 'SIG'))
+    with repository.transaction() as connection:
+        connection.executemany(f"INSERT INTO attendance ({', '.join(ATTENDANCE_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               rows)
+    return staff
+
+
+def by_date(df):
+    """Tri stable par date : ordre d'enregistrement conservé à date égale"""
+    return df.sort_values('date', kind='stable').reset_index(drop=True)
+
+
+def assert_same(left, right):
+    # Types des colonnes texte (object ou str) selon la provenance : seules les valeurs sont comparées
+    left, right = left.astype(object), right.astype(object)
+    pd.testing.assert_frame_equal(left.where(left.notna(), None), right.where(right.notna(), None))
+
+
+def test_sync_round_trip(repository, attendance, tmp_path):
+    archive = AttendanceArchive(str(tmp_path / 'ARCHIVE'))
+    assert archive.sync(repository) == sorted(MONTHS)
+    assert repository.get_archive_changes() == {}
+    for month in MONTHS:
+        assert_same(archive.read_month(month), by_date(repository.get_attendance_month(month)))
+        assert archive.manifest[month]['rows'] == 18
+
+    # Export CSV (sortie non validée = arrivée + 1 h) puis import dans une autre base : même contenu
+    other_repository = Repository(str(tmp_path / 'other.db'), data_dir=str(tmp_path / 'other'))
+    other = AttendanceArchive(str(tmp_path / 'OTHER'))
+    paths = []
+    for month in MONTHS:
+        paths.append(str(tmp_path / 'csv' / f'{month}.csv'))
+        archive.export_csv(month, paths[-1])
+    assert other.import_csv(other_repository, paths, default_departure=True) == sorted(MONTHS)
+    assert other_repository.get_archive_changes() == {}
+    for month in MONTHS:
+        assert_same(other.read_month(month), archive.read_month(month))
+        assert_same(other_repository.get_attendance_month(month), by_date(repository.get_attendance_month(month)))
+
+
+def test_import_goes_through_the_database(repository, attendance, tmp_path):
+    archive = AttendanceArchive(str(tmp_path / 'ARCHIVE'))
+    archive.sync(repository)
+    matricule, nom, prenom, _, _, departement, _ = attendance[0]
+    path = tmp_path / 'import.csv'
+    pd.DataFrame([
+        # Déjà pointé ce jour-là : le pointage en base est conservé
+        (matricule, f'{prenom} {nom}', departement, '2024-01-03', '07:00:00', '12:00:00', 'CSV'),
+        # Sortie réelle égale à arrivée + 1 h : validée, conservée sans default_departure
+        (matricule, f'{prenom} {nom}', departement, '2024-01-20', '08:00:00', '09:00:00', 'CSV'),
+        (matricule, f'{prenom} {nom}', departement, '2024-03-05', '08:00:00', None, 'CSV')
+    ], columns=ATTENDANCE_COLUMNS).to_csv(path, index=False)
+    assert archive.import_csv(repository, [str(path)]) == ['2024-01', '2024-03']
+
+    rows = pd.concat([repository.get_attendance_month('2024-01'), repository.get_attendance_month('2024-03')])
+    rows = rows[rows['matricule'] == matricule].set_index('date')
+    assert rows.loc['2024-01-03', 'heure_arrivee'] == '08:00:00'
+    assert rows.loc['2024-01-20', 'heure_depart'] == '09:00:00'
+    assert rows.loc['2024-03-05', 'heure_depart'] is None
+    # Archive et base restent en phase, y compris après une réécriture complète
+    archive.sync(repository, rebuild=True)
+    for month in ('2024-01', '2024-03'):
+        assert_same(archive.read_month(month), by_date(repository.get_attendance_month(month)))
+    assert archive.manifest['2024-01']['rows'] == 19
+
+
+def test_history_reads_closed_months_from_archive(repository, attendance, tmp_path):
+    archive = AttendanceArchive(str(tmp_path / 'ARCHIVE'))
+    archive.sync(repository)
+    segments = archive.segments(repository, '2024-01-01', f'{CURRENT_MONTH}-31')
+    assert [segment for segment in segments if segment[0] == 'archive'] == [
+        ('archive', '2024-01-01', '2024-01-31'), ('archive', '2024-02-01', '2024-02-29'),
+        ('archive', '2024-04-01', '2024-04-30')]
+
+    expected = by_date(repository.get_attendance('2024-01-01', f'{CURRENT_MONTH}-31'))
+    assert_same(archive.history(repository, '2024-01-01', f'{CURRENT_MONTH}-31'), expected)
+    staff = attendance[1]
+    assert_same(archive.history(repository, '2024-02-05', '2024-04-10', departement=staff[5].upper()),
+                by_date(repository.get_attendance('2024-02-05', '2024-04-10', departement=staff[5])))
+    # Un seul employé : lecture indexée dans la base, pas de parcours des partitions
+    assert archive.segments(repository, '2024-01-01', '2024-04-30', staff[0]) == [('base', '2024-01-01', '2024-04-30')]
+    assert_same(archive.history(repository, '2024-02-05', '2024-04-10', staff[0]),
+                by_date(repository.get_attendance('2024-02-05', '2024-04-10', staff[0])))
+
+    # Export du suivi par lots, dates décroissantes : même suite de pointages que la lecture en base
+    frames = list(archive.iter_history(repository, None, None, newest_first=True))
+    assert_same(pd.concat(frames, ignore_index=True),
+                pd.concat(repository.iter_attendance(newest_first=True), ignore_index=True))
+
+
+def test_correction_of_closed_month_is_rewritten_on_next_read(repository, attendance, tmp_path):
+    archive = AttendanceArchive(str(tmp_path / 'ARCHIVE'))
+    archive.sync(repository)
+    matricule = attendance[0][0]
+    repository.set_departure(matricule, '2024-02-09', '18:45:00')
+    repository.add_arrival('E999', 'Nouvel Agent', 'Informatique', f'{CURRENT_MONTH}-02', '08:00:00', 'SIG')
+    assert set(repository.get_archive_changes()) == {'2024-02', CURRENT_MONTH}
+
+    history = archive.history(repository, '2024-02-01', '2024-02-29')
+    history = history[history['matricule'] == matricule]
+    assert history.loc[history['date'] == '2024-02-09', 'heure_depart'].tolist() == ['18:45:00']
+    # Mois clos réécrit à la lecture ; le mois en cours reste lu dans la base
+    assert set(repository.get_archive_changes()) == {CURRENT_MONTH}
+    assert archive.read_month('2024-02').set_index(['matricule', 'date']).loc[(matricule, '2024-02-09'),
+                                                                             'heure_depart'] == '18:45:00'
+    # Un autre processus relit le manifeste réécrit
+    assert AttendanceArchive(archive.root).manifest == archive.manifest
+    assert os.path.exists(archive.partition_path('2024-02'))
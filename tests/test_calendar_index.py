@@ -0,0 +1,49 @@
+from services.calendar_index import CalendarIndex
+
+
+def count_version_reads(repository, monkeypatch):
+    reads = []
+    versions = repository.versions
+
+    def counted(*args, **kwargs):
+        reads.append(args)
+        return versions(*args, **kwargs)
+    monkeypatch.setattr(repository, 'versions', counted)
+    return reads
+
+
+def test_pinned_block_reads_versions_once(repository, monkeypatch):
+    calendar = CalendarIndex(repository)
+    repository.add_leave('E001', 'Prénom NOM', '2024-03-01', '2024-03-10')
+    reads = count_version_reads(repository, monkeypatch)
+    with calendar.pinned():
+        for day in range(1, 29):
+            calendar.leave('E001', f'2024-02-{day:02d}')
+            calendar.is_holiday(f'2024-02-{day:02d}')
+        assert calendar.leave('E001', '2024-03-05') is not None
+    assert len(reads) == 1
+
+    # Écriture validée par ce processus pendant le bloc : vue aussitôt (versions relues une fois)
+    with calendar.pinned():
+        assert calendar.leave('E002', '2024-03-05') is None
+        repository.add_leave('E002', 'Prénom NOM', '2024-03-01', '2024-03-10')
+        assert calendar.leave('E002', '2024-03-05') is not None
+        assert calendar.leave('E001', '2024-03-05') is not None
+    assert len(reads) == 3
+
+
+def test_view_read_in_open_transaction_is_not_cached(repository):
+    calendar = CalendarIndex(repository)
+    assert calendar.leave('E001', '2024-03-05') is None
+    try:
+        with repository.transaction() as connection:
+            connection.execute("INSERT INTO leaves (matricule, nom_complet, date_debut, date_fin) "
+                               "VALUES ('E001', 'Prénom NOM', '2024-03-01', '2024-03-10')")
+            assert calendar.leave('E001', '2024-03-05') is not None
+            raise RuntimeError('annulée')
+    except RuntimeError:
+        pass
+    # Autre écriture validée : la table reprend la version vue dans la transaction annulée
+    repository.add_leave('E003', 'Prénom NOM', '2024-03-01', '2024-03-10')
+    assert calendar.leave('E001', '2024-03-05') is None
+    assert calendar.leave('E003', '2024-03-05') is not None
@@ -0,0 +1,74 @@
+import os
+import importlib
+import pytest
+
+pytest.importorskip('face_recognition')
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    """Application chargée dans un dossier temporaire (base data/liggeey.db et images vides)"""
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('app'))
+    try:
+        module = importlib.import_module('app')
+        module.face_service.wait_loaded(10)
+        yield module
+    finally:
+        os.chdir(previous)
+
+
+@pytest.fixture
+def client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    return client
+
+
+def test_unchanged_data_is_revalidated_without_calling_the_view(app_module, client, monkeypatch):
+    first = client.get('/api/holidays')
+    assert first.status_code == 200 and first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    def not_called(*args, **kwargs):
+        raise AssertionError('vue appelée')
+    monkeypatch.setattr(app_module.repository, 'get_year_periods', not_called)
+    again = client.get('/api/holidays', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304 and again.data == b''
+    assert again.headers['ETag'] == first.headers['ETag']
+    assert again.headers['Cache-Control'] == 'private, no-cache'
+
+
+def test_write_to_a_read_table_changes_the_etag(app_module, client):
+    first = client.get('/api/holidays')
+    # Écriture dans une table que la vue ne lit pas : même version, toujours 304
+    app_module.repository.add_leave('E001', 'Prénom NOM', '2024-03-01', '2024-03-10')
+    assert client.get('/api/holidays', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    year = app_module.datetime.now().year
+    app_module.repository.add_holiday('Fête du test', f'{year}-05-02', f'{year}-05-02')
+    changed = client.get('/api/holidays', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200 and changed.headers['ETag'] != first.headers['ETag']
+    assert [holiday['description'] for holiday in changed.get_json()] == ['Fête du test']
+
+
+def test_etag_depends_on_parameters_and_work_rules(client):
+    first = client.get('/api/attendance?date=2024-03-04')
+    other_day = client.get('/api/attendance?date=2024-03-05')
+    assert first.status_code == other_day.status_code == 200
+    assert first.headers['ETag'] != other_day.headers['ETag']
+
+    os.makedirs('data', exist_ok=True)
+    with open(os.path.join('data', 'regles_horaires.csv'), 'w', encoding='utf-8') as f:
+        f.write('departement,arrivee_max,depart_min,arrivee_anticipee,depart_tardif\n*,08:30:00,,,\n')
+    try:
+        changed = client.get('/api/attendance?date=2024-03-04', headers={'If-None-Match': first.headers['ETag']})
+        assert changed.status_code == 200 and changed.headers['ETag'] != first.headers['ETag']
+    finally:
+        os.remove(os.path.join('data', 'regles_horaires.csv'))
+
+
+def test_anonymous_request_gets_no_etag(app_module):
+    response = app_module.app.test_client().get('/api/holidays')
+    assert response.status_code == 401 and 'ETag' not in response.headers
@@ -0,0 +1,84 @@
+import os
+import threading
+import zlib
+import numpy as np
+import pytest
+
+pytest.importorskip('face_recognition')
+
+from services.encoding_cache import EncodingCache
+from services.face_service import FaceService
+
+
+@pytest.fixture
+def photos(repository, monkeypatch):
+    """Photos factices dans data/images ; encodage déterministe dérivé du nom du fichier"""
+    def encode_file(self, image_path):
+        rng = np.random.default_rng(zlib.crc32(os.path.basename(image_path).encode()))
+        return self.key_for_bytes(image_path.encode()), rng.normal(0, 0.1, 128), True
+    monkeypatch.setattr(EncodingCache, 'encode_file', encode_file)
+    os.makedirs(os.path.join('data', 'images'), exist_ok=True)
+
+    def add(matricule):
+        employee = {'matricule': matricule, 'nom': 'NOM', 'prenom': 'Prénom', 'telephone': '',
+                    'lieu_habitation': '', 'departement': 'Informatique', 'image_path': f'{matricule}.jpg'}
+        with open(os.path.join('data', 'images', employee['image_path']), 'wb') as f:
+            f.write(b'photo')
+        repository.add_employee(employee)
+        return employee
+    return add
+
+
+def test_enrollment_seen_by_the_loader_is_not_duplicated(repository, photos, monkeypatch):
+    """Enrôlement noté pendant le chargement mais déjà présent dans la lecture de la base : une seule ligne"""
+    for i in range(3):
+        photos(f'E{i:03d}')
+    service = FaceService(repository=repository, background=False)
+    get_employees = repository.get_employees
+
+    def enroll_then_read():
+        service.enroll_employee(photos('LATE'))
+        return get_employees()
+    monkeypatch.setattr(repository, 'get_employees', enroll_then_read)
+    service.load_known_faces()
+
+    matricules = [metadata['matricule'] for metadata in service.gallery.metadata]
+    assert sorted(matricules) == ['E000', 'E001', 'E002', 'LATE']
+    progress = service.loading_progress()
+    assert progress['state'] == 'pret' and progress['processed'] == progress['total'] == 4
+    progress['state'] = 'modifié'
+    assert service.loading['state'] == 'pret'
+
+
+def test_searches_never_see_a_half_edited_gallery(repository):
+    """Enrôlements et retraits pendant des recherches concurrentes : un encodage exact n'est jamais rendu avec les
+    métadonnées d'un autre employé"""
+    service = FaceService(repository=repository, background=False)
+    rng = np.random.default_rng(0)
+    faces = {f'E{i:03d}': rng.normal(0, 1, 128).astype(np.float32) for i in range(200)}
+    for matricule, encoding in faces.items():
+        service.gallery.add(encoding, {'matricule': matricule})
+    matricules = list(faces)
+    stop, mismatches = threading.Event(), []
+
+    def search():
+        queries = np.array([faces[m] for m in matricules[:50]])
+        while not stop.is_set():
+            for query, candidates in zip(matricules, service.gallery.match_many(queries, k=1)):
+                if candidates and candidates[0]['distance'] < 1e-3 and candidates[0]['metadata']['matricule'] != query:
+                    mismatches.append((query, candidates[0]['metadata']['matricule']))
+
+    readers = [threading.Thread(target=search) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    try:
+        for step in range(300):
+            matricule = matricules[rng.integers(len(matricules))]
+            service.edit_gallery('discard', matricule)
+            service.edit_gallery('add', faces[matricule], {'matricule': matricule})
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+    assert mismatches == []
+    assert sorted(metadata['matricule'] for metadata in service.gallery.metadata) == matricules
@@ -0,0 +1,191 @@
+import os
+import uuid
+import numpy as np
+import pytest
+from services.face_index import create_index, IVFIndex, HNSWIndex
+from services.gallery import FaceGallery
+from services.shared_gallery import SharedGallery
+
+DIM = 8
+BACKENDS = {
+    'exact': {},
+    # Toutes les partitions parcourues : résultats exacts, seule la tenue des listes est vérifiée
+    'ivf': {'min_train_size': 16, 'nprobe': 64},
+    'hnsw': {}
+}
+
+
+def new_gallery(backend):
+    return FaceGallery(dim=DIM, capacity=4, index=create_index(backend, **BACKENDS[backend]))
+
+
+def metadata(matricule, nom='NOM'):
+    return {'matricule': matricule, 'nom': nom, 'prenom': 'Prénom', 'departement': 'Informatique'}
+
+
+def edits(seed=0, initial=40, steps=60):
+    """Suite d'ajouts, de retraits et de mises à jour : ('add', matricule, encodage) / ('discard', matricule) /
+    ('update', matricule, nom) / ('replace', matricule, encodage), réenrôlement d'un matricule présent"""
+    rng = np.random.default_rng(seed)
+    present, counter = [], 0
+    for step in range(initial + steps):
+        action = 'add' if step < initial or not present else rng.choice(['add', 'discard', 'update', 'replace'])
+        if action == 'add':
+            matricule = f'E{counter:04d}'
+            counter += 1
+            present.append(matricule)
+            yield 'add', matricule, rng.normal(0, 1, DIM).astype(np.float32)
+        else:
+            matricule = present[rng.integers(len(present))]
+            if action == 'discard':
+                present.remove(matricule)
+                yield 'discard', matricule
+            elif action == 'replace':
+                yield 'replace', matricule, rng.normal(0, 1, DIM).astype(np.float32)
+            else:
+                yield 'update', matricule, f'NOM{step}'
+
+
+def apply(gallery, expected, edit):
+    if edit[0] == 'add':
+        gallery.add(edit[2], metadata(edit[1]))
+        expected[edit[1]] = (edit[2], metadata(edit[1]))
+    elif edit[0] == 'discard':
+        assert gallery.discard(edit[1])
+        del expected[edit[1]]
+    elif edit[0] == 'replace':
+        gallery.upsert(edit[2], metadata(edit[1], 'NOUVEAU'))
+        expected[edit[1]] = (edit[2], metadata(edit[1], 'NOUVEAU'))
+    else:
+        assert gallery.update_metadata(edit[1], metadata(edit[1], edit[2]))
+        expected[edit[1]] = (expected[edit[1]][0], metadata(edit[1], edit[2]))
+
+
+def check(gallery, expected):
+    """Encodages, normes, métadonnées et index alignés sur le contenu attendu (matricule -> encodage, métadonnées)"""
+    assert len(gallery) == len(expected) == len(gallery.metadata) == len(gallery.encodings)
+    for matricule, (encoding, meta) in expected.items():
+        row = gallery.find(matricule)
+        assert row is not None
+        assert gallery.metadata[row] == meta
+        np.testing.assert_array_equal(gallery.encodings[row], encoding)
+        assert gallery.sq_norms[row] == pytest.approx(float(encoding @ encoding), rel=1e-5)
+        best = gallery.match_top_k(encoding, k=1)[0]
+        assert best['metadata']['matricule'] == matricule and best['distance'] < 1e-2
+    index = gallery.index
+    if isinstance(index, IVFIndex) and index.centroids is not None:
+        assert sorted(row for members in index.lists for row in members) == list(range(len(gallery)))
+        assert all(row in index.lists[cluster] for row, cluster in enumerate(index.assign))
+    if isinstance(index, HNSWIndex):
+        assert sorted(index.row_node) == list(range(len(gallery)))
+        assert all(index.node_row[node] == row for row, node in index.row_node.items())
+    assert gallery.find('ABSENT') is None
+
+
+@pytest.fixture
+def shared_name():
+    name = f'test_gallery_{os.getpid()}_{uuid.uuid4().hex[:8]}'
+    yield name
+    leftovers = [f for f in os.listdir('/dev/shm') if f.startswith(name)] if os.path.isdir('/dev/shm') else []
+    assert leftovers == []
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_private_gallery_invariants(backend):
+    gallery, expected = new_gallery(backend), {}
+    for edit in edits():
+        apply(gallery, expected, edit)
+        check(gallery, expected)
+    assert not gallery.discard('ABSENT') and not gallery.update_metadata('ABSENT', metadata('ABSENT'))
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_shared_gallery_invariants(backend, shared_name):
+    private, expected = new_gallery(backend), {}
+    sequence = list(edits())
+    for edit in sequence[:20]:
+        apply(private, expected, edit)
+    shared = SharedGallery(private, shared_name)
+    try:
+        check(shared, expected)
+        for edit in sequence[20:]:
+            apply(shared, expected, edit)
+            check(shared, expected)
+        assert not shared.discard('ABSENT') and not shared.update_metadata('ABSENT', metadata('ABSENT'))
+    finally:
+        shared.close(unlink=True)
+
+
+@pytest.mark.parametrize('backend,params', [('exact', {}), ('ivf', {'min_train_size': 16, 'nprobe': 2}),
+                                            ('hnsw', {})])
+def test_match_many_same_as_match_top_k(backend, params):
+    gallery = FaceGallery(dim=DIM, index=create_index(backend, **params))
+    for edit in edits(initial=80, steps=0):
+        gallery.add(edit[2], metadata(edit[1]))
+    rng = np.random.default_rng(1)
+    # Visages différents, puis le même visage bruité (partitions IVF communes : candidats notés ensemble)
+    queries = np.concatenate([rng.normal(0, 1, (12, DIM)),
+                              gallery.encodings[3] + rng.normal(0, 0.05, (12, DIM))]).astype(np.float32)
+    for candidates, query in zip(gallery.match_many(queries, k=2), queries):
+        expected = gallery.match_top_k(query, k=2)
+        assert [c['row'] for c in candidates] == [c['row'] for c in expected]
+        assert [c['distance'] for c in candidates] == pytest.approx([c['distance'] for c in expected], abs=1e-4)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_shared_upsert_is_one_generation(backend, shared_name):
+    """Réenrôlement : une seule génération publiée, où le matricule a déjà son nouvel encodage"""
+    private, expected = new_gallery(backend), {}
+    for edit in edits(initial=40, steps=0):
+        apply(private, expected, edit)
+    shared = SharedGallery(private, shared_name)
+    try:
+        generation = shared.version
+        encoding = np.full(DIM, 3.0, dtype=np.float32)
+        shared.upsert(encoding, metadata('E0005', 'NOUVEAU'))
+        expected['E0005'] = (encoding, metadata('E0005', 'NOUVEAU'))
+        assert shared.version == generation + 1
+        check(shared, expected)
+    finally:
+        shared.close(unlink=True)
+
+
+def test_shared_index_published_not_rebuilt(shared_name, monkeypatch):
+    """Les générations suivantes reprennent l'index publié sans le reconstruire, même en retard de plusieurs
+    générations ; une génération déjà projetée n'est pas modifiée"""
+    private, expected = new_gallery('ivf'), {}
+    sequence = list(edits(initial=40, steps=30))
+    for edit in sequence[:40]:
+        apply(private, expected, edit)
+    shared = SharedGallery(private, shared_name)
+    try:
+        old, old_expected = shared.current(), dict(expected)
+
+        def rebuild(self, gallery):
+            raise AssertionError("index reconstruit")
+        monkeypatch.setattr(IVFIndex, 'rebuild', rebuild)
+        for edit in sequence[40:]:
+            apply(shared, expected, edit)
+        check(shared, expected)
+        check(old, old_expected)
+
+        # Processus de travail en retard : sa vue est remplacée d'un coup par la dernière génération publiée
+        shared._view = old
+        check(shared, expected)
+    finally:
+        shared.close(unlink=True)
+
+
+def test_close_unlinks_latest_generation_published_elsewhere(shared_name):
+    """Le maître supprime la dernière génération même si un autre processus l'a publiée après sa dernière lecture"""
+    shared = SharedGallery(new_gallery('exact'), shared_name)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            shared.add(np.ones(DIM, dtype=np.float32), metadata('E0001'))
+            shared.add(np.zeros(DIM, dtype=np.float32), metadata('E0002'))
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert shared._view.version == 1 and shared._generation[0] == 3
+    shared.close(unlink=True)
@@ -0,0 +1,71 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+
+pytest.importorskip('face_recognition')
+
+from services import recognition_engine
+from services.gallery import FaceGallery
+from services.recognizer import FaceRecognizer
+from services.recognition_engine import RecognitionEngine, EngineBusy, DeadlineExceeded
+
+FRAME = np.zeros((20, 20, 3), dtype=np.uint8)
+
+
+class FixedDetector:
+    """Détecteur factice : un visage dont l'encodage est fixé par le test, après delay secondes"""
+
+    def __init__(self):
+        self.delay = 0.0
+        self.encoding = np.zeros(128, dtype=np.float32)
+
+    def detect_and_encode(self, image, max_faces=None):
+        time.sleep(self.delay)
+        return [(0, 20, 20, 0)], [self.encoding.copy()]
+
+
+def employee(matricule):
+    return {'matricule': matricule, 'nom': 'NOM', 'prenom': 'Prénom', 'departement': 'Informatique'}
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """Moteur à un processus de travail, simulé par un thread (le détecteur factice n'existe pas après spawn)"""
+    detector = FixedDetector()
+    monkeypatch.setattr(recognition_engine, '_worker_recognizer', FaceRecognizer(None, detector))
+    gallery = FaceGallery()
+    gallery.add(np.full(128, 0.5, dtype=np.float32), employee('E001'))
+    engine = RecognitionEngine(FaceRecognizer(gallery, None), workers=1, queue_size=1, deadline_ms=100)
+    engine._pool, engine._pool_pid = ThreadPoolExecutor(1), os.getpid()
+    engine.detector = detector
+    yield engine
+    engine.shutdown()
+
+
+def test_gallery_change_keeps_pool(engine):
+    engine.detector.encoding[:] = 0.5
+    pool = engine._pool
+    assert engine.recognize(FRAME)['employee_id'] == 'E001'
+
+    # Enrôlement : identifié aussitôt par le processus parent, sans recréer le pool
+    engine.face_service.gallery.add(np.full(128, -0.5, dtype=np.float32), employee('E002'))
+    engine.detector.encoding[:] = -0.5
+    assert engine.recognize(FRAME)['employee_id'] == 'E002'
+    assert engine._pool is pool
+
+
+def test_expired_task_keeps_its_slot_until_done(engine):
+    engine.detector.delay = 0.3
+    with pytest.raises(DeadlineExceeded):
+        engine.recognize(FRAME)
+    # La tâche expirée occupe toujours le seul processus : la place n'est pas encore rendue
+    with pytest.raises(EngineBusy):
+        engine.recognize(FRAME)
+
+    time.sleep(0.4)
+    engine.detector.delay = 0.0
+    engine.detector.encoding[:] = 0.5
+    assert engine.recognize(FRAME)['employee_id'] == 'E001'
+    assert engine.stats == {'submitted': 2, 'rejected': 1, 'expired': 1}
@@ -0,0 +1,112 @@
+import os
+import threading
+import pandas as pd
+from services.attendance import AttendanceService
+from services.repository import ROLLUP_COUNTERS
+
+DATE = '2025-03-12'
+
+
+def arrive(service, matricule, departement, time):
+    def mutation(connection):
+        service.repository.add_arrival(matricule, matricule, departement, DATE, time, 'SIG')
+        service.rollups.record_arrival(matricule, departement, DATE, time)
+    service.repository.write(mutation)
+
+
+def depart(service, matricule, departement, arrival, time):
+    def mutation(connection):
+        service.repository.set_departure(matricule, DATE, time)
+        service.rollups.record_departure(departement, DATE, arrival, time)
+    service.repository.write(mutation)
+
+
+def stored(service):
+    return service.repository.get_rollups(DATE, DATE).set_index('departement')[ROLLUP_COUNTERS]
+
+
+def recomputed(service):
+    rows, _ = service.rollups.compute_day(DATE)
+    return pd.DataFrame(rows).set_index('departement')[ROLLUP_COUNTERS]
+
+
+def test_deltas_match_full_rebuild(repository, employees):
+    staff = employees(10)
+    service = AttendanceService(repository)
+    service.rollups.ensure_day(DATE)
+    times = ['07:05:00', '08:10:00', '08:40:00', '09:30:00', '07:50:00', '08:00:00']
+    for (matricule, _, _, _, _, departement, _), time in zip(staff, times):
+        arrive(service, matricule, departement, time)
+    depart(service, staff[0][0], staff[0][5], times[0], '18:30:00')
+    depart(service, staff[1][0], staff[1][5], times[1], '16:00:00')
+    depart(service, staff[2][0], staff[2][5], times[2], '17:00:00')
+
+    pd.testing.assert_frame_equal(stored(service), recomputed(service), check_like=True)
+    totals = stored(service).sum()
+    assert totals['present'] == 6 and totals['absent'] == 4
+    # Trois sorties validées sur six arrivées
+    assert totals['missing_departures'] == 3
+    assert totals['early_departures'] > 0 and totals['late'] == 2
+
+
+def test_rebuild_concurrent_with_arrivals_loses_nothing(repository, employees):
+    staff = employees(60)
+    service = AttendanceService(repository)
+    service.rollups.ensure_day(DATE)
+    done = threading.Event()
+
+    def rebuild():
+        while not done.is_set():
+            service.rollups.rebuild_day(DATE)
+
+    rebuilder = threading.Thread(target=rebuild)
+    rebuilder.start()
+    try:
+        for i, (matricule, _, _, _, _, departement, _) in enumerate(staff):
+            arrive(service, matricule, departement, f'08:{i % 60:02d}:00')
+    finally:
+        done.set()
+        rebuilder.join()
+
+    assert service.rollups.is_current(DATE)
+    pd.testing.assert_frame_equal(stored(service), recomputed(service), check_like=True)
+    assert stored(service)['present'].sum() == 60
+
+
+def test_basis_change_triggers_recompute(repository, employees):
+    staff = employees(4)
+    service = AttendanceService(repository)
+    arrive(service, staff[0][0], staff[0][5], '08:00:00')
+    assert service.rollups.report(DATE)['total_employees'] == 4
+    repository.add_leave(staff[1][0], 'NOM1', DATE, DATE)
+    report = service.rollups.report(DATE)
+    assert report['absent_today'] == 2 and report['present_today'] == 1
+
+
+def test_monthly_report_counts_working_days_only(repository, employees):
+    employees(2)
+    service = AttendanceService(repository)
+    report = service.rollups.monthly_report('2025-03')
+    # Mars 2025 : 31 jours dont 10 de week-end
+    assert report['days'] == 21
+    # Personne n'a pointé : absents les seuls jours ouvrés
+    assert report['absent_days'] == 2 * 21
+
+
+def test_scans_refresh_the_month_report_once(repository, employees):
+    staff = employees(3)
+    service = AttendanceService(repository)
+    service.rollups.report_delay = 60
+    for (matricule, _, _, _, _, departement, _), time in zip(staff, ['07:30:00', '08:45:00']):
+        arrive(service, matricule, departement, time)
+    depart(service, staff[0][0], staff[0][5], '07:30:00', '17:00:00')
+    path = os.path.join(service.rollups.reports_dir, 'rapports2025-03.csv')
+    # Une seule réécriture programmée pour la rafale, rien d'écrit avant son échéance
+    assert service.rollups._report_dates == {DATE}
+    assert not os.path.exists(path)
+
+    assert service.rollups.flush_reports() == [path]
+    assert service.rollups._report_timer is None
+    report = pd.read_csv(path, dtype={'date': str})
+    day = report[report['date'] == DATE]
+    assert day['present'].sum() == 2 and day['late'].sum() == 1 and day['missing_departures'].sum() == 1